@@ -23,7 +23,7 @@ class LoggingMiddleware:
 
         """
         req.context.start_time = time.time()
-        self.logger.info(f"Request: {req.method} {req.path}")
+        self.logger.info("Request: %s %s", req.method, req.path)
 
     async def process_response(
         self, req: falcon.Request, resp: falcon.Response, resource: object | None, req_succeeded: bool
@@ -39,4 +39,4 @@ class LoggingMiddleware:
 
         """
         duration = time.time() - req.context.start_time
-        self.logger.info(f"Response: {req.method} {req.path} -> {resp.status} ({duration:.3f}s)")
+        self.logger.info("Response: %s %s -> %s (%.3fs)", req.method, req.path, resp.status, duration)
@@ -5,28 +5,25 @@ from urllib.parse import urlparse
 import falcon
 from pydicom import DataElement, Dataset, datadict
 
-from pyupsrs.config import Config
 from pyupsrs.domain.models.ups import FILTERED_SUBSCRIPTION_UID, GLOBAL_SUBSCRIPTION_UID, Subscription
 from pyupsrs.domain.services import subscription_service as svc_subscription_service
-from pyupsrs.storage.repositories import subscription_repository
 from pyupsrs.utils.class_logger import LoggerMixin
 
+_EMPTY_SUBSCRIPTIONS_BODY = b'{"subscriptions":[]}'
+
 
 class SubscriptionSuspendResource(LoggerMixin):
     """Resource for handling collections of UPS subscriptions."""
 
-    def __init__(self, subscription_service: svc_subscription_service = None) -> None:
+    def __init__(self, subscription_service: svc_subscription_service.SubscriptionService) -> None:
         """
         Initialize the resource.
 
         Args:
-            subscription_service: Service for handling workitem operations.
+            subscription_service: Shared service for handling subscription operations, see ServiceProvider.
 
         """
         self.subscription_service = subscription_service
-        if not self.subscription_service:
-            subscription_crud = subscription_repository.SubscriptionRepository(database_uri=Config.database_uri)
-            self.subscription_service = svc_subscription_service.SubscriptionService(subscription_repository=subscription_crud)
 
     async def on_get(self, req: falcon.Request, resp: falcon.Response, aetitle: str) -> None:
         """
@@ -39,7 +36,7 @@ class SubscriptionSuspendResource(LoggerMixin):
 
         """
         # TODO: Implement subscription query
-        resp.media = {"subscriptions": []}
+        resp.data = _EMPTY_SUBSCRIPTIONS_BODY
         resp.content_type = "application/dicom+json"
         resp.status = falcon.HTTP_200
         self.logger.error("Subscription Suspension on_get is only stubbed")
@@ -74,18 +71,15 @@ class SubscriptionSuspendResource(LoggerMixin):
 class SubscriptionResource(LoggerMixin):
     """Resource for handling individual UPS subscriptions."""
 
-    def __init__(self, subscription_service: svc_subscription_service = None) -> None:
+    def __init__(self, subscription_service: svc_subscription_service.SubscriptionService) -> None:
         """
         Initialize the resource.
 
         Args:
-            subscription_service: Service for handling workitem operations.
+            subscription_service: Shared service for handling subscription operations, see ServiceProvider.
 
         """
         self.subscription_service = subscription_service
-        if not self.subscription_service:
-            subscription_crud = subscription_repository.SubscriptionRepository(database_uri=Config.database_uri)
-            self.subscription_service = svc_subscription_service.SubscriptionService(subscription_repository=subscription_crud)
 
     def _extract_hostname(self, host_string: str) -> str:
         """
@@ -303,9 +297,7 @@ class SubscriptionResource(LoggerMixin):
             else:
                 workitem_uid = GLOBAL_SUBSCRIPTION_UID
 
-        subscription = Subscription(
-            workitem_uid=workitem_uid, ae_title=aetitle, deletion_lock=deletion_lock, filter=subscription_filter
-        )
+        subscription = Subscription(workitem_uid, aetitle, deletion_lock=deletion_lock, filter=subscription_filter)
         self.logger.warning(f"Subscription: {subscription}")
         self.subscription_service.create_subscription(subscription)
 
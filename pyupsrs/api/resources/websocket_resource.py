@@ -47,6 +47,9 @@ class WebSocketResource:
 class FalconWebSocketAdapter:
     """Adapter to make Falcon's WebSocket compatible with websockets.ServerConnection."""
 
+    # One adapter is built per connection, share the logger rather than looking it up each time
+    logger = logging.getLogger("pyupsrs.websocket.adapter")
+
     def __init__(self, ws: falcon.asgi.WebSocket) -> None:
         """
         Initialize the adapter.
@@ -56,7 +59,6 @@ class FalconWebSocketAdapter:
 
         """
         self.ws = ws
-        self.logger = logging.getLogger("pyupsrs.websocket.adapter")
 
     async def send(self, message: str) -> None:
         """
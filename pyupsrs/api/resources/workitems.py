@@ -1,6 +1,7 @@
 """Falcon resources for UPS workitems."""
 
 import json
+import sys
 import traceback
 from datetime import datetime
 from typing import Any
@@ -12,12 +13,9 @@ from falcon.asgi import BoundedStream
 from pydicom import DataElement, Dataset, datadict
 
 from pyupsrs.api.serializers.dicom_json import deserialize_workitem
-from pyupsrs.config import Config
 from pyupsrs.domain.models.ups import WorkItem, WorkItemStatus
 from pyupsrs.domain.services import workitem_service as svc_workitem_service
-from pyupsrs.storage.repositories import workitem_repository
 from pyupsrs.utils.class_logger import LoggerMixin
-from pyupsrs.websocket import notification_service as svc_notification_service
 
 UPS_WARNING_MODIFICATIONS = "Warning: 299 {service}: The Workitem was updated with modifications."
 UPS_WARNING_URI_UNCLAIMED_WORKITEM = "Warning: 299 {service}: The target URI did not reference a claimed Workitem."
@@ -33,6 +31,22 @@ UPS_WARNING_INCONSISTENT_WITH_UPS = (
 UPS_WARNING_STATE_IS_ALREADY_COMPLETED = "Warning: 299 {service}: The UPS is already in the requested state of COMPLETED."
 UPS_WARNING_STATE_IS_ALREADY_CANCELED = "Warning: 299 {service}: The UPS is already in the requested state of CANCELED."
 
+_WORKITEM_UID_BODY = b'{"workitem_uid":%b}'
+
+# DICOM JSON keys read on every change state request
+_TAG_PROCEDURE_STEP_STATE = sys.intern("00741000")
+_TAG_TRANSACTION_UID = sys.intern("00081195")
+_KEY_VALUE = sys.intern("Value")
+
+
+def _first_value(dataset_json: dict[str, Any], tag: str) -> Any:  # noqa: ANN401
+    """Get the first value of an element of a DICOM JSON dataset, None if the element is missing or malformed."""
+    element = dataset_json.get(tag)
+    if not isinstance(element, dict):
+        return None
+    values = element.get(_KEY_VALUE)
+    return values[0] if isinstance(values, list) and values else None
+
 
 def get_base_uri(req: falcon.Request) -> str:
     """Get Base URI from the request."""
@@ -133,22 +147,15 @@ class DICOMJSONHandler:
 class WorkItemsResource(LoggerMixin):
     """Resource for handling collections of UPS workitems."""
 
-    def __init__(self, workitem_service: svc_workitem_service = None) -> None:
+    def __init__(self, workitem_service: svc_workitem_service.WorkItemService) -> None:
         """
         Initialize the resource.
 
         Args:
-            workitem_service: Service for handling workitem operations.
+            workitem_service: Shared service for handling workitem operations, see ServiceProvider.
 
         """
         self.workitem_service = workitem_service
-        if not self.workitem_service:
-            workitem_crud = workitem_repository.WorkItemRepository(database_uri=Config.database_uri)
-            notification_communication_manager = svc_notification_service.ConnectionManager()
-            notification_backend = svc_notification_service.NotificationService(notification_communication_manager)
-            self.workitem_service = svc_workitem_service.WorkItemService(
-                workitem_repository=workitem_crud, notification_service=notification_backend
-            )
 
     async def on_get(self, req: falcon.Request, resp: falcon.Response) -> None:
         """
@@ -222,60 +229,48 @@ class WorkItemsResource(LoggerMixin):
             resp: The HTTP response.
 
         """
-        try:
-            # Manually read and parse the request body
-            base_uri = get_base_uri(req=req)
-            body = await req.stream.read()
-            if not body:
-                raise falcon.HTTPBadRequest(title="Empty request body", description="A valid DICOM JSON dataset is required")
-
-            # Parse the JSON body
-            try:
-                data = json.loads(body)
-            except json.JSONDecodeError as e:
-                raise falcon.HTTPBadRequest(title="Invalid JSON", description="Request body must be valid JSON") from e
+        # Manually read and parse the request body
+        base_uri = get_base_uri(req=req)
+        body = await req.stream.read()
+        if not body:
+            raise falcon.HTTPBadRequest(title="Empty request body", description="A valid DICOM JSON dataset is required")
 
-            json_dicom = data
-            workitem = deserialize_workitem(json_dicom)
+        # Parse the JSON body
+        try:
+            data = json.loads(body)
+        except json.JSONDecodeError as e:
+            raise falcon.HTTPBadRequest(title="Invalid JSON", description="Request body must be valid JSON") from e
 
-            resp.content_type = "application/dicom+json"
+        json_dicom = data
+        workitem = deserialize_workitem(json_dicom)
 
-            if self.workitem_service.workitem_repository.get_by_uid(workitem.uid):
-                msg = f"Error: 299 {base_uri}: Can not create the workitem because the workitem UID: {workitem.uid} exists"
-                self.logger.error(msg)
-                resp.status = falcon.HTTP_409
-                resp.append_header("Warning", msg)
-            else:
-                self.workitem_service.create_workitem(workitem=workitem)
-                workitem_response = {"00080018": {"Value": [workitem.ds.SOPInstanceUID], "vr": "UI"}}
-                resp.status = falcon.HTTP_201
-                resp_media = json.dumps(workitem_response)
-                resp.text = resp_media
+        resp.content_type = "application/dicom+json"
 
-        except Exception as e:
-            # Get a detailed traceback for debugging on the server side
-            print(traceback.format_exc())
-            # Log the exception
-            raise falcon.HTTPInternalServerError(title="Error processing request", description=str(e)) from e
+        if self.workitem_service.workitem_repository.get_by_uid(workitem.uid):
+            msg = f"Error: 299 {base_uri}: Can not create the workitem because the workitem UID: {workitem.uid} exists"
+            self.logger.error(msg)
+            resp.status = falcon.HTTP_409
+            resp.append_header("Warning", msg)
+        else:
+            self.workitem_service.create_workitem(workitem=workitem)
+            workitem_response = {"00080018": {"Value": [workitem.ds.SOPInstanceUID], "vr": "UI"}}
+            resp.status = falcon.HTTP_201
+            resp_media = json.dumps(workitem_response)
+            resp.text = resp_media
 
 
 class WorkItemResource(LoggerMixin):
     """Resource for handling individual UPS workitems."""
 
-    def __init__(self, workitem_service: svc_workitem_service = None) -> None:
+    def __init__(self, workitem_service: svc_workitem_service.WorkItemService) -> None:
         """
         Initialize the resource.
 
         Args:
-            workitem_service: Service for handling workitem operations.
+            workitem_service: Shared service for handling workitem operations, see ServiceProvider.
 
         """
         self.workitem_service = workitem_service
-        if not self.workitem_service:
-            workitem_crud = workitem_repository.WorkItemRepository(database_uri=Config.database_uri)
-            self.workitem_service = svc_workitem_service.WorkItemService(
-                workitem_repository=workitem_crud, notification_service=None
-            )
 
     async def on_get(self, req: falcon.Request, resp: falcon.Response, workitem_uid: str) -> None:
         """
@@ -371,7 +366,7 @@ class WorkItemResource(LoggerMixin):
 
         if resp.status == falcon.HTTP_200:
             workitem_update.uid = workitem_uid
-            workitem.updated_at = datetime.now()
+            workitem_update.updated_at = datetime.now()
             # store the update, i.e. persist it in the database
             self.workitem_service.workitem_repository.update(workitem_update)
         if resp.status == falcon.HTTP_500:
@@ -388,69 +383,57 @@ class WorkItemResource(LoggerMixin):
             workitem_uid: The UID of the workitem.
 
         """
+        # Manually read and parse the request body
+        body = await req.stream.read()
+        if not body:
+            raise falcon.HTTPBadRequest(title="Empty request body", description="A valid DICOM JSON dataset is required")
+
+        # Parse the JSON body
         try:
-            # Manually read and parse the request body
-            body = await req.stream.read()
-            if not body:
-                raise falcon.HTTPBadRequest(title="Empty request body", description="A valid DICOM JSON dataset is required")
+            data = json.loads(body)
+        except json.JSONDecodeError as e:
+            raise falcon.HTTPBadRequest(title="Invalid JSON", description="Request body must be valid JSON") from e
 
-            # Parse the JSON body
-            try:
-                data = json.loads(body)
-            except json.JSONDecodeError as e:
-                raise falcon.HTTPBadRequest(title="Invalid JSON", description="Request body must be valid JSON") from e
+        json_dicom = data
+        cancel_workitem = deserialize_workitem(json_dicom)
+        cancel_workitem.uid = workitem_uid
+        cancel_workitem.ds.SOPInstanceUID = cancel_workitem.uid
+        resp.content_type = "application/dicom+json"
 
-            json_dicom = data
-            cancel_workitem = deserialize_workitem(json_dicom)
-            cancel_workitem.uid = workitem_uid
-            cancel_workitem.ds.SOPInstanceUID = cancel_workitem.uid
-            resp.content_type = "application/dicom+json"
+        canceled: bool = False
 
-            canceled: bool = False
+        stored_workitem = self.workitem_service.workitem_repository.get_by_uid(workitem_uid)
+        if stored_workitem is None:
+            resp.status = falcon.HTTP_404
+        else:
+            # Try to cancel it
+            _, canceled = self.workitem_service.update_workitem_status(
+                workitem_uid, new_status=WorkItemStatus.CANCELED, transaction_uid=None
+            )
+            if canceled:
+                # update to include whatever reasons and notification information
+                # TODO: check within update to see if the update contains cancellation request information and
+                # trigger a notification (although that notification will be a stub... this is an example, not
+                # intended to be commercial grade)
+                self.workitem_service.workitem_repository.update(cancel_workitem)
 
-            stored_workitem = self.workitem_service.workitem_repository.get_by_uid(workitem_uid)
-            if stored_workitem is None:
-                resp.status = falcon.HTTP_404
-            else:
-                # Try to cancel it
-                _, canceled = self.workitem_service.update_workitem_status(
-                    workitem_uid, new_status=WorkItemStatus.CANCELED, transaction_uid=None
-                )
-                if canceled:
-                    # update to include whatever reasons and notification information
-                    # TODO: check within update to see if the update contains cancellation request information and
-                    # trigger a notification (although that notification will be a stub... this is an example, not
-                    # intended to be commercial grade)
-                    self.workitem_service.workitem_repository.update(cancel_workitem)
-
-                resp.status = falcon.HTTP_202 if canceled else falcon.HTTP_409
-                # resp_media = json.dumps(workitem_response)
-                # resp.text = resp_media
-
-        except Exception as e:
-            # Get a detailed traceback for debugging on the server side
-            print(traceback.format_exc())
-            # Log the exception
-            raise falcon.HTTPInternalServerError(title="Error processing request", description=str(e)) from e
+            resp.status = falcon.HTTP_202 if canceled else falcon.HTTP_409
+            # resp_media = json.dumps(workitem_response)
+            # resp.text = resp_media
 
 
 class WorkItemStateResource(LoggerMixin):
     """Resource for handling individual UPS workitems."""
 
-    def __init__(self, workitem_service: svc_workitem_service = None) -> None:
+    def __init__(self, workitem_service: svc_workitem_service.WorkItemService) -> None:
         """
         Initialize the resource.
 
         Args:
-            workitem_service: Service for handling workitem operations.
+            workitem_service: Shared service for handling workitem operations, see ServiceProvider.
 
         """
         self.workitem_service = workitem_service
-        if not self.workitem_service:
-            workitem_crud = workitem_repository.WorkItemRepository(database_uri=Config.database_uri)
-            self.workitem_service = svc_workitem_service.WorkItemService(
-                workitem_repository=workitem_crud, notification_service=None
-            )
 
     async def on_get(self, req: falcon.Request, resp: falcon.Response, workitem_uid: str) -> None:
         """
@@ -463,7 +446,7 @@ class WorkItemStateResource(LoggerMixin):
 
         """
         # TODO: Implement workitem retrieval
-        resp.media = {"workitem_uid": workitem_uid}
+        resp.data = _WORKITEM_UID_BODY % json.dumps(workitem_uid).encode("utf-8")
         resp.content_type = "application/dicom+json"
         resp.status = falcon.HTTP_200
 
@@ -498,12 +481,10 @@ class WorkItemStateResource(LoggerMixin):
 
         if isinstance(change_state_request, dict):
             # Extract Procedure Step State (0074,1000)
-            if "00741000" in change_state_request and "Value" in change_state_request["00741000"]:
-                procedure_step_state = change_state_request["00741000"]["Value"][0]
+            procedure_step_state = _first_value(change_state_request, _TAG_PROCEDURE_STEP_STATE)
 
             # Extract Transaction UID (0008,1195)
-            if "00081195" in change_state_request and "Value" in change_state_request["00081195"]:
-                transaction_uid = change_state_request["00081195"]["Value"][0]
+            transaction_uid = _first_value(change_state_request, _TAG_TRANSACTION_UID)
 
         if self._is_missing_transaction_uid(req, resp, procedure_step_state, transaction_uid):
             return
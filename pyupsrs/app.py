@@ -19,7 +19,7 @@ from pyupsrs.api.resources.subscriptions import SubscriptionResource, Subscripti
 from pyupsrs.api.resources.websocket_resource import WebSocketResource
 from pyupsrs.api.resources.workitems import DICOMJSONHandler, WorkItemResource, WorkItemsResource, WorkItemStateResource
 from pyupsrs.config import get_config
-from pyupsrs.domain.services.service_provider import ServiceProvider
+from pyupsrs.domain.services.service_provider import get_provider
 from pyupsrs.utils.class_logger import configure_logging
 
 
@@ -42,7 +42,7 @@ def create_app() -> App:
     app = falcon.asgi.App(middleware=middleware)
 
     # Get shared services
-    service_provider = ServiceProvider.get_instance()
+    service_provider = get_provider()
 
     # Register media handlers
 
@@ -119,6 +119,8 @@ def main(
         os.environ["PYUPSRS_DATABASE_URI"] = database_uri
     if auth is not None:
         os.environ["PYUPSRS_AUTH_ENABLED"] = str(auth).lower()
+    # create_app() runs in this process, so make it re-read the (possibly updated) environment
+    get_config.cache_clear()
 
     # Setup args for Uvicorn
     app_import = "pyupsrs.app:create_app"
@@ -137,6 +139,13 @@ def main(
         click.echo("  --auth / --no-auth      Enable or disable authentication. [default: disabled]")
         sys.exit(0)
 
+    # Prefer the C event loop and HTTP parser unless the caller chose otherwise.
+    # uvloop is not available on Windows, so leave the loop choice to Uvicorn there.
+    if sys.platform != "win32" and not any(arg.startswith("--loop") for arg in uvicorn_args):
+        uvicorn_args += ["--loop", "uvloop"]
+    if not any(arg.startswith("--http") for arg in uvicorn_args):
+        uvicorn_args += ["--http", "httptools"]
+
     # Run Uvicorn with our args
     sys.argv = uvicorn_args
     uvicorn_main()
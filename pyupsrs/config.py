@@ -2,9 +2,10 @@
 
 import os
 from dataclasses import dataclass
+from functools import cache
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Config:
     """Application configuration."""
 
@@ -14,10 +15,17 @@ class Config:
     log_level: str = "info"
     database_uri: str = "sqlite:///ups.db"
     auth_enabled: bool = False
+    include_message_id: bool = True
 
 
+@cache
 def get_config() -> Config:
-    """Load configuration from environment variables."""
+    """
+    Load configuration from environment variables.
+
+    The result is cached, call ``get_config.cache_clear()`` after changing the environment
+    to have the next call pick up the new values.
+    """
     return Config(
         host=os.getenv("PYUPSRS_HOST", "0.0.0.0"),
         port=int(os.getenv("PYUPSRS_PORT", "8000")),
@@ -25,4 +33,5 @@ def get_config() -> Config:
         log_level=os.getenv("PYUPSRS_LOG_LEVEL", "info"),
         database_uri=os.getenv("PYUPSRS_DATABASE_URI", "sqlite:///ups.db"),
         auth_enabled=os.getenv("PYUPSRS_AUTH_ENABLED", "false").lower() == "true",
+        include_message_id=os.getenv("PYUPSRS_INCLUDE_MESSAGE_ID", "true").lower() == "true",
     )
@@ -1,25 +1,37 @@
 """Domain models for UPS workitems and related concepts."""
 
+import sys
+from copy import copy as shallow_copy
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
+from functools import lru_cache
+from typing import TYPE_CHECKING, cast
 
-from pydicom.dataset import Dataset
-from pydicom.errors import InvalidDicomError
-from pydicom.uid import UID
+# pydicom is imported where it is used, so that importing e.g. WorkItemStatus stays cheap
+if TYPE_CHECKING:
+    from pydicom.dataset import Dataset
 
-GLOBAL_SUBSCRIPTION_UID = "1.2.840.10008.5.1.4.34.5"
+# Interned, these are compared against the workitem UID of every subscription lookup
+GLOBAL_SUBSCRIPTION_UID = sys.intern("1.2.840.10008.5.1.4.34.5")
 
-FILTERED_SUBSCRIPTION_UID = "1.2.840.10008.5.1.4.34.5.1"
+FILTERED_SUBSCRIPTION_UID = sys.intern("1.2.840.10008.5.1.4.34.5.1")
+
+
+@lru_cache(maxsize=4096)
+def _is_valid_uid(value: str) -> bool:
+    from pydicom.uid import UID
+
+    return UID(value).is_valid
 
 
 class WorkItemStatus(Enum):
     """Status values for UPS workitems."""
 
-    SCHEDULED = "SCHEDULED"
-    IN_PROGRESS = "IN PROGRESS"
-    COMPLETED = "COMPLETED"
-    CANCELED = "CANCELED"
+    SCHEDULED = sys.intern("SCHEDULED")
+    IN_PROGRESS = sys.intern("IN PROGRESS")
+    COMPLETED = sys.intern("COMPLETED")
+    CANCELED = sys.intern("CANCELED")
 
     @classmethod
     def from_string(cls, status_string: str) -> "WorkItemStatus":
@@ -36,25 +48,28 @@ class WorkItemStatus(Enum):
             ValueError: If the string doesn't match any enum value
 
         """
-        for status in cls:
-            if status.value == status_string:
-                return status
-        raise ValueError(f"No enum value matches '{status_string}'")
+        try:
+            return cast(WorkItemStatus, cls._value2member_map_[status_string])
+        except (KeyError, TypeError):
+            raise ValueError(f"No enum value matches '{status_string}'") from None
 
 
-@dataclass
 class WorkItem:
     """A UPS workitem container.  Has a Dataset."""
 
-    status: WorkItemStatus = WorkItemStatus.SCHEDULED  # Procedure Step State
+    __slots__ = ("status", "created_at", "updated_at", "transaction_uid", "ds", "_uid")
+
+    status: WorkItemStatus  # Procedure Step State
     # These aren't part of the UPS definition, but they could prove to be useful
     # for logging and tracking purposes
-    created_at: datetime = field(default_factory=datetime.now)
-    updated_at: datetime = field(default_factory=datetime.now)
-    transaction_uid: str = field(default=None)
-    ds: Dataset = field(default_factory=Dataset)
-
-    def __init__(self, ds: Dataset = None) -> None:
+    created_at: datetime
+    updated_at: datetime
+    transaction_uid: str | None
+    ds: "Dataset | None"
+    # SOP Instance UID taken from ds, kept up to date by the methods that change it
+    _uid: str | None
+
+    def __init__(self, ds: "Dataset | None" = None) -> None:
         """
         Build WorkItem from existing Dataset.
 
@@ -63,9 +78,11 @@ class WorkItem:
 
         """
         self.ds = ds
+        self.status = WorkItemStatus.SCHEDULED
         self.created_at = datetime.now()
         self.updated_at = self.created_at
         self.transaction_uid = None
+        self._refresh_uid()
         # if self.ds:
         #     if hasattr(ds, "AffectedSOPInstanceUID") and str(ds["AffectedSOPInstanceUID"]):
         #         self.uid = str(ds["AffectedSOPInstanceUID"])
@@ -85,15 +102,15 @@ class WorkItem:
     # procedure_code: Optional[str] = None
 
     @property
-    def uid(self) -> str:
+    def uid(self) -> str | None:
         """
         Get the UID string.
 
         Returns:
-            str: The UID value
+            str | None: The UID value, None if the dataset has neither SOP Instance UID nor Affected SOP Instance UID
 
         """
-        return self.ds.get("SOPInstanceUID", None) or self.ds.get("AffectedSOPInstanceUID", None)
+        return self._uid
 
     @uid.setter
     def uid(self, value: str) -> None:
@@ -104,12 +121,15 @@ class WorkItem:
             value: The UID to set
 
         """
-        _uid = UID(value)
-        if _uid.is_valid:
-            self.ds.SOPInstanceUID = value
-            self.ds.AffectedSOPInstanceUID = value
+        ds = self._dataset()
+        if _is_valid_uid(value):
+            ds.SOPInstanceUID = value
+            ds.AffectedSOPInstanceUID = value
+            self._uid = value
         else:
-            raise InvalidDicomError("Not a valid UID: {_uid}")
+            from pydicom.errors import InvalidDicomError
+
+            raise InvalidDicomError(f"Not a valid UID: {value}")
 
     def update_procedure_step_status(self, new_status: WorkItemStatus) -> None:
         """
@@ -120,18 +140,73 @@ class WorkItem:
 
         """
         self.status = new_status
-        self.ds.ProcedureStepState = new_status.value
+        self._dataset().ProcedureStepState = new_status.value
         self.updated_at = datetime.now()
+        self._refresh_uid()
 
+    def copy_for_edit(self) -> "WorkItem":
+        """
+        Copy the workitem so that elements can be added to, removed from or set on the copy.
 
-@dataclass(frozen=True)
+        The dataset and its top level elements are copied. The element values are shared with this workitem,
+        so a value changed in place (e.g. an item of a sequence) changes it for both.
+
+        Returns:
+            The copy of the workitem.
+
+        """
+        from pydicom.dataset import Dataset
+
+        copy = WorkItem.__new__(WorkItem)
+        if self.ds is None:
+            copy.ds = None
+        else:
+            copy.ds = Dataset()
+            for elem in self.ds:
+                copy.ds.add(shallow_copy(elem))
+        copy.status = self.status
+        copy.created_at = self.created_at
+        copy.updated_at = self.updated_at
+        copy.transaction_uid = self.transaction_uid
+        copy._uid = self._uid
+        return copy
+
+    def _dataset(self) -> "Dataset":
+        """Get the dataset, which has to be present to change the workitem."""
+        ds = self.ds
+        if ds is None:
+            raise ValueError("WorkItem has no dataset")
+        return ds
+
+    def _refresh_uid(self) -> None:
+        """Re-read the cached UID from the dataset."""
+        ds = self.ds
+        self._uid = ds.get("SOPInstanceUID", None) or ds.get("AffectedSOPInstanceUID", None) if ds is not None else None
+
+
+@dataclass(frozen=True, slots=True, eq=False)
 class Subscription:
-    """A subscription to a UPS workitem."""
+    """
+    A subscription to a UPS workitem.
+
+    An AE title has at most one subscription per workitem, so subscriptions compare and hash on
+    (workitem_uid, ae_title) only.
+    """
 
     workitem_uid: str  # might be GLOBAL or FILTERED Subscription (well known) UID
     ae_title: str
     created_at: datetime = field(default_factory=datetime.now)
     deletion_lock: bool = False
     contact_uri: str | None = None
-    filter: Dataset | None = field(hash=False, default=None)
-    suspended: bool = False  # This implies that to suspend, a new subscription has to be created and the old one deleted
+    filter: "Dataset | None" = None
+    suspended: bool = False  # Subscription is frozen, so suspending replaces the stored subscription with a suspended copy
+
+    def __eq__(self, other: object) -> bool:
+        """Compare on workitem UID and AE title."""
+        if other.__class__ is not Subscription:
+            return NotImplemented
+        return self.workitem_uid == other.workitem_uid and self.ae_title == other.ae_title
+
+    def __hash__(self) -> int:
+        """Hash on workitem UID and AE title."""
+        return hash((self.workitem_uid, self.ae_title))
@@ -1,35 +1,35 @@
 """Service provider for shared service instances."""
 
 import logging
+from functools import lru_cache
 
-from pyupsrs.config import Config
-from pyupsrs.domain.services import subscription_service as svc_subscription_service
-from pyupsrs.domain.services import workitem_service as svc_workitem_service
-from pyupsrs.storage.repositories import subscription_repository, workitem_repository
-from pyupsrs.websocket.connection_manager import ConnectionManager
-from pyupsrs.websocket.notification_service import NotificationService
+from pyupsrs.config import get_config
 
 
 class ServiceProvider:
     """Provider for shared service instances."""
 
-    _instance = None
-
     @classmethod
     def get_instance(cls) -> "ServiceProvider":
         """
         Get or create the singleton instance of ServiceProvider.
 
         Returns:
-            The singleton instance.
+            The singleton instance, same as get_provider().
 
         """
-        if cls._instance is None:
-            cls._instance = cls()
-        return cls._instance
+        return get_provider()
 
     def __init__(self) -> None:
         """Initialize service provider."""
+        # Imported here rather than at module level: the services import this module to reach the
+        # singleton, and importing it should not pull in pydicom and the websocket stack on its own.
+        from pyupsrs.domain.services import subscription_service as svc_subscription_service
+        from pyupsrs.domain.services import workitem_service as svc_workitem_service
+        from pyupsrs.storage.repositories import subscription_repository, workitem_repository
+        from pyupsrs.websocket.connection_manager import ConnectionManager
+        from pyupsrs.websocket.notification_service import NotificationService
+
         self.logger = logging.getLogger("pyupsrs.services.provider")
         self.logger.info("Initializing shared service provider")
 
@@ -38,8 +38,9 @@ class ServiceProvider:
         self.notification_service = NotificationService(self.connection_manager)
 
         # Initialize repositories
-        self.workitem_repo = workitem_repository.WorkItemRepository(database_uri=Config.database_uri)
-        self.subscription_repo = subscription_repository.SubscriptionRepository(database_uri=Config.database_uri)
+        config = get_config()
+        self.workitem_repo = workitem_repository.WorkItemRepository(database_uri=config.database_uri)
+        self.subscription_repo = subscription_repository.SubscriptionRepository(database_uri=config.database_uri)
 
         # Initialize domain services
         self.workitem_service = svc_workitem_service.WorkItemService(
@@ -48,3 +49,15 @@ class ServiceProvider:
         self.subscription_service = svc_subscription_service.SubscriptionService(
             subscription_repository=self.subscription_repo
         )
+
+
+@lru_cache(maxsize=1)
+def get_provider() -> ServiceProvider:
+    """
+    Get or create the shared ServiceProvider.
+
+    Returns:
+        The singleton instance.
+
+    """
+    return ServiceProvider()
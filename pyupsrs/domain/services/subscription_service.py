@@ -1,9 +1,14 @@
 """Subscription service."""
 
+from collections.abc import Iterable
+from dataclasses import replace
+
 import pyupsrs.domain.services.service_provider as service_provider_svc
 from pyupsrs.domain.models.ups import Subscription
 from pyupsrs.storage.repositories.subscription_repository import SubscriptionRepository
 from pyupsrs.utils.class_logger import LoggerMixin
+from pyupsrs.websocket.connection_manager import ConnectionManager
+from pyupsrs.websocket.notification_service import NotificationService
 
 
 class SubscriptionService(LoggerMixin):
@@ -18,6 +23,35 @@ class SubscriptionService(LoggerMixin):
 
         """
         self.subscription_repository = subscription_repository
+        # Resolved from the ServiceProvider on first use, it is still being built when this service is created
+        self._connection_manager: ConnectionManager | None = None
+        self._notification_service: NotificationService | None = None
+
+    @property
+    def connection_manager(self) -> ConnectionManager:
+        """
+        Get the shared connection manager.
+
+        Returns:
+            The ConnectionManager held by the ServiceProvider.
+
+        """
+        if self._connection_manager is None:
+            self._connection_manager = service_provider_svc.get_provider().connection_manager
+        return self._connection_manager
+
+    @property
+    def notification_service(self) -> NotificationService:
+        """
+        Get the shared notification service.
+
+        Returns:
+            The NotificationService held by the ServiceProvider.
+
+        """
+        if self._notification_service is None:
+            self._notification_service = service_provider_svc.get_provider().notification_service
+        return self._notification_service
 
     def create_subscription(self, subscription: Subscription) -> Subscription:
         """
@@ -31,9 +65,9 @@ class SubscriptionService(LoggerMixin):
 
         """
         # Store the subscription in the connection manager
-        service_provider_svc.ServiceProvider.get_instance().connection_manager.subscribe(
-            subscription.ae_title, subscription.workitem_uid
-        )
+        self.connection_manager.subscribe(subscription.ae_title, subscription.workitem_uid)
+        # A subscription with the same AE title and workitem UID is replaced
+        self.notification_service.forget_subscription(subscription.ae_title, subscription.workitem_uid)
 
         # Persist the subscription in the repository
         created_subscription = self.subscription_repository.create(subscription)
@@ -43,8 +77,7 @@ class SubscriptionService(LoggerMixin):
             self.logger.info(
                 f"Queueing initial state reports for {subscription.ae_title} subscription to {subscription.workitem_uid}"
             )
-            notification_service = service_provider_svc.ServiceProvider.get_instance().notification_service
-            notification_service.queue_state_reports(subscription)
+            self.notification_service.queue_state_reports(subscription)
         except Exception as e:
             self.logger.error(f"Failed to queue initial state reports for {subscription.ae_title}: {e}")
 
@@ -52,44 +85,34 @@ class SubscriptionService(LoggerMixin):
 
     def delete_subscription(self, workitem_uid: str, ae_title: str) -> bool:
         """Remove subscription from Connection Manager cache and delete from repository."""
-        service_provider_svc.ServiceProvider.get_instance().connection_manager.unsubscribe(ae_title, workitem_uid)
+        self.connection_manager.unsubscribe(ae_title, workitem_uid)
+        self.notification_service.forget_subscription(ae_title, workitem_uid)
         return self.subscription_repository.delete(workitem_uid, ae_title)
 
     def get_by_ae_title(self, ae_title: str) -> list[Subscription]:
         """Get Subscription list by AE Title."""
         return self.subscription_repository.get_by_ae_title(ae_title)
 
+    def get_suspended(self, ae_titles: Iterable[str]) -> set[str]:
+        """Get the AE titles, of those given, whose subscription is suspended."""
+        get_by_ae_title = self.subscription_repository.get_by_ae_title
+        return {
+            ae_title for ae_title in ae_titles if (subscriptions := get_by_ae_title(ae_title)) and subscriptions[0].suspended
+        }
+
     def get_by_workitem_uid(self, workitem_uid: str) -> list[Subscription]:
         """Get Subscription list by workitem UID, which can be specific, GLOBAL or FILTERED."""
         return self.subscription_repository.get_by_workitem(workitem_uid)
 
     def suspend(self, workitem_uid: str, ae_title: str) -> bool:
         """Suspend the subscription."""
-        subscriptions_by_ae = self.subscription_repository.get_by_ae_title(ae_title)
-        if subscription_to_suspend := next(
-            (
-                subscription
-                for subscription in subscriptions_by_ae
-                if subscription.ae_title == ae_title and subscription.workitem_uid == workitem_uid
-            ),
-            None,
-        ):
-            suspended_subscription = Subscription(
-                workitem_uid=subscription_to_suspend.workitem_uid,
-                ae_title=subscription_to_suspend.ae_title,
-                deletion_lock=subscription_to_suspend.deletion_lock,
-                contact_uri=subscription_to_suspend.contact_uri,
-                filter=subscription_to_suspend.filter,
-                suspended=True,
-            )
-            service_provider_svc.ServiceProvider.get_instance().connection_manager.unsubscribe(
-                ae_title, workitem_uid
-            )  # equivalent to suspend
-            self.logger.warning(f"Suspended connection manager subscription for {ae_title} to {workitem_uid}")
-            self.delete_subscription(subscription_to_suspend.workitem_uid, subscription_to_suspend.ae_title)
-            self.logger.warning(f"Deleted SubscriptionService subscription for {ae_title} to {workitem_uid}")
-            self.create_subscription(suspended_subscription)
+        if subscription_to_suspend := self.subscription_repository.get(workitem_uid, ae_title):
+            suspended_subscription = replace(subscription_to_suspend, suspended=True)
+            self.connection_manager.unsubscribe(ae_title, workitem_uid)  # equivalent to suspend
+            self.notification_service.forget_subscription(ae_title, workitem_uid)
+            self.logger.warning("Suspended connection manager subscription for %s to %s", ae_title, workitem_uid)
+            self.subscription_repository.update(suspended_subscription)
             return True
         else:
-            self.logger.warning(f"No subscription found for {ae_title} to {workitem_uid}")
+            self.logger.warning("No subscription found for %s to %s", ae_title, workitem_uid)
             return False
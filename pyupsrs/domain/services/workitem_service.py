@@ -1,10 +1,15 @@
 """Business logic for handling UPS workitems."""
 
+import asyncio
+
 from pyupsrs.domain.models.ups import WorkItem, WorkItemStatus
 from pyupsrs.storage.repositories.workitem_repository import WorkItemRepository
 from pyupsrs.utils.class_logger import LoggerMixin
 from pyupsrs.websocket.notification_service import NotificationService
 
+_SCHEDULED = WorkItemStatus.SCHEDULED.value
+_TERMINAL_STATES = frozenset((WorkItemStatus.COMPLETED.value, WorkItemStatus.CANCELED.value))
+
 
 class WorkItemService(LoggerMixin):
     """Service for managing UPS workitems."""
@@ -41,12 +46,32 @@ class WorkItemService(LoggerMixin):
 
         # Send notification
         if self.notification_service:
-            self.notification_service.notify_creation(created_workitem)
+            self._dispatch_creation_notification(created_workitem)
         else:
             self.logger.warning("Notification Service not injected, no notifications will be sent")
 
         return created_workitem
 
+    def _dispatch_creation_notification(self, workitem: WorkItem) -> None:
+        """
+        Notify the subscribers of a created workitem.
+
+        The reports are made straight away, as a later change to the stored workitem must not show in them.
+        When called from a request handler, they are sent on the next pass of the event loop, so that the
+        response does not wait for the fan-out to the subscribers.
+
+        Args:
+            workitem: The created workitem.
+
+        """
+        reports = self.notification_service.creation_reports(workitem)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.notification_service.send_creation_reports(workitem.uid, reports)
+        else:
+            loop.call_soon(self.notification_service.send_creation_reports, workitem.uid, reports)
+
     def update_workitem_status(self, uid: str, new_status: WorkItemStatus, transaction_uid: str) -> tuple[WorkItem, bool]:
         """
         Update a workitem's status.
@@ -63,33 +88,28 @@ class WorkItemService(LoggerMixin):
         try:
             # Retrieve the workitem
             workitem = self.workitem_repository.get_by_uid(uid)
-            if not isinstance(workitem, WorkItem):
-                workitem = WorkItem(ds=workitem)
-
             if workitem is None:
                 self.logger.warning("No workitem found")
                 return None, False
 
-            current_status = None
-            if hasattr(workitem.ds, "ProcedureStepState"):
-                current_status = workitem.ds.ProcedureStepState
-            else:
+            current_status = getattr(workitem.ds, "ProcedureStepState", None)
+            if current_status is None:
                 self.logger.warning(
                     f"ProcedureStepState not present in stored workitem {uid}, something went wrong when it was created?"
                 )
                 return workitem, False
 
-            if current_status not in ["SCHEDULED"] and (not transaction_uid or (workitem.transaction_uid != transaction_uid)):
+            if current_status != _SCHEDULED and (not transaction_uid or (workitem.transaction_uid != transaction_uid)):
                 self.logger.warning(
                     f"Workitem {uid} was not in SCHEDULED state but transaction UID was not present or wrong value"
                 )
                 return workitem, False
 
-            if current_status in ["COMPLETED", "CANCELED"]:
-                self.logger.warning(f"Workitem {uid} was already COMPLETED or CANCELED")
+            if current_status in _TERMINAL_STATES:
+                self.logger.warning("Workitem %s was already COMPLETED or CANCELED", uid)
                 return workitem, False
 
-            self.logger.warning(f"Attempting to update status from {str(current_status)} to {str(new_status)}")
+            self.logger.warning("Attempting to update status from %s to %s", current_status, new_status)
             # Update status
             workitem.update_procedure_step_status(new_status)
             if new_status == WorkItemStatus.IN_PROGRESS:
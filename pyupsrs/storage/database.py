@@ -1,13 +1,62 @@
 """Database connection management."""
 
 import contextlib
+import json
 import sqlite3
-from collections.abc import Iterable
+import threading
+import zlib
+from collections.abc import Iterable, Iterator
+from itertools import islice
 from typing import Any
 
+from pydicom import Dataset
+
+# Applied to every new connection
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=60000",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+def dataset_to_blob(ds: Dataset) -> bytes:
+    """
+    Serialise a dataset for the dataset_json column, as zlib compressed DICOM JSON.
+
+    Args:
+        ds: The dataset.
+
+    Returns:
+        The column value.
+
+    """
+    return zlib.compress(json.dumps(ds.to_json_dict(), separators=(",", ":")).encode())
+
+
+def dataset_from_blob(blob: bytes) -> Dataset:
+    """
+    Read a dataset back from the dataset_json column.
+
+    Args:
+        blob: The column value.
+
+    Returns:
+        The dataset.
+
+    """
+    return Dataset.from_json(json.loads(zlib.decompress(blob)))
+
 
 class Database:
-    """Database connection manager."""
+    """
+    Database connection manager.
+
+    Each thread gets its own connection, which is kept open until close_all() is called.
+    Note that every connection to ":memory:" is a database of its own.
+    """
 
     def __init__(self, uri: str) -> None:
         """
@@ -18,6 +67,9 @@ class Database:
 
         """
         self.uri = uri
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
         self._initialize_db()
 
     def _initialize_db(self) -> None:
@@ -38,9 +90,13 @@ class Database:
                     patient_id TEXT,
                     accession_number TEXT,
                     procedure_step_type TEXT,
-                    procedure_code TEXT
+                    procedure_code TEXT,
+                    dataset_json BLOB
                 )
             """)
+            # Databases created before the full dataset was stored lack the column
+            if not any(column["name"] == "dataset_json" for column in cursor.execute("PRAGMA table_info(workitems)")):
+                cursor.execute("ALTER TABLE workitems ADD COLUMN dataset_json BLOB")
 
             # Create subscriptions table
             cursor.execute("""
@@ -56,27 +112,67 @@ class Database:
                 )
             """)
 
-            conn.commit()
+            # Indices for the worklist queries (filter on state, ordered by scheduled start) and
+            # the per AE title subscription lookups
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_workitems_status_sched ON workitems (status, scheduled_start_time)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_workitems_patient ON workitems (patient_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_workitems_accession ON workitems (accession_number)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_subs_subscriber ON subscriptions (subscriber_uid)")
+            # Completed and canceled workitems are only looked up by age, to clean them up
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_workitems_terminal_updated ON workitems (updated_at)"
+                " WHERE status IN ('COMPLETED', 'CANCELED')"
+            )
+
+            # Give the query planner statistics: a full ANALYZE the first time, after that
+            # PRAGMA optimize only re-analyzes what has changed enough
+            if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is None:
+                cursor.execute("ANALYZE")
+            else:
+                cursor.execute("PRAGMA optimize")
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Get the connection of the calling thread, opening it on first use.
+
+        Returns:
+            A database connection in autocommit mode.
+
+        """
+        conn: sqlite3.Connection | None = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.uri, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            for pragma in _PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
 
     @contextlib.contextmanager
-    def _get_connection(self) -> Iterable[sqlite3.Connection]:
+    def _get_connection(self) -> Iterator[sqlite3.Connection]:
         """
-        Get a database connection.
+        Get a database connection with a write transaction open.
+
+        The transaction is committed when the block exits normally and rolled back otherwise.
 
         Yields:
             A database connection.
 
         """
-        conn = sqlite3.connect(self.uri)
-        conn.row_factory = sqlite3.Row
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
         try:
             yield conn
-        finally:
-            conn.close()
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
 
-    def execute(self, query: str, params: tuple[Any, ...] | None = None) -> sqlite3.Cursor:
+    def execute_write(self, query: str, params: tuple[Any, ...] | None = None) -> sqlite3.Cursor:
         """
-        Execute a query.
+        Execute a query that changes the database, in a transaction of its own.
 
         Args:
             query: The SQL query.
@@ -87,10 +183,49 @@ class Database:
 
         """
         with self._get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(query, params or ())
-            conn.commit()
-            return cursor
+            return conn.execute(query, params or ())
+
+    def execute_many(self, query: str, seq_of_params: Iterable[tuple[Any, ...]], chunk_size: int = 1000) -> int:
+        """
+        Execute a query once for each set of parameters, all in one transaction.
+
+        Args:
+            query: The SQL query, best a module level constant so that the connection's statement cache is hit.
+            seq_of_params: The parameters of each execution.
+            chunk_size: The number of parameter sets handed to executemany at a time.
+
+        Returns:
+            The number of rows changed.
+
+        """
+        params_iter = iter(seq_of_params)
+        row_count = 0
+        with self._get_connection() as conn:
+            while chunk := list(islice(params_iter, chunk_size)):
+                row_count += conn.executemany(query, chunk).rowcount
+        return row_count
+
+    def execute_read(self, query: str, params: tuple[Any, ...] | None = None) -> sqlite3.Cursor:
+        """
+        Execute a query that only reads, without a transaction to commit.
+
+        Args:
+            query: The SQL query.
+            params: The query parameters.
+
+        Returns:
+            The cursor.
+
+        """
+        return self._connection().execute(query, params or ())
+
+    def close_all(self) -> None:
+        """Close the connections of all threads, the next use opens new ones."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
 
     def fetch_one(self, query: str, params: tuple[Any, ...] | None = None) -> dict[str, Any] | None:
         """
@@ -104,11 +239,11 @@ class Database:
             The row as a dictionary, or None if not found.
 
         """
-        cursor = self.execute(query, params)
+        cursor = self.execute_read(query, params)
         row = cursor.fetchone()
         return dict(row) if row else None
 
-    def fetch_all(self, query: str, params: tuple[Any, ...] | None = None) -> list[dict[str, Any]]:
+    def fetch_all(self, query: str, params: tuple[Any, ...] | None = None) -> list[sqlite3.Row]:
         """
         Fetch all rows.
 
@@ -117,9 +252,25 @@ class Database:
             params: The query parameters.
 
         Returns:
-            The rows as a list of dictionaries.
+            The rows, which can be indexed by position or column name.
+
+        """
+        return self.execute_read(query, params).fetchall()
+
+    def fetch_iter(self, query: str, params: tuple[Any, ...] | None = None) -> Iterator[sqlite3.Row]:
+        """
+        Fetch rows one at a time, without building a list of all of them.
+
+        Args:
+            query: The SQL query.
+            params: The query parameters.
+
+        Yields:
+            The rows, which can be indexed by position or column name.
 
         """
-        cursor = self.execute(query, params)
-        rows = cursor.fetchall()
-        return [dict(row) for row in rows]
+        cursor = self.execute_read(query, params)
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
@@ -1,11 +1,43 @@
 """Repository for accessing UPS subscriptions."""
 
-from copy import deepcopy
+import threading
 
 from pyupsrs.domain.models.ups import Subscription
 from pyupsrs.utils.class_logger import LoggerMixin
 
-_local_store: set[Subscription] = set()
+# (workitem_uid, ae_title) -> subscription, at most one subscription per pair
+_by_pair: dict[tuple[str, str], Subscription] = {}
+# Secondary indices over the subscriptions in _by_pair
+_by_workitem: dict[str, set[Subscription]] = {}
+_by_ae_title: dict[str, set[Subscription]] = {}
+# A change touches all three indices, under keys of both the workitem and the AE title, so one lock guards them all.
+# It is uncontended in the (single threaded) event loop, and keeps the indices consistent when threads share the store
+_lock = threading.RLock()
+
+
+def _add(subscription: Subscription) -> None:
+    with _lock:
+        _discard(subscription.workitem_uid, subscription.ae_title)
+        _by_pair[(subscription.workitem_uid, subscription.ae_title)] = subscription
+        _by_workitem.setdefault(subscription.workitem_uid, set()).add(subscription)
+        _by_ae_title.setdefault(subscription.ae_title, set()).add(subscription)
+
+
+def _discard(workitem_uid: str, ae_title: str) -> bool:
+    with _lock:
+        if (subscription := _by_pair.pop((workitem_uid, ae_title), None)) is None:
+            return False
+        # Subscriptions compare equal on (workitem_uid, ae_title), so this removes the stored one from the indices
+        _remove_from_index(_by_workitem, workitem_uid, subscription)
+        _remove_from_index(_by_ae_title, ae_title, subscription)
+        return True
+
+
+def _remove_from_index(index: dict[str, set[Subscription]], key: str, subscription: Subscription) -> None:
+    if (subscriptions := index.get(key)) is not None:
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del index[key]
 
 
 class SubscriptionRepository(LoggerMixin):
@@ -33,20 +65,26 @@ class SubscriptionRepository(LoggerMixin):
 
         """
         # TODO: Implement database persistence
-
-        self._discard_suspended_equivalent(subscription)
-        _local_store.add(subscription)
+        # Replaces any existing subscription of the AE title to the workitem, which also reactivates a suspended one
+        _add(subscription)
         return subscription
 
-    def _discard_suspended_equivalent(self, subscription: Subscription) -> None:
-        self.logger.warning(f"Checking for suspended equivalent for {subscription}")
-        if get_by_workitem_and_ae_title := self.get_by_workitem_and_ae_title(subscription.workitem_uid, subscription.ae_title):
-            self.logger.warning(f"Current {get_by_workitem_and_ae_title} contains equivalent for requested {subscription}")
-            for existing_subscription in get_by_workitem_and_ae_title:
-                self.logger.warning(f"{existing_subscription} is equivalent to requested {subscription}")
-                if existing_subscription.suspended:
-                    self.logger.warning(f"Discarding suspended equivalent {existing_subscription}")
-                    _local_store.discard(existing_subscription)
+    def create_bulk(self, subscriptions: list[Subscription]) -> list[Subscription]:
+        """
+        Create several subscriptions at once.
+
+        Args:
+            subscriptions: The subscriptions to create.
+
+        Returns:
+            The created subscriptions.
+
+        """
+        # TODO: Implement database persistence, with one Database.execute_many for all of them
+        with _lock:
+            for subscription in subscriptions:
+                _add(subscription)
+        return subscriptions
 
     def get_by_workitem_and_ae_title(self, workitem_uid: str, ae_title: str) -> list[Subscription] | None:
         """
@@ -61,7 +99,24 @@ class SubscriptionRepository(LoggerMixin):
 
         """
         # TODO: Implement database retrieval
-        return [deepcopy(x) for x in _local_store if x.ae_title == ae_title and x.workitem_uid == workitem_uid]
+        subscription = _by_pair.get((workitem_uid, ae_title))
+        return [subscription] if subscription is not None else []
+
+    def get(self, workitem_uid: str, ae_title: str) -> Subscription | None:
+        """
+        Get the subscription of an AE title to a workitem.
+
+        Args:
+            workitem_uid: The UID of the workitem.
+            ae_title: The AE Title of the subscriber.
+
+        Returns:
+            The subscription, or None if not found.
+
+        """
+        # TODO: Implement database retrieval
+        subscription = _by_pair.get((workitem_uid, ae_title))
+        return subscription
 
     def get_by_ae_title(self, ae_title: str) -> list[Subscription] | None:
         """
@@ -76,7 +131,8 @@ class SubscriptionRepository(LoggerMixin):
 
         """
         # TODO: Implement database retrieval
-        return [deepcopy(x) for x in _local_store if x.ae_title == ae_title]
+        with _lock:
+            return list(_by_ae_title.get(ae_title, ()))
 
     def get_by_workitem(self, workitem_uid: str) -> list[Subscription]:
         """
@@ -90,7 +146,23 @@ class SubscriptionRepository(LoggerMixin):
 
         """
         # TODO: Implement database retrieval
-        return [deepcopy(x) for x in _local_store if x.workitem_uid == workitem_uid]
+        with _lock:
+            return list(_by_workitem.get(workitem_uid, ()))
+
+    def update(self, subscription: Subscription) -> Subscription:
+        """
+        Replace the stored subscription for the same workitem and AE title.
+
+        Args:
+            subscription: The updated subscription.
+
+        Returns:
+            The updated subscription.
+
+        """
+        # TODO: Implement database persistence
+        _add(subscription)
+        return subscription
 
     def delete(self, workitem_uid: str, ae_title: str) -> bool:
         """
@@ -104,14 +176,4 @@ class SubscriptionRepository(LoggerMixin):
             True if deleted, False otherwise.
 
         """
-        if subscription_to_delete := next(
-            (
-                subscription
-                for subscription in _local_store
-                if subscription.ae_title == ae_title and subscription.workitem_uid == workitem_uid
-            ),
-            None,
-        ):
-            _local_store.discard(subscription_to_delete)
-            return True
-        return False
+        return _discard(workitem_uid, ae_title)
@@ -1,17 +1,189 @@
 """Repository for accessing UPS workitems."""
 
-from copy import deepcopy
+import logging
+import threading
+from bisect import bisect_left, bisect_right, insort
 from datetime import datetime
+from functools import lru_cache
+from itertools import count
+from operator import itemgetter
 from typing import Any
 
 from pydicom import Dataset
-from pydicom.datadict import keyword_for_tag
+from pydicom.datadict import keyword_for_tag, tag_for_keyword
 
-from pyupsrs.domain.models.ups import WorkItem
+from pyupsrs.domain.models.ups import WorkItem, WorkItemStatus
 from pyupsrs.utils.class_logger import LoggerMixin
-from pyupsrs.utils.dicom_query_matcher import query_datasets
+from pyupsrs.utils.dicom_query_matcher import parse_dicom_date, query_datasets
 
 local_store: dict[str, WorkItem] = {}
+# Guards local_store together with its secondary indices, which a change has to keep consistent with each other
+_lock = threading.RLock()
+
+# Secondary indices used by get_filtered to narrow down the workitems handed to the matcher.
+# They are maintained by create/update/delete, may hold UIDs that are no longer in local_store,
+# and only ever pre-select: the candidates are still run through the full matcher.
+_INDEXED_KEYWORDS = ("PatientID", "ProcedureStepState")
+# keyword -> value -> UIDs of the workitems with that value
+local_store_idx: dict[str, dict[str, set[str]]] = {keyword: {} for keyword in _INDEXED_KEYWORDS}
+# (ScheduledProcedureStepStartDateTime, UID), sorted, for range queries
+_start_datetime_idx: list[tuple[datetime, str]] = []
+_CODE_SEQUENCE_KEYWORDS = ("ScheduledStationNameCodeSequence", "ScheduledWorkitemCodeSequence")
+# keyword -> (CodeValue, CodingSchemeDesignator) of any item -> UIDs of the workitems with that code in the sequence
+_code_idx: dict[str, dict[tuple[str, str], set[str]]] = {keyword: {} for keyword in _CODE_SEQUENCE_KEYWORDS}
+# Tags of all indexed attributes, a change to any other attribute leaves the indices as they are
+_INDEXED_TAGS = frozenset(
+    tag_for_keyword(keyword)
+    for keyword in (*_INDEXED_KEYWORDS, "ScheduledProcedureStepStartDateTime", *_CODE_SEQUENCE_KEYWORDS)
+)
+_PROCEDURE_STEP_STATE_TAG = tag_for_keyword("ProcedureStepState")
+# UID -> (indexed values, start date time, codes per code sequence) the workitem was indexed with
+_indexed_values: dict[str, tuple[tuple[str | None, ...], datetime | None, tuple[frozenset[tuple[str, str]], ...]]] = {}
+# UID -> creation sequence number, to return indexed candidates in creation order
+_creation_order: dict[str, int] = {}
+_creation_counter = count()
+_start_datetime_key = itemgetter(0)
+
+
+def _codes(sequence: Any) -> frozenset[tuple[str, str]]:  # noqa: ANN401
+    """Get the (CodeValue, CodingSchemeDesignator) pairs of the items of a code sequence, as the matcher compares them."""
+    if not sequence:
+        return frozenset()
+    return frozenset(
+        (item.CodeValue, item.CodingSchemeDesignator)
+        for item in sequence
+        if "CodeValue" in item and "CodingSchemeDesignator" in item
+    )
+
+
+def _unindex(uid: str) -> None:
+    """Remove a workitem from the secondary indices."""
+    indexed = _indexed_values.pop(uid, None)
+    if indexed is None:
+        return
+    values, start_datetime, codes = indexed
+    for keyword, value in zip(_INDEXED_KEYWORDS, values, strict=True):
+        if value is not None:
+            uids = local_store_idx[keyword][value]
+            uids.discard(uid)
+            if not uids:
+                del local_store_idx[keyword][value]
+    if start_datetime is not None:
+        position = bisect_left(_start_datetime_idx, (start_datetime, uid))
+        if position < len(_start_datetime_idx) and _start_datetime_idx[position] == (start_datetime, uid):
+            del _start_datetime_idx[position]
+    for keyword, sequence_codes in zip(_CODE_SEQUENCE_KEYWORDS, codes, strict=True):
+        for code in sequence_codes:
+            uids = _code_idx[keyword][code]
+            uids.discard(uid)
+            if not uids:
+                del _code_idx[keyword][code]
+
+
+def _index(workitem: WorkItem) -> None:
+    """(Re-)add a workitem to the secondary indices, using the current values of its dataset."""
+    uid = workitem.uid
+    ds = workitem.ds
+    if uid is None or ds is None:
+        return
+    _unindex(uid)
+    # the matcher compares the string form of the dataset value
+    values = tuple(str(ds[keyword].value) if keyword in ds else None for keyword in _INDEXED_KEYWORDS)
+    for keyword, value in zip(_INDEXED_KEYWORDS, values, strict=True):
+        if value is not None:
+            local_store_idx[keyword].setdefault(value, set()).add(uid)
+    start_value = ds.get("ScheduledProcedureStepStartDateTime", None)
+    start_datetime = parse_dicom_date(start_value) if isinstance(start_value, str) else None
+    if start_datetime is not None:
+        insort(_start_datetime_idx, (start_datetime, uid))
+    codes = tuple(_codes(ds.get(keyword, None)) for keyword in _CODE_SEQUENCE_KEYWORDS)
+    for keyword, sequence_codes in zip(_CODE_SEQUENCE_KEYWORDS, codes, strict=True):
+        for code in sequence_codes:
+            _code_idx[keyword].setdefault(code, set()).add(uid)
+    _indexed_values[uid] = (values, start_datetime, codes)
+
+
+def _merge(stored_ds: Dataset, change_ds: Dataset) -> set[int]:
+    """
+    Copy the elements of change_ds into stored_ds, skipping those that are already the same.
+
+    Args:
+        stored_ds: The dataset to change.
+        change_ds: The elements to set.
+
+    Returns:
+        The tags of the elements that changed.
+
+    """
+    changed_tags = set()
+    for elem in change_ds:
+        tag = elem.tag
+        if tag in stored_ds:
+            stored_elem = stored_ds[tag]
+            if stored_elem.VR == elem.VR and stored_elem.value == elem.value:
+                continue
+        stored_ds[tag] = elem
+        changed_tags.add(tag)
+    return changed_tags
+
+
+@lru_cache(maxsize=8192)
+def _kw_for(include_field_token: str) -> str:
+    """Translate an includefield token given as a tag (e.g. 00100020) to its keyword, keywords are returned as is."""
+    if len(include_field_token) == 8:
+        try:
+            return keyword_for_tag(int(include_field_token, 16))
+        except ValueError:
+            pass
+    return include_field_token
+
+
+def _page(items: list[Any], offset: int | None, limit: int | None) -> list[Any]:
+    """Get the page of at most limit items that starts at offset, without copying when there is nothing to cut."""
+    if offset is None and limit is None:
+        return items
+    start = offset or 0
+    return items[start:] if limit is None else items[start : start + limit]
+
+
+def _candidate_uids(query: Dataset) -> set[str] | None:
+    """
+    Get the UIDs of the workitems that can match the query, according to the secondary indices.
+
+    Args:
+        query: The query.
+
+    Returns:
+        The candidate UIDs, or None if the query has no constraint the indices can answer.
+
+    """
+    candidates: set[str] | None = None
+    sop_instance_uid = query.get("SOPInstanceUID", None)
+    if isinstance(sop_instance_uid, str) and sop_instance_uid and "*" not in sop_instance_uid and "?" not in sop_instance_uid:
+        candidates = {sop_instance_uid}
+
+    for keyword, by_value in local_store_idx.items():
+        value = query.get(keyword, None)
+        if isinstance(value, str) and value and "*" not in value and "?" not in value:
+            uids = by_value.get(value, set())
+            candidates = set(uids) if candidates is None else candidates & uids
+
+    start_value = query.get("ScheduledProcedureStepStartDateTime", None)
+    if isinstance(start_value, str) and "*" not in start_value and "?" not in start_value and start_value.count("-") == 1:
+        lower_str, upper_str = start_value.split("-")
+        lower, upper = parse_dicom_date(lower_str), parse_dicom_date(upper_str)
+        if lower or upper:
+            start = bisect_left(_start_datetime_idx, lower, key=_start_datetime_key) if lower else 0
+            end = bisect_right(_start_datetime_idx, upper, key=_start_datetime_key) if upper else len(_start_datetime_idx)
+            uids = {uid for _, uid in _start_datetime_idx[start:end]}
+            candidates = uids if candidates is None else candidates & uids
+
+    # every code of the query has to be among the codes of the workitem's sequence
+    for keyword, by_code in _code_idx.items():
+        for code in _codes(query.get(keyword, None)):
+            uids = by_code.get(code, set())
+            candidates = set(uids) if candidates is None else candidates & uids
+    return candidates
 
 
 class WorkItemRepository(LoggerMixin):
@@ -39,9 +211,28 @@ class WorkItemRepository(LoggerMixin):
 
         """
         # TODO: Implement database persistence
-        local_store[workitem.uid] = workitem
+        with _lock:
+            if workitem.uid not in local_store:
+                # like local_store, a replaced workitem keeps its place
+                _creation_order[workitem.uid] = next(_creation_counter)
+            local_store[workitem.uid] = workitem
+            _index(workitem)
         return workitem
 
+    def create_bulk(self, workitems: list[WorkItem]) -> list[WorkItem]:
+        """
+        Create several workitems at once.
+
+        Args:
+            workitems: The workitems to create.
+
+        Returns:
+            The created workitems.
+
+        """
+        # TODO: Implement database persistence, with one Database.execute_many for all of them
+        return [self.create(workitem) for workitem in workitems]
+
     def get_by_uid(self, uid: str) -> WorkItem | None:
         """
         Get a workitem by UID.
@@ -50,11 +241,13 @@ class WorkItemRepository(LoggerMixin):
             uid: The UID of the workitem.
 
         Returns:
-            The workitem, or None if not found.
+            A copy of the workitem, or None if not found. Changes to the copy are stored by passing it to update(),
+            which keeps the secondary indices consistent with them.
 
         """
         # TODO: Implement database retrieval
-        return local_store.get(uid)
+        workitem = local_store.get(uid)
+        return workitem.copy_for_edit() if workitem is not None else None
 
     def update(self, workitem: WorkItem) -> WorkItem:
         """
@@ -69,18 +262,31 @@ class WorkItemRepository(LoggerMixin):
         """
         if not workitem.uid:
             print("No UID in change/update workitem")
-        if stored_workitem := local_store[workitem.uid]:
-            if change_ds := workitem.ds:
-                if stored_ds := stored_workitem.ds:
-                    stored_ds.update(change_ds)
+        with _lock:
+            if stored_workitem := local_store[workitem.uid]:
+                if change_ds := workitem.ds:
+                    if stored_ds := stored_workitem.ds:
+                        if change_ds is stored_ds:
+                            # the stored workitem itself was changed, there is nothing to merge but its values may be new
+                            _index(stored_workitem)
+                        else:
+                            changed_tags = _merge(stored_ds, change_ds)
+                            if _PROCEDURE_STEP_STATE_TAG in changed_tags:
+                                stored_workitem.status = WorkItemStatus.from_string(stored_ds.ProcedureStepState)
+                            if not _INDEXED_TAGS.isdisjoint(changed_tags):
+                                _index(stored_workitem)
+                            # the workitem is a copy from get_by_uid or a change built by the caller
+                            if workitem.transaction_uid is not None:
+                                stored_workitem.transaction_uid = workitem.transaction_uid
+                            stored_workitem.updated_at = max(stored_workitem.updated_at, workitem.updated_at)
+                    else:
+                        print(f"Unable to find dataset in stored workitem {workitem.uid}")
                 else:
-                    print(f"Unable to find dataset in stored workitem {workitem.uid}")
+                    print("No Change Dataset in update")
             else:
-                print("No Change Dataset in update")
-        else:
-            print(f"Unable to find stored workitem with uid: {workitem.uid}")
+                print(f"Unable to find stored workitem with uid: {workitem.uid}")
 
-        return local_store[workitem.uid]
+            return local_store[workitem.uid]
 
     def delete(self, uid: str) -> bool:
         """
@@ -94,9 +300,25 @@ class WorkItemRepository(LoggerMixin):
 
         """
         # TODO: Implement database deletion
-        del local_store[uid]
+        with _lock:
+            del local_store[uid]
+            _unindex(uid)
+            _creation_order.pop(uid, None)
         return True
 
+    def clear(self) -> None:
+        """Delete all workitems, together with the secondary indices built for them."""
+        # TODO: Implement database deletion
+        with _lock:
+            local_store.clear()
+            for by_value in local_store_idx.values():
+                by_value.clear()
+            _start_datetime_idx.clear()
+            for by_code in _code_idx.values():
+                by_code.clear()
+            _indexed_values.clear()
+            _creation_order.clear()
+
     def cancel(self, uid: str, cancel_workitem: WorkItem) -> bool:
         """
         Cancel a workitem.
@@ -110,10 +332,11 @@ class WorkItemRepository(LoggerMixin):
 
         """
         # TODO: Implement database deletion
-        stored_workitem = local_store[uid]
-        stored_workitem.updated_at = datetime.now()
-        stored_workitem.status = cancel_workitem.status
-        self.update(cancel_workitem)
+        with _lock:
+            stored_workitem = local_store[uid]
+            stored_workitem.updated_at = datetime.now()
+            stored_workitem.status = cancel_workitem.status
+            self.update(cancel_workitem)
         # del local_store[uid]
         return True
 
@@ -122,11 +345,12 @@ class WorkItemRepository(LoggerMixin):
         Get all workitems.
 
         Returns:
-            A list of all workitems.
+            A list of all workitems. These are the stored workitems, not copies, so treat them as read only.
 
         """
         # TODO: Implement database retrieval
-        return deepcopy(list(local_store.values()))
+        with _lock:
+            return list(local_store.values())
 
     def get_filtered(
         self,
@@ -160,27 +384,43 @@ class WorkItemRepository(LoggerMixin):
         the SCP is permitted to over-filter the result set based upon this selection
         and return just the worklist items for the selected fraction.
         """
-        self.logger.warning("Fuzzy Matching not implemented")
+        log = self.logger
+        log.warning("Fuzzy Matching not implemented")
         if not match and not include_field and not fuzzy_matching:
-            return self.get_all()
+            return _page(self.get_all(), offset, limit)
 
         query = match
 
-        datasets = [x.ds for x in local_store.values()]
-        matching_datasets = query_datasets(query=query, datasets=datasets)
-        uid_list = [str(x.SOPInstanceUID) for x in matching_datasets]
-        matching_workitem_list = [local_store[workitem_uid] for workitem_uid in uid_list]
-        copy_of_workitems = deepcopy(matching_workitem_list)  # we are potentially going to be removing a lot.
+        if query is None or len(query) == 0:
+            # an empty query matches every workitem
+            matching_workitem_list = _page(self.get_all(), offset, limit)
+        else:
+            with _lock:
+                candidate_uids = _candidate_uids(query)
+                if candidate_uids is None:
+                    datasets = [x.ds for x in local_store.values()]
+                else:
+                    candidates = sorted((uid for uid in candidate_uids if uid in local_store), key=_creation_order.__getitem__)
+                    datasets = [local_store[uid].ds for uid in candidates]
+            # match outside the lock, a workitem deleted in the meantime is left out below
+            matching_datasets = query_datasets(query=query, datasets=datasets)
+            uid_list = [str(x.SOPInstanceUID) for x in _page(matching_datasets, offset, limit)]
+            matching_workitem_list = [
+                workitem for workitem_uid in uid_list if (workitem := local_store.get(workitem_uid)) is not None
+            ]
 
-        include_keywords = [keyword_for_tag(int(kw, 16)) if kw.isnumeric() else kw for kw in include_field]
+        include_keywords = frozenset(_kw_for(kw) for kw in include_field)
 
-        self.logger.warning(f"Includefield as keywords {include_keywords}")
+        if log.isEnabledFor(logging.WARNING):
+            log.warning("Includefield as keywords %s", sorted(include_keywords))
 
         if include_field and "all" not in include_field:
-            self.logger.warning(f"includefield was specified and will restrict content returned: {include_field}")
-            for workitem in copy_of_workitems:
-                for elem in workitem.ds:
-                    # tag_as_string = f"{elem.tag:08x}"
-                    if elem.keyword not in include_keywords:  # and tag_as_string not in include_field:
-                        del workitem.ds[elem.keyword]
-        return copy_of_workitems[offset:limit]
+            log.warning("includefield was specified and will restrict content returned: %s", include_field)
+            # only copy what is going to be pruned (the requested page), the stored workitems are returned as is otherwise
+            matching_workitem_list = [x.copy_for_edit() for x in matching_workitem_list]
+            for workitem in matching_workitem_list:
+                ds = workitem.ds
+                # collect first, deleting while iterating over the dataset is not safe
+                for tag in [elem.tag for elem in ds if elem.keyword not in include_keywords]:
+                    del ds[tag]
+        return matching_workitem_list
@@ -6,7 +6,12 @@ import logging
 class LoggerMixin:
     """A mixin class that provides a class-specific logger."""
 
-    _loggers: dict[str, logging.Logger] = {}
+    _class_logger: logging.Logger = logging.getLogger(f"{__name__}.LoggerMixin")
+
+    def __init_subclass__(cls, **kwargs: object) -> None:
+        """Create the logger of each subclass once, when the class is defined."""
+        super().__init_subclass__(**kwargs)
+        cls._class_logger = logging.getLogger(f"{cls.__module__}.{cls.__name__}")
 
     @classmethod
     def get_logger(cls) -> logging.Logger:
@@ -17,10 +22,7 @@ class LoggerMixin:
             logging.Logger: A logger instance specific to the class.
 
         """
-        class_name = cls.__name__
-        if class_name not in cls._loggers:
-            cls._loggers[class_name] = logging.getLogger(f"{cls.__module__}.{class_name}")
-        return cls._loggers[class_name]
+        return cls._class_logger
 
     @property
     def logger(self) -> logging.Logger:
@@ -31,7 +33,7 @@ class LoggerMixin:
             logging.Logger: A logger instance specific to the class.
 
         """
-        return self.get_logger()
+        return self._class_logger
 
 
 def configure_logging(level: int = logging.INFO, log_format: str | None = None, log_file: str | None = None) -> None:
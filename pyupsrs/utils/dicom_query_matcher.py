@@ -1,7 +1,12 @@
 """Module for DICOM query matching functionality."""
 
+import logging
 import re
+from collections.abc import Callable
 from datetime import datetime
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any
 
 import pydicom
 import pydicom.valuerep
@@ -12,6 +17,8 @@ DT = "DT"  # Date Time
 TM = "TM"  # Time
 DA = "DA"  # Date
 
+logger = logging.getLogger(__name__)
+
 
 def parse_dicom_date(date_str: str) -> datetime | None:
     """
@@ -22,58 +29,101 @@ def parse_dicom_date(date_str: str) -> datetime | None:
     - TM format (HHMMSS.FFFFFF)
     - DT format (YYYYMMDDHHMMSS.FFFFFF)
 
-    Returns None if parsing fails.
+    Returns None if parsing fails. Results are cached, the same values are parsed for every query.
     """
-    if not date_str or date_str == "*":
+    try:
+        return _parse_dicom_date_cached(date_str)
+    except TypeError:  # not hashable, e.g. a multi-valued element
+        return _parse_dicom_date(date_str)
+
+
+def _digits(text: str) -> int:
+    """Convert a fixed width field of ASCII digits (only, unlike int()) to an int."""
+    if not (text.isascii() and text.isdigit()):
+        raise ValueError(f"not a number: '{text}'")
+    return int(text)
+
+
+def _combine(date_part: str, time_part: str, fraction: str) -> datetime:
+    """Build a datetime from YYYYMMDD, HHMMSS and the fractional seconds (up to 6 digits, may be empty)."""
+    return datetime(
+        _digits(date_part[0:4]),
+        _digits(date_part[4:6]),
+        _digits(date_part[6:8]),
+        _digits(time_part[0:2]),
+        _digits(time_part[2:4]),
+        _digits(time_part[4:6]),
+        _digits(fraction.ljust(6, "0")[:6]),
+    )
+
+
+def _parse_da(whole: str, fraction: str) -> datetime:
+    """Parse DA (YYYYMMDD), which has no fractional part."""
+    if fraction:
+        raise ValueError("DA has no fractional seconds")
+    return datetime(_digits(whole[0:4]), _digits(whole[4:6]), _digits(whole[6:8]))
+
+
+def _parse_tm(whole: str, fraction: str) -> datetime:
+    """Parse TM (HHMMSS.FFFFFF), on 1900-01-01."""
+    return _combine("19000101", whole, fraction)
+
+
+def _parse_dt(whole: str, fraction: str) -> datetime:
+    """Parse DT (YYYYMMDDHHMMSS.FFFFFF)."""
+    return _combine(whole[:8], whole[8:], fraction)
+
+
+# Parsers by the length of the value before the fractional seconds, for the complete forms of each VR
+_PARSERS: dict[int, Callable[[str, str], datetime]] = {8: _parse_da, 6: _parse_tm, 14: _parse_dt}
+
+
+def _parse_dicom_date(date_str: str) -> datetime | None:
+    """Parse a DICOM date/time string, see parse_dicom_date."""
+    # Every DA, TM and DT value starts with a digit, so wildcards and garbage are rejected without raising
+    if not date_str or not date_str[0].isdigit():
         return None
 
     try:
         # Remove any timezone offset for simplicity
         date_str = date_str.split("+")[0].split("-")[0]
 
-        # Handle DA format (YYYYMMDD)
-        if len(date_str) == 8:
-            return datetime.strptime(date_str, "%Y%m%d")
-
-        # Handle TM format (HHMMSS.FFFFFF)
-        elif len(date_str) <= 16 and "." in date_str:
-            parts = date_str.split(".")
-            time_part = parts[0].ljust(6, "0")  # Pad with zeros if needed
-            if len(time_part) > 6:
-                time_part = time_part[:6]
-
-            if len(parts) > 1:
-                # Handle microseconds
-                micro = parts[1].ljust(6, "0")[:6]
-                return datetime.strptime(f"19000101{time_part}.{micro}", "%Y%m%d%H%M%S.%f")
-            else:
-                return datetime.strptime(f"19000101{time_part}", "%Y%m%d%H%M%S")
-
-        # Handle TM format without microseconds
-        elif len(date_str) <= 6:
-            time_part = date_str.ljust(6, "0")  # Pad with zeros if needed
-            if len(time_part) > 6:
-                time_part = time_part[:6]
-            return datetime.strptime(f"19000101{time_part}", "%Y%m%d%H%M%S")
-
-        # Handle DT format (YYYYMMDDHHMMSS.FFFFFF)
-        else:
-            parts = date_str.split(".")
-            datetime_part = parts[0].ljust(14, "0")  # Pad with zeros if needed
-            if len(datetime_part) > 14:
-                datetime_part = datetime_part[:14]
-
-            if len(parts) > 1:
-                # Handle microseconds
-                micro = parts[1].ljust(6, "0")[:6]
-                return datetime.strptime(f"{datetime_part}.{micro}", "%Y%m%d%H%M%S.%f")
-            else:
-                return datetime.strptime(datetime_part, "%Y%m%d%H%M%S")
+        # The fields have fixed widths, so they are sliced out rather than parsed with strptime
+        whole, _, fraction = date_str.partition(".")
+        parser = _PARSERS.get(len(whole))
+        if parser is not None:
+            return parser(whole, fraction)
+
+        # Partial TM and DT values are padded with zeros, longer DT values are truncated
+        if len(whole) < 6:
+            return _parse_tm(whole.ljust(6, "0"), fraction)
+        return _parse_dt(whole.ljust(14, "0")[:14], fraction)
     except Exception as e:
-        print(f"Error parsing DICOM date '{date_str}': {e}")
+        logger.debug("Error parsing DICOM date %r: %s", date_str, e)
         return None
 
 
+_parse_dicom_date_cached = lru_cache(maxsize=4096)(_parse_dicom_date)
+
+
+@lru_cache(maxsize=1024)
+def wildcard_pattern(query_value: str) -> re.Pattern[str]:
+    """
+    Compile a query value with DICOM wildcards into a regular expression, to be used with fullmatch.
+
+    "*" matches any sequence of characters and "?" any single character, everything else matches literally
+    (so the "." in a UID is not a regular expression wildcard).
+
+    Args:
+        query_value: The query value.
+
+    Returns:
+        The compiled pattern.
+
+    """
+    return re.compile(re.escape(query_value).replace(r"\*", ".*").replace(r"\?", "."))
+
+
 def match_datetime(query_datetime: str, dataset_datetime: str) -> bool:
     """
     Match date/time values according to DICOM rules.
@@ -90,8 +140,7 @@ def match_datetime(query_datetime: str, dataset_datetime: str) -> bool:
 
     # Handle wildcard patterns first
     if "*" in query_datetime or "?" in query_datetime:
-        pattern = "^" + query_datetime.replace("*", ".*").replace("?", ".") + "$"
-        return bool(re.match(pattern, dataset_datetime))
+        return bool(wildcard_pattern(query_datetime).fullmatch(dataset_datetime))
 
     # Handle range matching
     if "-" in query_datetime:
@@ -151,20 +200,23 @@ def match_ups_specific_attributes(query: Dataset, dataset: Dataset, tag: int) ->
     return True  # Default to letting the standard sequence matcher handle it
 
 
+# Known code sequence tags in UPS
+UPS_CODE_SEQUENCE_TAGS = frozenset(
+    {
+        0x00404025,  # Scheduled Station Name Code Sequence
+        0x00404018,  # Scheduled Workitem Code Sequence
+        # Add other known code sequence tags as needed
+    }
+)
+
+
 def is_code_sequence(elem: pydicom.DataElement, tag: int = None) -> bool:
     """
     Determine if a data element is a code sequence.
 
     Some tags are known code sequences in UPS.
     """
-    # Known code sequence tags in UPS
-    ups_code_sequence_tags = [
-        0x00404025,  # Scheduled Station Name Code Sequence
-        0x00404018,  # Scheduled Workitem Code Sequence
-        # Add other known code sequence tags as needed
-    ]
-
-    if tag in ups_code_sequence_tags:
+    if tag in UPS_CODE_SEQUENCE_TAGS:
         return True
 
     if elem.VR != "SQ" or len(elem.value) == 0:
@@ -194,178 +246,196 @@ def match_code_sequence(query_seq: list[Dataset], dataset_seq: list[Dataset], ta
     if not dataset_seq:  # Can't match against empty dataset sequence
         return False
 
-    # Handle Scheduled Station Name Code Sequence (0040,4025)
-    if tag == 0x00404025:
-        return match_scheduled_station_name(query_seq, dataset_seq)
+    # UPS specific matching of the sequence, or the default code sequence matching
+    return _CODE_SEQ_MATCHERS.get(tag, _match_code_seq)(query_seq, dataset_seq)
 
-    # Handle Scheduled Workitem Code Sequence (0040,4018)
-    if tag == 0x00404018:
-        return match_scheduled_workitem_code(query_seq, dataset_seq)
 
-    # Default code sequence matching
-    for query_item in query_seq:
-        match_found = False
+def _match_code_seq(query_seq: list[Dataset], dataset_seq: list[Dataset]) -> bool:
+    """
+    Match code sequences on CodeValue and CodingSchemeDesignator.
 
-        if "CodeValue" not in query_item or "CodingSchemeDesignator" not in query_item:
-            continue
+    Every query item that has both has to be present in the dataset sequence, items without them are ignored.
 
-        query_code_value = query_item.CodeValue
-        query_scheme = query_item.CodingSchemeDesignator
+    Args:
+        query_seq: The sequence from the query
+        dataset_seq: The sequence from the dataset
 
-        for ds_item in dataset_seq:
-            if "CodeValue" not in ds_item or "CodingSchemeDesignator" not in ds_item:
-                continue
+    Returns:
+        bool: True if sequences match, False otherwise
 
-            if ds_item.CodeValue == query_code_value and ds_item.CodingSchemeDesignator == query_scheme:
-                match_found = True
-                break
+    """
+    ds_codes = {
+        (item.CodeValue, item.CodingSchemeDesignator)
+        for item in dataset_seq
+        if "CodeValue" in item and "CodingSchemeDesignator" in item
+    }
+    return all(
+        (item.CodeValue, item.CodingSchemeDesignator) in ds_codes
+        for item in query_seq
+        if "CodeValue" in item and "CodingSchemeDesignator" in item
+    )
 
-        if not match_found:
-            return False
 
-    return True
+# IHE-RO TDW-II matches the Scheduled Station Name Code Sequence (filtering for the treatment delivery station)
+# and the Scheduled Workitem Code Sequence (filtering for specific treatment workitems) like any code sequence
+match_scheduled_station_name = _match_code_seq
+match_scheduled_workitem_code = _match_code_seq
 
+_CODE_SEQ_MATCHERS: dict[int, Callable[[list[Dataset], list[Dataset]], bool]] = {
+    0x00404025: match_scheduled_station_name,  # Scheduled Station Name Code Sequence
+    0x00404018: match_scheduled_workitem_code,  # Scheduled Workitem Code Sequence
+}
 
-def match_scheduled_station_name(query_seq: list[Dataset], dataset_seq: list[Dataset]) -> bool:
-    """
-    Match Scheduled Station Name Code Sequence according to IHE-RO TDW-II rules.
 
-    This requires matching on CodeValue and CodingSchemeDesignator.
+def match_query_to_dataset(query: Dataset, dataset: Dataset) -> bool:
     """
-    # For TDW-II, we need to match each code in the query against the dataset
-    for query_item in query_seq:
-        match_found = False
+    Match a DICOM query against a dataset, with special handling for UPS attributes.
 
-        if "CodeValue" not in query_item or "CodingSchemeDesignator" not in query_item:
-            continue
+    To match many datasets against the same query, compile it once with compile_query instead.
 
-        query_code_value = query_item.CodeValue
-        query_scheme = query_item.CodingSchemeDesignator
+    Args:
+        query: A DICOM dataset containing query parameters
+        dataset: The dataset to match
 
-        for ds_item in dataset_seq:
-            if "CodeValue" not in ds_item or "CodingSchemeDesignator" not in ds_item:
-                continue
+    Returns:
+        True if the dataset matches the query.
 
-            if ds_item.CodeValue == query_code_value and ds_item.CodingSchemeDesignator == query_scheme:
-                match_found = True
-                break
+    """
+    return compile_query(query)(dataset)
 
-        if not match_found:
-            return False
 
-    return True
+def _compile_datetime(query_datetime: str) -> Callable[[Any], bool]:
+    """Do the query dependent part of match_datetime once, returning the check of a dataset value."""
+    if not query_datetime or query_datetime == "*":
+        return lambda dataset_datetime: True
 
+    if "*" in query_datetime or "?" in query_datetime:
+        pattern = wildcard_pattern(query_datetime)
+        return lambda dataset_datetime: bool(pattern.fullmatch(dataset_datetime))
 
-def match_scheduled_workitem_code(query_seq: list[Dataset], dataset_seq: list[Dataset]) -> bool:
-    """
-    Match Scheduled Workitem Code Sequence according to IHE-RO TDW-II rules.
+    if "-" in query_datetime:
+        range_parts = query_datetime.split("-")
+        if len(range_parts) == 2:
+            start_date = parse_dicom_date(range_parts[0])
+            end_date = parse_dicom_date(range_parts[1])
+            if start_date or end_date:
 
-    This is typically used to filter for specific treatment workitems.
-    """
-    # Similar to standard code sequence matching but with IHE-RO TDW-II specific rules
-    for query_item in query_seq:
-        match_found = False
+                def in_range(dataset_datetime: Any) -> bool:  # noqa: ANN401
+                    ds_date = parse_dicom_date(dataset_datetime)
+                    if not ds_date:
+                        return False
+                    return (start_date is None or start_date <= ds_date) and (end_date is None or ds_date <= end_date)
 
-        if "CodeValue" not in query_item or "CodingSchemeDesignator" not in query_item:
-            continue
+                return in_range
 
-        query_code_value = query_item.CodeValue
-        query_scheme = query_item.CodingSchemeDesignator
+    query_dt = parse_dicom_date(query_datetime)
 
-        for ds_item in dataset_seq:
-            if "CodeValue" not in ds_item or "CodingSchemeDesignator" not in ds_item:
-                continue
+    def equal(dataset_datetime: Any) -> bool:  # noqa: ANN401
+        dataset_dt = parse_dicom_date(dataset_datetime)
+        if query_dt and dataset_dt:
+            return query_dt == dataset_dt
+        return query_datetime == dataset_datetime
 
-            if ds_item.CodeValue == query_code_value and ds_item.CodingSchemeDesignator == query_scheme:
-                match_found = True
-                break
+    return equal
 
-        if not match_found:
-            return False
 
-    return True
+# Relative cost of the value checks of compiled queries, cheap checks run first to reject a dataset early
+_COST_EQUAL = 1
+_COST_WILDCARD = 2
+_COST_DATETIME = 3
+_COST_CODE_SEQUENCE = 4
+_COST_SEQUENCE = 5
 
 
-def match_query_to_dataset(query: Dataset, dataset: Dataset) -> bool:
-    """Match a DICOM query against a dataset, with special handling for UPS attributes."""
-    # Iterate through each element in the query
-    for elem in query:
-        tag = elem.tag
+def _compile_element(elem: pydicom.DataElement) -> tuple[int, Callable[[Any], bool]] | None:
+    """
+    Build the check of the dataset value for one query element.
 
-        # Skip meta information
-        if tag.group == 0x0002:
-            continue
+    Args:
+        elem: The query element.
 
-        # If the dataset doesn't have this tag, it doesn't match
-        if tag not in dataset:
-            return False
+    Returns:
+        The cost and the check, or None if only the presence of the element is checked.
 
-        # Check for UPS-specific attributes with special matching rules
-        if tag == 0x00404005:  # Scheduled Procedure Step Start Date and Time
-            if not match_ups_specific_attributes(query, dataset, tag):
-                return False
-            continue
+    """
+    tag = elem.tag
+    query_value = elem.value
+    if tag == 0x00404005:  # Scheduled Procedure Step Start Date and Time
+        return _COST_DATETIME, _compile_datetime(query_value)
+    if elem.VR == "SQ" and is_code_sequence(elem, tag):
+        return _COST_CODE_SEQUENCE, lambda dataset_value: match_code_sequence(query_value, dataset_value, tag)
+    if elem.VR == "SQ":
+        if len(query_value) == 0:
+            return None
+
+        item_predicates = [compile_query(q_item) for q_item in query_value]
+
+        def match_any_item(dataset_value: Any) -> bool:  # noqa: ANN401
+            return all(any(map(item_predicate, dataset_value)) for item_predicate in item_predicates)
+
+        return _COST_SEQUENCE, match_any_item
+    if elem.VR in [DA, DT, TM]:
+        if not isinstance(query_value, str):
+            return None
+        check_datetime = _compile_datetime(query_value)
+        return _COST_DATETIME, lambda dataset_value: not isinstance(dataset_value, str) or check_datetime(dataset_value)
+    if isinstance(query_value, str) or isinstance(query_value, pydicom.valuerep.PersonName):
+        query_value = str(query_value)
+        if query_value == "" or query_value == "*":
+            return None
+        if "*" in query_value or "?" in query_value:
+            pattern = wildcard_pattern(query_value)
+            return _COST_WILDCARD, lambda dataset_value: bool(pattern.fullmatch(str(dataset_value)))
+
+        def equal(dataset_value: Any) -> bool:  # noqa: ANN401
+            # Most values already are str, only PN and other values need converting
+            if dataset_value.__class__ is str:
+                return dataset_value == query_value
+            return query_value == str(dataset_value)
+
+        return _COST_EQUAL, equal
+    return _COST_EQUAL, lambda dataset_value: not (query_value != dataset_value)
+
+
+def compile_query(query: Dataset) -> Callable[[Dataset], bool]:
+    """
+    Compile a query into a predicate that matches a dataset against it.
 
-        # Get the query value
-        query_value = elem.value
+    Everything that depends on the query only (wildcard patterns, parsed date ranges, the kind of each element)
+    is worked out once here instead of again for every dataset. The predicate first checks that all queried
+    attributes are present, then runs the value checks from cheap (equality) to expensive (sequences).
 
-        # Get the dataset value
-        dataset_value = dataset[tag].value
+    Args:
+        query: A DICOM dataset containing query parameters
 
-        # Check if this is a code sequence
-        if elem.VR == "SQ" and (is_code_sequence(elem, tag) or tag in [0x00404025, 0x00404018]):
-            if not match_code_sequence(query_value, dataset_value, tag):
-                return False
-        # Handle regular sequence elements
-        elif elem.VR == "SQ":
-            # If query has an empty sequence, it matches any sequence
-            if len(query_value) == 0:
-                continue
-
-            # If dataset has an empty sequence but query isn't empty, no match
-            if len(dataset_value) == 0:
-                return False
+    Returns:
+        The predicate.
 
-            # Try to match any item in the sequence
-            match_found = False
-            for q_item in query_value:
-                for ds_item in dataset_value:
-                    if match_query_to_dataset(q_item, ds_item):
-                        match_found = True
-                        break
-                if match_found:
-                    break
-
-            if not match_found:
-                return False
-        # Handle date/time attributes
-        elif elem.VR in [DA, DT, TM]:
-            if isinstance(query_value, str) and isinstance(dataset_value, str):
-                if not match_datetime(query_value, dataset_value):
-                    return False
-        # Handle wildcard matching for strings
-        elif isinstance(query_value, str) or isinstance(query_value, pydicom.valuerep.PersonName):
-            # If query value is empty or universal match, it matches anything
-            query_value = str(query_value)  # convert from PN to str if necessary
-            if query_value == "" or query_value == "*":
-                continue
-
-            # Convert dataset value to string for comparison
-            ds_value_str = str(dataset_value)
-
-            # Handle wildcards
-            if "*" in query_value or "?" in query_value:
-                pattern = "^" + query_value.replace("*", ".*").replace("?", ".") + "$"
-                if not re.match(pattern, ds_value_str):
-                    return False
-            # Direct comparison for non-wildcard strings
-            elif query_value != ds_value_str:
-                return False
-        # Direct comparison for other value types
-        elif query_value != dataset_value:
+    """
+    tags = set()
+    checks: list[tuple[int, int, Callable[[Any], bool]]] = []
+    for elem in query:
+        if elem.tag.group == 0x0002:
+            continue
+        tags.add(elem.tag)
+        if (compiled := _compile_element(elem)) is not None:
+            cost, check = compiled
+            checks.append((cost, elem.tag, check))
+    checks.sort(key=itemgetter(0, 1))
+    value_checks = [(tag, check) for _, tag, check in checks]
+    required_tags = frozenset(tags)
+
+    def predicate(dataset: Dataset) -> bool:
+        # Meta information was skipped above, and the tags already are ints, so the key view is compared directly
+        # instead of normalizing every tag in Dataset.__contains__
+        if not dataset.keys() >= required_tags:
             return False
+        for tag, check in value_checks:
+            if not check(dataset[tag].value):
+                return False
+        return True
 
-    return True
+    return predicate
 
 
 def query_datasets(query: Dataset, datasets: list[Dataset]) -> list[Dataset]:
@@ -380,7 +450,8 @@ def query_datasets(query: Dataset, datasets: list[Dataset]) -> list[Dataset]:
         list[Dataset]: List of matching datasets
 
     """
-    return [ds for ds in datasets if match_query_to_dataset(query, ds)]
+    predicate = compile_query(query)
+    return [ds for ds in datasets if predicate(ds)]
 
 
 # Example usage with UPS for IHE-RO TDW-II
@@ -1,10 +1,15 @@
 """Utility functions for working with DICOM data."""
 
 from datetime import datetime
+from functools import lru_cache
 
 from pydicom import uid, valuerep
 
-VR_STRFTIME = {valuerep.VR.DA: "%Y%m%d", valuerep.VR.TM: "%H%M%S.%f", valuerep.VR.DT: "%Y%m%d%H%M%S.%f"}
+_DA_FORMAT = "%Y%m%d"
+_TM_FORMAT = "%H%M%S.%f"
+_DT_FORMAT = "%Y%m%d%H%M%S.%f"
+
+VR_STRFTIME = {valuerep.VR.DA: _DA_FORMAT, valuerep.VR.TM: _TM_FORMAT, valuerep.VR.DT: _DT_FORMAT}
 
 
 def generate_uid() -> str:
@@ -18,18 +23,21 @@ def generate_uid() -> str:
     return uid.generate_uid()
 
 
-def validate_uid(uid: str) -> bool:
+@lru_cache(maxsize=8192)
+def validate_uid(uid_str: str) -> bool:
     """
     Validate a DICOM UID.
 
+    The results are cached, the same UIDs are validated again and again.
+
     Args:
-        uid: The UID to validate.
+        uid_str: The UID to validate.
 
     Returns:
         True if valid, False otherwise.
 
     """
-    return uid.UID(uid).is_valid
+    return uid.UID(uid_str).is_valid
 
 
 def to_dicom_date_str(date: datetime, vr: valuerep.VR = valuerep.VR.DA) -> str:
@@ -44,4 +52,46 @@ def to_dicom_date_str(date: datetime, vr: valuerep.VR = valuerep.VR.DA) -> str:
         str: The string representation for the specified date/time VR.
 
     """
-    return date.strftime(VR_STRFTIME.get(vr, default=valuerep.VR.DA))
+    return date.strftime(VR_STRFTIME.get(vr, _DA_FORMAT))
+
+
+def to_da_str(date: datetime) -> str:
+    """
+    Convert a python datetime to a DA (YYYYMMDD) string.
+
+    Args:
+        date (datetime): the python datetime value.
+
+    Returns:
+        str: The DA string.
+
+    """
+    return date.strftime(_DA_FORMAT)
+
+
+def to_tm_str(date: datetime) -> str:
+    """
+    Convert a python datetime to a TM (HHMMSS.FFFFFF) string.
+
+    Args:
+        date (datetime): the python datetime value.
+
+    Returns:
+        str: The TM string.
+
+    """
+    return date.strftime(_TM_FORMAT)
+
+
+def to_dt_str(date: datetime) -> str:
+    """
+    Convert a python datetime to a DT (YYYYMMDDHHMMSS.FFFFFF) string.
+
+    Args:
+        date (datetime): the python datetime value.
+
+    Returns:
+        str: The DT string.
+
+    """
+    return date.strftime(_DT_FORMAT)
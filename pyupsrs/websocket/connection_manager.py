@@ -2,19 +2,30 @@
 
 import asyncio
 import logging
-from collections.abc import Awaitable, Callable
+from collections import defaultdict
+from collections.abc import Awaitable, Callable, Iterable, Set
 
 import websockets
 
+# Number of subscribers a message is queued for at once by enqueue_to_all
+BROADCAST_BATCH_SIZE = 50
+
+# Number of messages queued for a subscriber before further ones are dropped, for clients that don't keep up
+OUTBOUND_QUEUE_SIZE = 1000
+
 
 class ConnectionManager:
     """Manager for WebSocket connections."""
 
+    _EMPTY: frozenset[str] = frozenset()
+
     def __init__(self) -> None:
         """Initialize the ConnectionManager."""
         self.connections: dict[str, websockets.ServerConnection] = {}
-        self.subscriptions: dict[str, set[str]] = {}  # workitem_uid -> set of subscriber_ids
-        self.subscriber_to_workitems: dict[str, set[str]] = {}  # subscriber_id -> set of workitem_uids
+        self.subscriptions: defaultdict[str, set[str]] = defaultdict(set)  # workitem_uid -> set of subscriber_ids
+        # subscriber_id -> set of workitem_uids
+        self.subscriber_to_workitems: defaultdict[str, set[str]] = defaultdict(set)
+        self.outbound_queues: dict[str, asyncio.Queue[str]] = {}  # subscriber_id -> messages waiting to be sent
         self.logger = logging.getLogger("pyupsrs.websocket")
         self.connection_callbacks: list[Callable[[str], None] | Callable[[str], Awaitable[None]]] = []
 
@@ -29,7 +40,7 @@ class ConnectionManager:
         """
         self.connection_callbacks.append(callback)
         callback_name = getattr(callback, "__name__", str(callback))  # for mocks
-        self.logger.info(f"Registered connection callback: {callback_name}")
+        self.logger.info("Registered connection callback: %s", callback_name)
 
     async def handle_connection(self, websocket: websockets.ServerConnection, subscriber_id: str) -> None:
         """
@@ -41,7 +52,11 @@ class ConnectionManager:
 
         """
         self.connections[subscriber_id] = websocket
-        self.logger.info(f"New connection from subscriber {subscriber_id}")
+        self.logger.info("New connection from subscriber %s", subscriber_id)
+        # One writer per connection sends the queued messages in order
+        outbound_queue: asyncio.Queue[str] = asyncio.Queue(OUTBOUND_QUEUE_SIZE)
+        self.outbound_queues[subscriber_id] = outbound_queue
+        writer = asyncio.create_task(self._write_queued(subscriber_id, outbound_queue))
 
         # Call all registered callbacks with the subscriber_id
         for callback in self.connection_callbacks:
@@ -50,23 +65,26 @@ class ConnectionManager:
                     await callback(subscriber_id)
                 else:
                     callback(subscriber_id)
-                self.logger.debug(f"Successfully executed connection callback {callback.__name__} for {subscriber_id}")
+                self.logger.debug("Successfully executed connection callback %s for %s", callback.__name__, subscriber_id)
             except Exception as e:
-                self.logger.error(f"Error in connection callback {callback.__name__} for {subscriber_id}: {e}")
+                self.logger.error("Error in connection callback %s for %s: %s", callback.__name__, subscriber_id, e)
 
         try:
             # Keep the connection alive
             async for _message in websocket:
-                self.logger.info(f"Received message{_message} from subscriber {subscriber_id}")
+                self.logger.info("Received message %s from subscriber %s", _message, subscriber_id)
                 # Process incoming messages if needed
                 pass
         except websockets.exceptions.ConnectionClosed:
-            self.logger.info(f"Connection closed from subscriber {subscriber_id}")
+            self.logger.info("Connection closed from subscriber %s", subscriber_id)
             return
         finally:
             # Clean up when the connection is closed, but don't remove the subscriptions.
             # This is to allow for reactivation of the websocket connection itself (without there being a re-subscription).
-            self.logger.debug(f"Removing websocket connection (only) when connection is closed for {subscriber_id}")
+            self.logger.debug("Removing websocket connection (only) when connection is closed for %s", subscriber_id)
+            writer.cancel()
+            if self.outbound_queues.get(subscriber_id) is outbound_queue:
+                del self.outbound_queues[subscriber_id]
             del self.connections[subscriber_id]
 
     def subscribe(self, subscriber_id: str, workitem_uid: str) -> None:
@@ -78,15 +96,10 @@ class ConnectionManager:
             workitem_uid: The UID of the workitem.
 
         """
-        if workitem_uid not in self.subscriptions:
-            self.subscriptions[workitem_uid] = set()
         self.subscriptions[workitem_uid].add(subscriber_id)
-
-        if subscriber_id not in self.subscriber_to_workitems:
-            self.subscriber_to_workitems[subscriber_id] = set()
         self.subscriber_to_workitems[subscriber_id].add(workitem_uid)
 
-        self.logger.warning(f"Subscriber {subscriber_id} subscribed to {workitem_uid}")
+        self.logger.debug("Subscriber %s subscribed to %s", subscriber_id, workitem_uid)
 
     def unsubscribe(self, subscriber_id: str, workitem_uid: str) -> None:
         """
@@ -103,9 +116,9 @@ class ConnectionManager:
         if subscriber_id in self.subscriber_to_workitems:
             self.subscriber_to_workitems[subscriber_id].discard(workitem_uid)
 
-        self.logger.debug(f"Subscriber {subscriber_id} unsubscribed from {workitem_uid}")
+        self.logger.debug("Subscriber %s unsubscribed from %s", subscriber_id, workitem_uid)
 
-    def get_subscribers(self, workitem_uid: str) -> set[str]:
+    def get_subscribers(self, workitem_uid: str) -> Set[str]:
         """
         Get all subscribers for a workitem.
 
@@ -113,10 +126,10 @@ class ConnectionManager:
             workitem_uid: The UID of the workitem.
 
         Returns:
-            A set of subscriber IDs.
+            A set of subscriber IDs, not to be modified.
 
         """
-        return self.subscriptions.get(workitem_uid, set())
+        return self.subscriptions.get(workitem_uid) or self._EMPTY
 
     async def send_message(self, subscriber_id: str, message: str) -> bool:
         """
@@ -136,12 +149,81 @@ class ConnectionManager:
 
         try:
             await websocket.send(message)
-            self.logger.warning(f"Sent message to {subscriber_id}")
+            self.logger.debug("Sent message to %s", subscriber_id)
             return True
         except Exception as e:
-            self.logger.error(f"Failed to send message to {subscriber_id}: {e}")
+            self.logger.error("Failed to send message to %s: %s", subscriber_id, e)
             return False
 
+    def enqueue_to_all(self, subscriber_ids: Iterable[str], message: str) -> None:
+        """
+        Queue a message for several subscribers, to be sent by the writer of each connection.
+
+        Must be called from the event loop, e.g. through loop.call_soon_threadsafe.
+        Subscribers that aren't connected are skipped, like send_message does.
+        The message is queued in batches of BROADCAST_BATCH_SIZE subscribers, yielding to the event loop in between.
+
+        Args:
+            subscriber_ids: The IDs of the subscribers.
+            message: The message to send.
+
+        """
+        self._enqueue_batch(list(subscriber_ids), 0, message)
+
+    def _enqueue_batch(self, subscriber_ids: list[str], start: int, message: str) -> None:
+        """
+        Queue a message for a batch of subscribers, scheduling the next batch on the event loop.
+
+        Args:
+            subscriber_ids: The IDs of all subscribers the message is for.
+            start: The index of the first subscriber of the batch.
+            message: The message to send.
+
+        """
+        end = start + BROADCAST_BATCH_SIZE
+        for subscriber_id in subscriber_ids[start:end]:
+            outbound_queue = self.outbound_queues.get(subscriber_id)
+            if outbound_queue is None:
+                continue
+            try:
+                outbound_queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.logger.warning("Outbound queue of subscriber %s is full, dropping message", subscriber_id)
+        if end < len(subscriber_ids):
+            # Let other handlers run between batches
+            asyncio.get_running_loop().call_soon(self._enqueue_batch, subscriber_ids, end, message)
+
+    async def enqueue_message(self, subscriber_id: str, message: str) -> bool:
+        """
+        Queue a message for a subscriber, waiting for room in the queue instead of dropping it.
+
+        Args:
+            subscriber_id: The ID of the subscriber.
+            message: The message to send.
+
+        Returns:
+            True if the message was queued, False if the subscriber isn't connected.
+
+        """
+        outbound_queue = self.outbound_queues.get(subscriber_id)
+        if outbound_queue is None:
+            return False
+        await outbound_queue.put(message)
+        return True
+
+    async def _write_queued(self, subscriber_id: str, outbound_queue: asyncio.Queue[str]) -> None:
+        """
+        Send the messages queued for a subscriber until cancelled.
+
+        Args:
+            subscriber_id: The ID of the subscriber.
+            outbound_queue: The queue of the subscriber's connection.
+
+        """
+        while True:
+            message = await outbound_queue.get()
+            await self.send_message(subscriber_id, message)
+
     def _remove_connection(self, subscriber_id: str) -> None:
         """
         Remove a connection and its subscriptions.
@@ -151,15 +233,13 @@ class ConnectionManager:
 
         """
         # Remove from connections
-        if subscriber_id in self.connections:
-            del self.connections[subscriber_id]
-
-        # Remove from subscriptions
-        workitem_uids = self.subscriber_to_workitems.get(subscriber_id, set())
-        for workitem_uid in workitem_uids:
-            if workitem_uid in self.subscriptions:
-                self.subscriptions[workitem_uid].discard(subscriber_id)
-
-        # Remove from subscriber_to_workitems
-        if subscriber_id in self.subscriber_to_workitems:
-            del self.subscriber_to_workitems[subscriber_id]
+        self.connections.pop(subscriber_id, None)
+        self.outbound_queues.pop(subscriber_id, None)
+
+        # Remove from subscriber_to_workitems and subscriptions, dropping the workitems left without subscribers
+        for workitem_uid in self.subscriber_to_workitems.pop(subscriber_id, ()):
+            subscribers = self.subscriptions.get(workitem_uid)
+            if subscribers is not None:
+                subscribers.discard(subscriber_id)
+                if not subscribers:
+                    del self.subscriptions[workitem_uid]
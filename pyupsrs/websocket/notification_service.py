@@ -1,7 +1,17 @@
-"""WebSocket notification service for UPS events."""
+"""
+WebSocket notification service for UPS events.
+
+Event reports are not changed after they have been created: they may share sequences with the workitem
+they report on (see create_ups_assigned_report), and are shared between subscribers and serialized once.
+"""
 
 import asyncio
-from copy import deepcopy
+import itertools
+import json
+import weakref
+from collections import deque
+from collections.abc import Callable, Iterable
+from datetime import datetime
 from enum import Enum, StrEnum
 from functools import lru_cache
 from typing import Any
@@ -9,12 +19,14 @@ from typing import Any
 from pydicom import DataElement, Dataset, Sequence
 
 import pyupsrs.domain.services.service_provider as service_provider  # avoid circular reference to ServiceProvider singleton
+from pyupsrs.config import get_config
 from pyupsrs.domain.models.ups import FILTERED_SUBSCRIPTION_UID, GLOBAL_SUBSCRIPTION_UID, Subscription, WorkItem
 from pyupsrs.utils.class_logger import LoggerMixin
-from pyupsrs.utils.dicom_query_matcher import match_query_to_dataset
+from pyupsrs.utils.dicom_query_matcher import compile_query, match_query_to_dataset
 from pyupsrs.websocket.connection_manager import ConnectionManager
 
-_message_id: int = 1
+# Message IDs run from 1 to 65535 and wrap around, the first one handed out being 2
+_message_ids = itertools.count(2)
 
 
 def get_next_message_id() -> int:
@@ -25,25 +37,7 @@ def get_next_message_id() -> int:
         int: the message ID for use in communication with other AEs
 
     """
-    global _message_id
-    if _message_id > 65534:
-        _message_id = 1
-    else:
-        _message_id += 1
-    return _message_id
-
-
-@lru_cache
-def _workitem_event_report_template() -> Dataset:
-    ds = Dataset()
-    ds.AffectedSOPClassUID = "1.2.840.10008.5.1.4.34.6.4"
-    ds.MessageID = 1
-    ds.AffectedSOPInstanceUID = None
-    ds.EventTypeID = 0
-    ds.InputReadinessState = "READY"
-    ds.ProcedureStepState = "SCHEDULED"
-
-    return ds
+    return (next(_message_ids) - 1) % 65535 + 1
 
 
 class UPSEventType(Enum):
@@ -70,12 +64,9 @@ class ListRestartStatus(StrEnum):
     COLD_START = "COLD START"
 
 
-_PROCEDURE_STEP_STATES = {
-    "SCHEDULED": "SCHEDULED",
-    "IN PROGRESS": "IN PROGRESS",
-    "COMPLETED": "COMPLETED",
-    "CANCELED": "CANCELED",
-}
+_UPS_EVENT_SOP_CLASS_UID = "1.2.840.10008.5.1.4.34.6.4"
+
+_VALID_STEP_STATES = frozenset(("SCHEDULED", "IN PROGRESS", "COMPLETED", "CANCELED"))
 
 
 def _create_workitem_event_report(
@@ -84,6 +75,7 @@ def _create_workitem_event_report(
     input_readiness_state: str = "READY",
     procedure_step_state: str = "SCHEDULED",
     additional_dataset_info: Dataset | None = None,
+    include_message_id: bool = True,
 ) -> Dataset:
     """
     Create a Workitem Event Report.
@@ -99,17 +91,22 @@ def _create_workitem_event_report(
         procedure_step_state (str, optional): procedure_step_state. Defaults to "SCHEDULED".
         additional_dataset_info (Dataset | None, optional): additional_dataset_info provided by and for
         specific types of event reports. Defaults to None.
+        include_message_id (bool, optional): whether to give the report a Message ID. Defaults to True.
 
     Returns:
         Dataset: the UPS Event Report in pydicom.Dataset format (use .to_json() for DICOMWeb)
 
     """
-    event_report = deepcopy(_workitem_event_report_template())
+    event_report = Dataset()
+    event_report.AffectedSOPClassUID = _UPS_EVENT_SOP_CLASS_UID
     event_report.AffectedSOPInstanceUID = affected_sop_instance_uid
-    event_report.MessageID = get_next_message_id()
+    if include_message_id:
+        # Left out for DICOMweb subscribers that don't use it, saving the element on every report
+        event_report.MessageID = get_next_message_id()
     event_report.EventTypeID = event_type_id.value
     event_report.InputReadinessState = input_readiness_state
-    defined_state: str = _PROCEDURE_STEP_STATES.get(procedure_step_state, "SCHEDULED")  # might be better to raise an error?
+    # might be better to raise an error?
+    defined_state: str = procedure_step_state if procedure_step_state in _VALID_STEP_STATES else "SCHEDULED"
     event_report.ProcedureStepState = defined_state
     if additional_dataset_info:
         event_report.update(additional_dataset_info)
@@ -121,6 +118,7 @@ def create_ups_state_report(
     procedure_step_state: str,
     input_readiness_state: str,
     reason_for_cancellation: str | None = None,
+    include_message_id: bool = True,
 ) -> Dataset:
     """
     Create a UPS State Report (Event Report).
@@ -130,6 +128,7 @@ def create_ups_state_report(
         procedure_step_state (str): procedure_step_state
         input_readiness_state (str): input_readiness_state
         reason_for_cancellation (str | None, optional): reason_for_cancellation. Defaults to None.
+        include_message_id (bool, optional): whether to give the report a Message ID. Defaults to True.
 
     Returns:
         Dataset: the UPS State Report in pydicom.Dataset format (use .to_json() for DICOMWeb)
@@ -138,7 +137,7 @@ def create_ups_state_report(
     additional_dataset_info = None
     if reason_for_cancellation:
         additional_dataset_info = Dataset()
-        additional_dataset_info["ReasonForCancellation"] = reason_for_cancellation
+        additional_dataset_info.ReasonForCancellation = reason_for_cancellation
 
     return _create_workitem_event_report(
         affected_sop_instance_uid,
@@ -146,6 +145,7 @@ def create_ups_state_report(
         input_readiness_state=input_readiness_state,
         procedure_step_state=procedure_step_state,
         additional_dataset_info=additional_dataset_info,
+        include_message_id=include_message_id,
     )
 
 
@@ -157,6 +157,7 @@ def create_ups_cancel_requested_report(
     reason_for_cancellation: str | None = None,
     contact_uri: str | None = None,
     contact_display_name: str | None = None,
+    include_message_id: bool = True,
 ) -> Dataset:
     """
     Create a UPS Cancel Requested Event Report.
@@ -175,25 +176,27 @@ def create_ups_cancel_requested_report(
             Defaults to None.
         contact_display_name (str | None, optional): The name to show for who to contact regarding the requested cancellation.
             Defaults to None.
+        include_message_id (bool, optional): whether to give the report a Message ID. Defaults to True.
 
     Returns:
         Dataset: the UPS Cancel Requested Event Report
 
     """
     additional_dataset_info = Dataset()
-    additional_dataset_info["RequestingAE"] = requesting_ae
+    additional_dataset_info.RequestingAE = requesting_ae
     if reason_for_cancellation:
-        additional_dataset_info["ReasonForCancellation"] = reason_for_cancellation
+        additional_dataset_info.ReasonForCancellation = reason_for_cancellation
     if contact_uri:
-        additional_dataset_info["ContactURI"] = contact_uri
+        additional_dataset_info.ContactURI = contact_uri
     if contact_display_name:
-        additional_dataset_info["ContactDisplayName"] = contact_display_name
+        additional_dataset_info.ContactDisplayName = contact_display_name
     return _create_workitem_event_report(
         affected_sop_instance_uid,
         UPSEventType.UPSCancelRequested,
         input_readiness_state=input_readiness_state,
         procedure_step_state=procedure_step_state,
         additional_dataset_info=additional_dataset_info,
+        include_message_id=include_message_id,
     )
 
 
@@ -201,10 +204,11 @@ def create_ups_progress_report(
     affected_sop_instance_uid: str,
     procedure_step_state: str,
     input_readiness_state: str,
-    procedure_step_progress: int,
+    procedure_step_progress: int | None,
     progress_description: str | None = None,
     contact_uri: str | None = None,
     contact_display_name: str | None = None,
+    include_message_id: bool = True,
 ) -> Dataset:
     """
     Create a UPS Progress Report.
@@ -213,50 +217,50 @@ def create_ups_progress_report(
         affected_sop_instance_uid (str): affected_sop_instance_uid
         procedure_step_state (str): procedure_step_state
         input_readiness_state (str): input_readiness_state
-        procedure_step_progress (int): from 0 to 100 (percent)
+        procedure_step_progress (int | None): from 0 to 100 (percent)
         progress_description (str | None, optional): progress_description. Defaults to None.
         contact_uri (str | None, optional): contact_uri (like mailto:frontdesk.oncology@bighospital.org or sms:+19725551212 ).
             Defaults to None.
         contact_display_name (str | None, optional): The name to show for who to contact regarding the requested cancellation.
             Defaults to None.
+        include_message_id (bool, optional): whether to give the report a Message ID. Defaults to True.
 
     Returns:
         Dataset: The UPS Progress Report (as a pydicom.Dataset, use .to_json() for DICOMWeb)
 
     """
-    additional_dataset_info = Dataset()
-    procedure_step_progress_sequence = Sequence()
+    additional_dataset_info = None
     info_sequence_item = Dataset()
-    if procedure_step_progress >= 0 and procedure_step_progress <= 100:
-        pass
-    elif procedure_step_progress < 0:
-        procedure_step_progress = 0
-    else:
-        procedure_step_progress = 100
-
-    info_sequence_item["ProcedureStepProgress"] = procedure_step_progress
-    info_sequence_item["ProcedureStepProgressDescription"] = progress_description
-
-    procedure_step_communications_uri_sequence = Sequence()
-    uri_sequence_item = Dataset()
-    uri_sequence_item["ContactURI"] = contact_uri
-    uri_sequence_item["ContactDisplayName"] = contact_display_name
-    procedure_step_communications_uri_sequence.append(uri_sequence_item)
-    info_sequence_item.ProcedureStepCommunicationsURISequence = procedure_step_communications_uri_sequence
-
-    procedure_step_progress_sequence.append(info_sequence_item)
-    additional_dataset_info.ProcedureStepProgressSequence = procedure_step_progress_sequence
+    if procedure_step_progress is not None or progress_description is not None:
+        if procedure_step_progress is not None:
+            procedure_step_progress = max(0, min(100, procedure_step_progress))
+        info_sequence_item.ProcedureStepProgress = procedure_step_progress
+        info_sequence_item.ProcedureStepProgressDescription = progress_description
+
+    if contact_uri is not None or contact_display_name is not None:
+        uri_sequence_item = Dataset()
+        uri_sequence_item.ContactURI = contact_uri
+        uri_sequence_item.ContactDisplayName = contact_display_name
+        info_sequence_item.ProcedureStepCommunicationsURISequence = Sequence([uri_sequence_item])
+
+    if info_sequence_item:
+        additional_dataset_info = Dataset()
+        additional_dataset_info.ProcedureStepProgressInformationSequence = Sequence([info_sequence_item])
     return _create_workitem_event_report(
         affected_sop_instance_uid,
         UPSEventType.UPSProgressReport,
         input_readiness_state=input_readiness_state,
         procedure_step_state=procedure_step_state,
         additional_dataset_info=additional_dataset_info,
+        include_message_id=include_message_id,
     )
 
 
 def create_scp_status_change_report(
-    scp_status: SCPStatus, subscription_list_status: ListRestartStatus, ups_list_status: ListRestartStatus
+    scp_status: SCPStatus,
+    subscription_list_status: ListRestartStatus,
+    ups_list_status: ListRestartStatus,
+    include_message_id: bool = True,
 ) -> Dataset:
     """
     Creates an SCP Status Change Report.
@@ -278,6 +282,7 @@ def create_scp_status_change_report(
             or COLD START (was only in memory and that is long gone)
         ups_list_status (ListRestartStatus): Whether the list has a WARM START (was stored to some extent and read back in)
             or COLD START (was only in memory and that is long gone)
+        include_message_id (bool, optional): whether to give the report a Message ID. Defaults to True.
 
     Returns:
         Dataset: The SCP Status Change Report
@@ -287,10 +292,15 @@ def create_scp_status_change_report(
     additional_dataset_info.SCPStatus = scp_status
     additional_dataset_info.SubscriptionListStatus = subscription_list_status
     additional_dataset_info.UnifiedProcedureStepListStatus = ups_list_status
-    return _create_workitem_event_report("", UPSEventType.SCPStatusChange, additional_dataset_info=additional_dataset_info)
+    return _create_workitem_event_report(
+        "",
+        UPSEventType.SCPStatusChange,
+        additional_dataset_info=additional_dataset_info,
+        include_message_id=include_message_id,
+    )
 
 
-def create_ups_assigned_report(workitem_ds: Dataset) -> Dataset:
+def create_ups_assigned_report(workitem_ds: Dataset, include_message_id: bool = True) -> Dataset:
     """
     Create UPS Assigned Event Report.
 
@@ -298,6 +308,7 @@ def create_ups_assigned_report(workitem_ds: Dataset) -> Dataset:
 
     Args:
         workitem_ds (Dataset): The UPS represented as a pydicom.Dataset
+        include_message_id (bool, optional): whether to give the report a Message ID. Defaults to True.
 
     Returns:
         Dataset: The UPS Assigned Event Report
@@ -324,9 +335,86 @@ def create_ups_assigned_report(workitem_ds: Dataset) -> Dataset:
         input_readiness_state=input_readiness_state,
         procedure_step_state=procedure_step_state,
         additional_dataset_info=additional_dataset_info,
+        include_message_id=include_message_id,
     )
 
 
+@lru_cache(maxsize=1024)
+def _cached_state_report(
+    affected_sop_instance_uid: str,
+    updated_at: datetime,
+    procedure_step_state: str,
+    input_readiness_state: str,
+    include_message_id: bool,
+) -> Dataset:
+    # updated_at is only used as part of the key, so that a workitem that changed gets a fresh report and message ID
+    return create_ups_state_report(
+        affected_sop_instance_uid, procedure_step_state, input_readiness_state, include_message_id=include_message_id
+    )
+
+
+# VRs whose single values are written to DICOM JSON as they are, see _event_report_to_json
+_PLAIN_JSON_VRS = frozenset(("AE", "CS", "DA", "DT", "LO", "LT", "SH", "ST", "TM", "UI", "UL", "UR", "US", "UT"))
+
+# The Affected SOP Class UID element, the same for every event report
+_SOP_CLASS_JSON = '"00000002": ' + json.dumps({"Value": [_UPS_EVENT_SOP_CLASS_UID], "vr": "UI"})
+
+
+def _event_report_to_json(report: Dataset) -> str:
+    """
+    Serialize an event report to DICOM JSON, as Dataset.to_json() does.
+
+    The attributes of event reports are mostly single strings and integers, which are written directly
+    instead of going through pydicom's per element encoding, and the Affected SOP Class UID shared by all
+    reports is written once at import. Other elements (e.g. sequences) are left to pydicom.
+
+    Args:
+        report: The event report.
+
+    Returns:
+        The DICOM JSON of the report.
+
+    """
+    # Elements are iterated in tag order and the keys of each element are written sorted, giving the
+    # output of the default dump handler of Dataset.to_json(), which sorts keys
+    parts = []
+    for element in report:
+        tag = element.tag
+        value = element.value
+        if tag == 0x00000002 and value == _UPS_EVENT_SOP_CLASS_UID:
+            parts.append(_SOP_CLASS_JSON)
+        elif element.VR in _PLAIN_JSON_VRS and isinstance(value, str | int) and value != "":
+            parts.append(f'"{tag:08X}": {{"Value": [{json.dumps(value)}], "vr": "{element.VR}"}}')
+        else:
+            # 1024 is the bulk data threshold Dataset.to_json() defaults to
+            parts.append(f'"{tag:08X}": {json.dumps(element.to_json_dict(None, 1024), sort_keys=True)}')
+    return "{" + ", ".join(parts) + "}"
+
+
+# JSON of the reports serialized so far, by id() as Datasets aren't hashable. An entry is dropped with its report.
+_report_json_by_id: dict[int, tuple[weakref.ref, str]] = {}
+
+
+def _report_json(report: Dataset) -> str:
+    """
+    Serialize a report to DICOM JSON, once for reports shared between subscribers.
+
+    Args:
+        report: The report, which is not changed after it has been serialized.
+
+    Returns:
+        The DICOM JSON of the report.
+
+    """
+    key = id(report)
+    entry = _report_json_by_id.get(key)
+    if entry is not None and entry[0]() is report:
+        return entry[1]
+    report_json = _event_report_to_json(report)
+    _report_json_by_id[key] = (weakref.ref(report, lambda _ref: _report_json_by_id.pop(key, None)), report_json)
+    return report_json
+
+
 class NotificationService(LoggerMixin):
     """Service for sending notifications via WebSockets."""
 
@@ -339,12 +427,75 @@ class NotificationService(LoggerMixin):
 
         """
         self.connection_manager = connection_manager
-        self.pending_notifications: dict[str, list[Dataset]] = {}  # subscriber_id -> list of notifications
+        # Read once, it is the same for every report this service makes
+        self._include_message_id = get_config().include_message_id
+        self.pending_notifications: dict[str, deque[Dataset]] = {}  # subscriber_id -> queue of notifications
+        # workitem_uid -> {(subscriber_id, subscription created_at): filter matched}, for the current content of
+        # the workitem. Dropped by the notify_ methods, as every change that is notified changes the workitem.
+        self._filter_matches: dict[str, dict[tuple[str, datetime], bool]] = {}
+        # (subscriber_id, workitem_uid) -> (subscription created_at, compiled filter), compiled once per subscription
+        self._filter_predicates: dict[tuple[str, str], tuple[datetime, Callable[[Dataset], bool]]] = {}
+        # The loop notifications are sent on when they are made outside of it (e.g. from a worker thread)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # Whether dropping a notification for lack of a loop was logged, it is logged once
+        self._no_loop_logged = False
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            pass
 
         # Register for connection events
         self.logger.info("Registering for connection events")
         self.connection_manager.register_connection_callback(self.on_connection_established)
 
+    def register_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Set the event loop to send notifications on when they are made outside of a running loop.
+
+        Args:
+            loop: The event loop of the server.
+
+        """
+        self._loop = loop
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop | None:
+        """
+        Get the event loop to send notifications on.
+
+        Returns:
+            The running loop, otherwise the registered loop, None if there is neither or the registered loop is closed.
+
+        """
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return None
+        return loop
+
+    def _initial_state_report(self, workitem: WorkItem) -> Dataset:
+        """
+        Get the state report queued for new subscribers to a workitem.
+
+        Subscribers joining while a workitem is unchanged share one report instead of each building their own.
+
+        Args:
+            workitem: The workitem to report on.
+
+        Returns:
+            The UPS State Report for the current state of the workitem.
+
+        """
+        return _cached_state_report(
+            workitem.uid,
+            workitem.updated_at,
+            workitem.ds.ProcedureStepState,
+            workitem.ds.InputReadinessState,
+            self._include_message_id,
+        )
+
     def queue_state_reports(self, subscription: Subscription) -> None:
         """
         Queue required state reports for a new subscription.
@@ -358,40 +509,34 @@ class NotificationService(LoggerMixin):
 
         # Initialize the pending notifications queue for this subscriber if needed
         if ae_title not in self.pending_notifications:
-            self.pending_notifications[ae_title] = []
+            self.pending_notifications[ae_title] = deque()
 
         # For a specific UPS instance subscription
         if workitem_uid not in [GLOBAL_SUBSCRIPTION_UID, FILTERED_SUBSCRIPTION_UID]:
             # Get the workitem
-            workitem = service_provider.ServiceProvider.get_instance().workitem_repo.get_by_uid(workitem_uid)
+            workitem = service_provider.get_provider().workitem_repo.get_by_uid(workitem_uid)
             if workitem:
                 # Create and queue the state report
-                state_report = create_ups_state_report(
-                    workitem.uid, workitem.ds.ProcedureStepState, workitem.ds.InputReadinessState
-                )
+                state_report = self._initial_state_report(workitem)
                 self.pending_notifications[ae_title].append(state_report)
                 self.logger.info(f"Queued state report for specific UPS {workitem_uid} to {ae_title}")
 
         # For a global subscription with deletion lock
         elif workitem_uid == GLOBAL_SUBSCRIPTION_UID and subscription.deletion_lock:
             # Get all workitems
-            workitems = service_provider.ServiceProvider.get_instance().workitem_repo.get_all()
+            workitems = service_provider.get_provider().workitem_repo.get_all()
             for workitem in workitems:
-                state_report = create_ups_state_report(
-                    workitem.uid, workitem.ds.ProcedureStepState, workitem.ds.InputReadinessState
-                )
+                state_report = self._initial_state_report(workitem)
                 self.pending_notifications[ae_title].append(state_report)
             self.logger.info(f"Queued {len(workitems)} state reports for global subscription to {ae_title}")
 
         # For filtered subscription, apply filter to get matching workitems
         elif workitem_uid == FILTERED_SUBSCRIPTION_UID and subscription.filter:
-            workitems = service_provider.ServiceProvider.get_instance().workitem_repo.get_all()
+            workitems = service_provider.get_provider().workitem_repo.get_all()
             queued_count = 0
             for workitem in workitems:
                 if match_query_to_dataset(subscription.filter, workitem.ds):
-                    state_report = create_ups_state_report(
-                        workitem.uid, workitem.ds.ProcedureStepState, workitem.ds.InputReadinessState
-                    )
+                    state_report = self._initial_state_report(workitem)
                     self.pending_notifications[ae_title].append(state_report)
                     queued_count += 1
             self.logger.info(f"Queued {queued_count} state reports for filtered subscription to {ae_title}")
@@ -405,27 +550,26 @@ class NotificationService(LoggerMixin):
             subscriber_id: The ID of the subscriber that established a connection.
 
         """
-        if subscriber_id in self.pending_notifications and self.pending_notifications[subscriber_id]:
-            self.logger.info(
-                f"Sending {len(self.pending_notifications[subscriber_id])} pending notifications to {subscriber_id}"
-            )
-
-            # Send all pending notifications
-            pending_count = len(self.pending_notifications[subscriber_id])
+        self._loop = asyncio.get_running_loop()
+        pending = self.pending_notifications.get(subscriber_id)
+        if pending:
+            self.logger.info(f"Sending {len(pending)} pending notifications to {subscriber_id}")
+
+            # Queue all pending notifications, releasing each one once it has been queued. They go through the
+            # connection's outbound queue like live events, so its one writer keeps them in order.
+            pending_count = len(pending)
             sent_count = 0
 
-            for message in self.pending_notifications[subscriber_id]:
+            while pending:
+                message = pending.popleft()
                 try:
-                    success = await self.connection_manager.send_message(subscriber_id, message.to_json())
+                    success = await self.connection_manager.enqueue_message(subscriber_id, _report_json(message))
                     if success:
                         sent_count += 1
                 except Exception as e:
-                    self.logger.error(f"Error sending pending notification to {subscriber_id}: {e}")
+                    self.logger.error(f"Error queueing pending notification to {subscriber_id}: {e}")
 
-            self.logger.info(f"Sent {sent_count}/{pending_count} pending notifications to {subscriber_id}")
-
-            # Clear the pending notifications for this subscriber
-            self.pending_notifications[subscriber_id] = []
+            self.logger.info(f"Queued {sent_count}/{pending_count} pending notifications to {subscriber_id}")
 
     def notify_creation(self, workitem: WorkItem) -> None:
         """
@@ -439,14 +583,41 @@ class NotificationService(LoggerMixin):
             workitem: The created workitem.
 
         """
-        event_report_message = create_ups_state_report(
-            workitem.uid,
-            workitem.ds.ProcedureStepState,
-            workitem.ds.InputReadinessState,
+        self.send_creation_reports(workitem.uid, self.creation_reports(workitem))
+
+    def creation_reports(self, workitem: WorkItem) -> tuple[Dataset, ...]:
+        """
+        Create the event reports for workitem creation, see notify_creation.
+
+        Args:
+            workitem: The created workitem.
+
+        Returns:
+            The UPS State Report and the UPS Assigned Event Report, for the workitem as it is now.
+
+        """
+        return (
+            create_ups_state_report(
+                workitem.uid,
+                workitem.ds.ProcedureStepState,
+                workitem.ds.InputReadinessState,
+                include_message_id=self._include_message_id,
+            ),
+            create_ups_assigned_report(workitem.ds, include_message_id=self._include_message_id),
         )
-        self._send_notification(workitem.uid, event_report_message)
-        event_report_message = create_ups_assigned_report(workitem.ds)
-        self._send_notification(workitem.uid, event_report_message)
+
+    def send_creation_reports(self, workitem_uid: str, reports: Iterable[Dataset]) -> None:
+        """
+        Send the event reports for workitem creation, made by creation_reports.
+
+        Args:
+            workitem_uid: The UID of the created workitem.
+            reports: The event reports.
+
+        """
+        self._filter_matches.pop(workitem_uid, None)
+        for report in reports:
+            self._send_notification(workitem_uid, report)
 
     def _get_element_value_if_present(self, ds: Dataset, element_name: str) -> Any | None:  # noqa: ANN401
         element: DataElement = ds.get(element_name)
@@ -460,6 +631,7 @@ class NotificationService(LoggerMixin):
             workitem: The updated workitem.
 
         """
+        self._filter_matches.pop(workitem.uid, None)
         event_report_message = None
         affected_sop_instance_uid = workitem.uid
         procedure_step_state: str = workitem.ds.ProcedureStepState
@@ -489,6 +661,7 @@ class NotificationService(LoggerMixin):
                 progress_description=progress_description,
                 contact_uri=contact_uri,
                 contact_display_name=contact_display_name,
+                include_message_id=self._include_message_id,
             )
         else:
             event_report_message = create_ups_state_report(
@@ -496,28 +669,73 @@ class NotificationService(LoggerMixin):
                 procedure_step_state=procedure_step_state,
                 input_readiness_state=input_readiness_state,
                 reason_for_cancellation=reason_for_cancellation,
+                include_message_id=self._include_message_id,
             )
 
         self._send_notification(workitem.uid, message=event_report_message)
+        if procedure_step_state in ("COMPLETED", "CANCELED"):
+            # no further changes are notified
+            self._filter_matches.pop(workitem.uid, None)
 
-    def _match_on_filter(self, filtered_subscribers: list, workitem_uid: str) -> list:
+    def _filter_predicate(self, subscription: Subscription) -> Callable[[Dataset], bool]:
+        """
+        Get the filter of a subscription compiled into a predicate, compiling it once per subscription.
+
+        Args:
+            subscription: The subscription, which has a filter.
+
+        Returns:
+            The predicate matching a workitem dataset against the filter.
+
+        """
+        key = (subscription.ae_title, subscription.workitem_uid)
+        entry = self._filter_predicates.get(key)
+        if entry is None or entry[0] != subscription.created_at:
+            # a new subscription (possibly with a new filter) has a new created_at
+            entry = self._filter_predicates[key] = (subscription.created_at, compile_query(subscription.filter))
+        return entry[1]
+
+    def forget_subscription(self, ae_title: str, workitem_uid: str) -> None:
+        """
+        Drop the compiled filter and the filter matches of a subscription that is deleted, suspended or replaced.
+
+        Args:
+            ae_title: The AE title of the subscriber.
+            workitem_uid: The workitem UID of the subscription, which can be specific, GLOBAL or FILTERED.
+
+        """
+        self._filter_predicates.pop((ae_title, workitem_uid), None)
+        # the matches are kept per subscriber, dropping all of them only costs matching the subscriber's other filters again
+        for matched_workitem_uid, filter_matches in list(self._filter_matches.items()):
+            for key in [key for key in filter_matches if key[0] == ae_title]:
+                del filter_matches[key]
+            if not filter_matches:
+                del self._filter_matches[matched_workitem_uid]
+
+    def _match_on_filter(self, filtered_subscribers: Iterable[str], workitem_uid: str) -> list:
         # provide filtering of the subscriber based on the filter for the subscriber and the content of the
         # workitem (which will be retrieved based on it's UID)
-        self.logger.warning(f"Matching subscribers for workitem UID: {workitem_uid}")
+        self.logger.debug("Matching subscribers for workitem UID: %s", workitem_uid)
+        provider = service_provider.get_provider()
+        workitem = provider.workitem_repo.get_by_uid(workitem_uid)
+        workitem_ds = workitem.ds if hasattr(workitem, "ds") else None
+        if not workitem_ds:
+            return []
+        filter_matches = self._filter_matches.setdefault(workitem_uid, {})
         matching_subscribers = []
         for subscriber_id in filtered_subscribers:
-            subscriptions = service_provider.ServiceProvider.get_instance().subscription_service.get_by_ae_title(subscriber_id)
-
-            for subscription in subscriptions:
-                self.logger.warning(f"Checking filter for {subscriber_id} for workitem UID: {workitem_uid}")
-                self.logger.warning(f"Subscription: {subscription}")
-                filter = subscription.filter or Dataset()
-                workitem = service_provider.ServiceProvider.get_instance().workitem_repo.get_by_uid(workitem_uid)
-                workitem_ds = workitem.ds if hasattr(workitem, "ds") else None
-                if filter and workitem_ds and match_query_to_dataset(filter, workitem_ds):
-                    self.logger.warning(f"Matched filter for {subscriber_id} for workitem UID: {workitem_uid}")
-                    self.logger.warning(f"Filter: {filter}")
+            for subscription in provider.subscription_service.get_by_ae_title(subscriber_id):
+                self.logger.debug("Checking filter of subscription %s for workitem UID: %s", subscription, workitem_uid)
+                filter = subscription.filter
+                # a new subscription (possibly with a new filter) has a new created_at
+                key = (subscriber_id, subscription.created_at)
+                matched = filter_matches.get(key)
+                if matched is None:
+                    matched = filter_matches[key] = bool(filter) and self._filter_predicate(subscription)(workitem_ds)
+                if matched:
+                    self.logger.debug("Matched filter %s for %s for workitem UID: %s", filter, subscriber_id, workitem_uid)
                     matching_subscribers.append(subscriber_id)
+                    break
         return matching_subscribers
 
     def _send_notification(self, workitem_uid: str, message: Dataset) -> None:
@@ -530,34 +748,34 @@ class NotificationService(LoggerMixin):
 
         """
         subscribers = self.connection_manager.get_subscribers(workitem_uid)
-        self.logger.warning(f"Subscribers to specific workitem UID: {subscribers} for workitem UID: {workitem_uid}")
+        self.logger.debug("Subscribers to specific workitem UID: %s for workitem UID: %s", subscribers, workitem_uid)
         global_subscribers = self.connection_manager.get_subscribers(GLOBAL_SUBSCRIPTION_UID)
-        self.logger.warning(f"Subscribers to global workitem UID: {global_subscribers}")
+        self.logger.debug("Subscribers to global workitem UID: %s", global_subscribers)
         filtered_subscribers = self.connection_manager.get_subscribers(FILTERED_SUBSCRIPTION_UID)
-        self.logger.warning(f"Subscribers to filtered workitem UID: {filtered_subscribers}")
-
-        if global_subscribers:
-            for subscriber in global_subscribers:
-                subscribers.add(subscriber)
+        self.logger.debug("Subscribers to filtered workitem UID: %s", filtered_subscribers)
 
+        # a new set, the ones from the connection manager are its own
+        subscribers = set().union(subscribers, global_subscribers)
         if matching_subscribers := self._match_on_filter(filtered_subscribers, workitem_uid):
-            for subscriber in matching_subscribers:
-                subscribers.add(subscriber)
-
-        self.logger.warning(f"{len(subscribers)} Subscribers: {subscribers} for workitem UID: {workitem_uid}")
-        self.logger.debug(f"Sending notification to {len(subscribers)} subscribers for {workitem_uid}")
-        for subscriber_id in subscribers:
-            subscription = service_provider.ServiceProvider.get_instance().subscription_service.get_by_ae_title(subscriber_id)
-            if subscription and subscription[0].suspended:
-                self.logger.warning(f"Subscription for {subscriber_id} is suspended, not sending notification")
-                continue
-            try:
-                loop = asyncio.get_event_loop()  # Or however you access your running event loop
-
-                # Fire and forget
-                asyncio.run_coroutine_threadsafe(
-                    self.connection_manager.send_message(subscriber_id, message=message.to_json()), loop
-                )
-                # self.connection_manager.send_message(subscriber_id, message=message.to_json())
-            except Exception as e:
-                self.logger.error(f"Failed to send notification: {e}")
+            subscribers.update(matching_subscribers)
+
+        self.logger.debug("Subscribers: %s for workitem UID: %s", subscribers, workitem_uid)
+        if not subscribers:
+            return
+        if suspended := service_provider.get_provider().subscription_service.get_suspended(subscribers):
+            self.logger.debug("Subscriptions for %s are suspended, not sending notification", suspended)
+        recipients = subscribers - suspended
+        if not recipients:
+            return
+        self.logger.info("Sending notification to %d subscribers for %s", len(recipients), workitem_uid)
+        loop = self._event_loop()
+        if loop is None:
+            if not self._no_loop_logged:
+                self._no_loop_logged = True
+                self.logger.warning("No event loop registered to send notifications on, dropping notifications")
+            return
+        try:
+            # Serialised once and queued for each recipient's connection, which sends its messages in order
+            loop.call_soon_threadsafe(self.connection_manager.enqueue_to_all, recipients, _event_report_to_json(message))
+        except Exception as e:
+            self.logger.error(f"Failed to send notification: {e}")
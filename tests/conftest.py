@@ -6,6 +6,7 @@ based on DICOM PS3.18 standard, running on Falcon 4.0.2 with ASGI/Uvicorn.
 
 """
 
+import itertools
 import logging
 import uuid
 from collections.abc import AsyncGenerator, Callable
@@ -15,9 +16,27 @@ from typing import Any
 import pytest
 from falcon.asgi import App
 from falcon.testing import TestClient
-from pydicom.uid import generate_uid
+from pydicom.uid import PYDICOM_ROOT_UID
 
-from pyupsrs.storage.repositories.workitem_repository import local_store
+from pyupsrs.api.middleware.auth import AuthMiddleware
+from pyupsrs.api.middleware.logging import LoggingMiddleware
+from pyupsrs.api.resources.subscriptions import SubscriptionResource, SubscriptionSuspendResource
+from pyupsrs.api.resources.websocket_resource import WebSocketResource
+from pyupsrs.api.resources.workitems import DICOMJSONHandler, WorkItemResource, WorkItemsResource, WorkItemStateResource
+from pyupsrs.config import get_config
+from pyupsrs.domain.services.service_provider import ServiceProvider
+from pyupsrs.utils.class_logger import configure_logging
+
+# Logging is configured once for the session, as the server does at startup
+configure_logging(level=logging.getLevelName(get_config().log_level.upper()))
+
+# UIDs of the sample datasets, unique within the session and the same from one run to the next,
+# without the hashing generate_uid() does for every one
+_sample_uids = (f"{PYDICOM_ROOT_UID}1.{number}" for number in itertools.count(1))
+
+# Scheduled start and end of the sample workitem, formatted once for the session
+_SCHEDULED_START = datetime.now().strftime("%Y%m%d%H%M%S")
+_SCHEDULED_END = (datetime.now() + timedelta(hours=1)).strftime("%Y%m%d%H%M%S")
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -36,15 +55,6 @@ def falcon_app() -> App:
     """
     # Needs to be kept in sync with the actual api/app.py for the server.
     # might be better to just launch the app via script?
-    from pyupsrs.api.middleware.auth import AuthMiddleware
-    from pyupsrs.api.middleware.logging import LoggingMiddleware
-    from pyupsrs.api.resources.subscriptions import SubscriptionResource, SubscriptionSuspendResource
-    from pyupsrs.api.resources.websocket_resource import WebSocketResource
-    from pyupsrs.api.resources.workitems import DICOMJSONHandler, WorkItemResource, WorkItemsResource, WorkItemStateResource
-    from pyupsrs.config import get_config
-    from pyupsrs.domain.services.service_provider import ServiceProvider
-    from pyupsrs.utils.class_logger import configure_logging
-
     # the same variable name has to be used in routes that are children of the same parent.
     # so workitem_uid for subscribers is necessary, and needs to be interpreted as
     # a resource ID (well known UIDs for Global and Filtered )
@@ -63,7 +73,6 @@ def falcon_app() -> App:
     # Create the Falcon application
     app = App(middleware=middleware)
 
-    configure_logging(level=logging.getLevelNamesMapping()[str(config.log_level).upper()])
     # Get shared services
     service_provider = ServiceProvider.get_instance()
 
@@ -84,24 +93,23 @@ def falcon_app() -> App:
     subscription_resource = SubscriptionResource(subscription_service=service_provider.subscription_service)
     subscription_suspend_resource = SubscriptionSuspendResource(subscription_service=service_provider.subscription_service)
     workitem_resource = WorkItemResource(workitem_service=service_provider.workitem_service)
-    workitem_state_resource = WorkItemStateResource(workitem_service=service_provider.workitem_service)
-    workitems_resource = WorkItemsResource(workitem_service=service_provider.workitem_service)
-    websocket_resource = WebSocketResource(connection_manager=service_provider.connection_manager)
 
-    # Register routes
+    # Register routes, including the WebSocket route
     # the same variable name has to be used in routes that are children of the same parent.
     # so workitem_uid for subscribers is necessary, and needs to be interpreted as
     # a resource ID (well known UIDs for Global and Filtered )
-    app.add_route("/workitems/1.2.840.10008.5.1.4.34.5/subscribers/{aetitle}/suspend", subscription_suspend_resource)
-    app.add_route("/workitems/1.2.840.10008.5.1.4.34.5.1/subscribers/{aetitle}/suspend", subscription_suspend_resource)
-    app.add_route("/workitems/{workitem_uid}/subscribers/{aetitle}", subscription_resource)
-    app.add_route("/workitems/{workitem_uid}/state", workitem_state_resource)
-    app.add_route("/workitems/{workitem_uid}/cancelrequest", workitem_resource)
-    app.add_route("/workitems/{workitem_uid}", workitem_resource)
-    app.add_route("/workitems", workitems_resource)
-
-    # Register WebSocket route
-    app.add_route("/ws/subscribers/{subscriber_id}", websocket_resource)
+    routes = (
+        ("/workitems/1.2.840.10008.5.1.4.34.5/subscribers/{aetitle}/suspend", subscription_suspend_resource),
+        ("/workitems/1.2.840.10008.5.1.4.34.5.1/subscribers/{aetitle}/suspend", subscription_suspend_resource),
+        ("/workitems/{workitem_uid}/subscribers/{aetitle}", subscription_resource),
+        ("/workitems/{workitem_uid}/state", WorkItemStateResource(workitem_service=service_provider.workitem_service)),
+        ("/workitems/{workitem_uid}/cancelrequest", workitem_resource),
+        ("/workitems/{workitem_uid}", workitem_resource),
+        ("/workitems", WorkItemsResource(workitem_service=service_provider.workitem_service)),
+        ("/ws/subscribers/{subscriber_id}", WebSocketResource(connection_manager=service_provider.connection_manager)),
+    )
+    for path, resource in routes:
+        app.add_route(path, resource)
 
     return app
 
@@ -109,7 +117,7 @@ def falcon_app() -> App:
 @pytest.fixture(scope="function", autouse=True)
 def reset_workitem_repository() -> None:
     """Reset the workitem repository in the service provider before each test."""
-    local_store.clear()
+    ServiceProvider.get_instance().workitem_repo.clear()
 
 
 # @pytest.fixture(scope="class", autouse=True)
@@ -133,11 +141,13 @@ def reset_workitem_repository() -> None:
 #         yield client
 
 
-@pytest.fixture(scope="function", autouse=False)
+@pytest.fixture(scope="session")
 def client(falcon_app: App) -> TestClient:
     """
     Create a test client for DICOMWeb services using Falcon TestClient.
 
+    The client is shared by all tests, reset_workitem_repository clears the workitems between them.
+
     Args:
         falcon_app: The Falcon ASGI application instance to test.
 
@@ -149,7 +159,7 @@ def client(falcon_app: App) -> TestClient:
     return TestClient(app=falcon_app)
 
 
-@pytest.fixture(autouse=False)
+@pytest.fixture
 def dicom_auth_header() -> dict[str, str]:
     """
     Generate authentication headers for DICOMWeb services.
@@ -171,7 +181,7 @@ def dicom_auth_header() -> dict[str, str]:
     return {}
 
 
-@pytest.fixture(autouse=True)
+@pytest.fixture(scope="session")
 def dicom_headers() -> dict[str, str]:
     """
     Create common DICOMWeb headers.
@@ -186,7 +196,7 @@ def dicom_headers() -> dict[str, str]:
     }
 
 
-@pytest.fixture(autouse=True)
+@pytest.fixture(scope="session")
 def dicom_multipart_headers() -> dict[str, str]:
     """
     Create multipart related DICOMWeb headers.
@@ -203,7 +213,7 @@ def dicom_multipart_headers() -> dict[str, str]:
     }
 
 
-@pytest.fixture(autouse=True)
+@pytest.fixture
 def sample_schedule_date_update() -> dict[str, Any]:
     """
     Create a sample schedule date update.
@@ -218,7 +228,7 @@ def sample_schedule_date_update() -> dict[str, Any]:
     }
 
 
-@pytest.fixture(autouse=True)
+@pytest.fixture
 def sample_ups_workitem() -> dict[str, Any]:
     """
     Create a sample UPS workitem for testing.
@@ -229,17 +239,17 @@ def sample_ups_workitem() -> dict[str, Any]:
     """
     return {
         "00080016": {"vr": "UI", "Value": ["1.2.840.10008.5.1.4.34.6.1"]},  # SOP Class UID (UPS Push)
-        "00080018": {"vr": "UI", "Value": [f"{generate_uid()}"]},  # SOP Instance UID
+        "00080018": {"vr": "UI", "Value": [next(_sample_uids)]},  # SOP Instance UID
         "00080054": {"vr": "AE", "Value": ["TESTSTATION"]},  # Retrieve AE Title
         "00080056": {"vr": "CS", "Value": ["READY"]},  # Instance Availability
         "00100010": {"vr": "PN", "Value": [{"Alphabetic": "TEST^PATIENT"}]},  # Patient Name
         "00100020": {"vr": "LO", "Value": ["TEST-ID-123"]},  # Patient ID
         "00100030": {"vr": "DA", "Value": ["20230101"]},  # Patient Birth Date
         "00404041": {"vr": "CS", "Value": ["READY"]},  # Input Readiness State
-        "00404005": {"vr": "DT", "Value": [(datetime.now()).strftime("%Y%m%d%H%M%S")]},  # Scheduled Start DateTime
+        "00404005": {"vr": "DT", "Value": [_SCHEDULED_START]},  # Scheduled Start DateTime
         "00404010": {
             "vr": "DT",
-            "Value": [(datetime.now() + timedelta(hours=1)).strftime("%Y%m%d%H%M%S")],
+            "Value": [_SCHEDULED_END],
         },  # Scheduled Processing End DateTime
         "00404025": {
             "vr": "SQ",
@@ -285,7 +295,7 @@ def sample_ups_workitem() -> dict[str, Any]:
     }
 
 
-@pytest.fixture(autouse=True)
+@pytest.fixture
 def ups_state_report() -> dict[str, Any]:
     """
     Create a sample UPS state report for testing.
@@ -296,7 +306,7 @@ def ups_state_report() -> dict[str, Any]:
     """
     return {
         "00080016": {"vr": "UI", "Value": ["1.2.840.10008.5.1.4.34.6.1"]},  # SOP Class UID (UPS Push)
-        "00080018": {"vr": "UI", "Value": [f"{generate_uid}"]},  # SOP Instance UID
+        "00080018": {"vr": "UI", "Value": [next(_sample_uids)]},  # SOP Instance UID
         "00741000": {"vr": "CS", "Value": ["IN PROGRESS"]},  # Procedure Step State
         "00741002": {
             "vr": "SQ",
@@ -310,7 +320,7 @@ def ups_state_report() -> dict[str, Any]:
     }
 
 
-@pytest.fixture(autouse=True)
+@pytest.fixture
 def ups_subscription_request() -> dict[str, Any]:
     """
     Create a sample UPS subscription request for testing.
@@ -325,7 +335,7 @@ def ups_subscription_request() -> dict[str, Any]:
     }
 
 
-@pytest.fixture(autouse=True)
+@pytest.fixture(scope="session")
 def ups_search_params() -> dict[str, str]:
     """
     Create sample DICOMWeb UPS-RS search parameters.
@@ -346,7 +356,7 @@ def ups_search_params() -> dict[str, str]:
     }
 
 
-@pytest.fixture(autouse=True)
+@pytest.fixture(scope="session")
 def create_ups_filter_params() -> Callable[..., str]:
     """
     Create a factory function to generate UPS-RS filter parameters.
@@ -404,7 +414,7 @@ def create_ups_filter_params() -> Callable[..., str]:
     return _create_params
 
 
-@pytest.fixture(autouse=True)
+@pytest.fixture
 async def mock_dicom_db_session() -> AsyncGenerator[None, None]:
     """
     Create a mock database session for DICOM storage testing.
@@ -438,7 +448,7 @@ async def mock_dicom_db_session() -> AsyncGenerator[None, None]:
     yield None
 
 
-@pytest.fixture(autouse=True)
+@pytest.fixture(scope="session")
 def uvicorn_config() -> dict[str, Any]:
     """
     Define Uvicorn server configuration for testing.
@@ -159,6 +159,26 @@ class TestWorkitemTransactions:
         # been created, namely "SCHEDULED"
         assert result.json["00741000"]["Value"][0] == "SCHEDULED"
 
+    def test_create_workitem_with_invalid_body(self, client: TestClient) -> None:
+        """Test that malformed create requests are rejected as client errors, not server errors."""
+        headers = {"Content-Type": "application/dicom+json"}
+        result = client.simulate_post("/workitems", body=b"", headers=headers)
+        assert result.status_code == 400
+
+        result = client.simulate_post("/workitems", body=b"{not json", headers=headers)
+        assert result.status_code == 400
+
+    def test_change_state_with_malformed_elements(self, client: TestClient, sample_ups_workitem: dict[str, Any]) -> None:
+        """Test that change state requests with elements that are not DICOM JSON objects are rejected as client errors."""
+        result = create_workitem_helper(client, sample_ups_workitem)
+        assert result.status_code == 201
+        specified_instance_uid = sample_ups_workitem["00080018"]["Value"][0]
+        headers = {"Content-Type": "application/dicom+json"}
+
+        for body in ({"00741000": "IN PROGRESS", "00081195": None}, {"00741000": ["IN PROGRESS"], "00081195": {"Value": "1"}}):
+            result = client.simulate_put(f"/workitems/{specified_instance_uid}/state", json=body, headers=headers)
+            assert result.status_code == 400
+
     def test_change_state_in_progress(self, client: TestClient, sample_ups_workitem: dict[str, Any]) -> None:
         """Test that state changes to IN PROGRESS."""
         result = create_workitem_helper(client, sample_ups_workitem)
@@ -178,6 +198,33 @@ class TestWorkitemTransactions:
         assert result.status_code == 200
         assert result.json["00741000"]["Value"][0] == workitem_state
 
+    def test_change_state_follows_the_state_machine(self, client: TestClient, sample_ups_workitem: dict[str, Any]) -> None:
+        """Test that claimed and completed workitems are found by their new state and reject repeated changes."""
+        result = create_workitem_helper(client, sample_ups_workitem)
+        assert result.status_code == 201
+        specified_instance_uid = sample_ups_workitem["00080018"]["Value"][0]
+        transaction_uid: str = str(generate_uid())
+
+        result = change_state_helper(client, specified_instance_uid, transaction_uid, "IN PROGRESS")
+        assert result.status_code == 200
+        result = search_workitem_helper(client, match_parameters={"00741000": "IN PROGRESS"}, no_cache=True)
+        assert result.status_code == 200
+        assert [workitem["00080018"]["Value"][0] for workitem in result.json] == [specified_instance_uid]
+        result = search_workitem_helper(client, match_parameters={"00741000": "SCHEDULED"}, no_cache=True)
+        assert result.status_code == 404
+
+        # a workitem that is IN PROGRESS can't be claimed again
+        result = change_state_helper(client, specified_instance_uid, transaction_uid, "IN PROGRESS")
+        assert result.status_code == 409
+
+        result = change_state_helper(client, specified_instance_uid, transaction_uid, "COMPLETED")
+        assert result.status_code == 200
+        result = search_workitem_helper(client, match_parameters={"00741000": "COMPLETED"}, no_cache=True)
+        assert result.status_code == 200
+        assert len(result.json) == 1
+        result = change_state_helper(client, specified_instance_uid, transaction_uid, "COMPLETED")
+        assert result.status_code == 410
+
     def test_update_workitem_while_scheduled(
         self, client: TestClient, sample_ups_workitem: dict[str, Any], sample_schedule_date_update: dict[str, Any]
     ) -> None:
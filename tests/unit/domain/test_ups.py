@@ -0,0 +1,108 @@
+"""Unit tests for the UPS domain models."""
+
+import pytest
+from pydicom import Dataset
+from pydicom.errors import InvalidDicomError
+
+from pyupsrs.domain.models.ups import Subscription, WorkItem, WorkItemStatus
+
+
+def test_workitem_defaults() -> None:
+    """Test that a new workitem starts out scheduled without a transaction UID."""
+    workitem = WorkItem(Dataset())
+
+    assert workitem.status == WorkItemStatus.SCHEDULED
+    assert workitem.transaction_uid is None
+    assert workitem.updated_at == workitem.created_at
+
+
+def test_models_are_slotted() -> None:
+    """Test that the models do not carry a per-instance __dict__."""
+    workitem = WorkItem(Dataset())
+    subscription = Subscription(workitem_uid="1.2.3.4", ae_title="TEST_AE")
+
+    assert not hasattr(workitem, "__dict__")
+    assert not hasattr(subscription, "__dict__")
+    with pytest.raises(AttributeError):
+        workitem.unknown_attribute = True
+
+
+def test_workitem_status_from_string() -> None:
+    """Test converting Procedure Step State strings to statuses."""
+    assert WorkItemStatus.from_string("IN PROGRESS") is WorkItemStatus.IN_PROGRESS
+    for status in WorkItemStatus:
+        assert WorkItemStatus.from_string(status.value) is status
+
+    with pytest.raises(ValueError):
+        WorkItemStatus.from_string("IN_PROGRESS")
+    with pytest.raises(ValueError):
+        WorkItemStatus.from_string(None)
+
+
+def test_workitem_uid() -> None:
+    """Test that the workitem UID follows the dataset and the uid setter."""
+    ds = Dataset()
+    ds.AffectedSOPInstanceUID = "1.2.3.4"
+    workitem = WorkItem(ds)
+    assert workitem.uid == "1.2.3.4"
+
+    workitem.uid = "1.2.3.5"
+    assert workitem.uid == "1.2.3.5"
+    assert workitem.ds.SOPInstanceUID == "1.2.3.5"
+    assert workitem.ds.AffectedSOPInstanceUID == "1.2.3.5"
+
+    assert WorkItem().uid is None
+
+
+@pytest.mark.filterwarnings("ignore:Invalid value for VR UI")
+def test_workitem_invalid_uid() -> None:
+    """Test that setting an invalid UID is rejected and reported."""
+    workitem = WorkItem(Dataset())
+
+    with pytest.raises(InvalidDicomError, match="Not a valid UID: 1.2.x"):
+        workitem.uid = "1.2.x"
+    assert workitem.uid is None
+
+
+def test_subscription_identity() -> None:
+    """Test that subscriptions are identified by workitem UID and AE title."""
+    subscription = Subscription(workitem_uid="1.2.3.4", ae_title="TEST_AE")
+    suspended = Subscription(workitem_uid="1.2.3.4", ae_title="TEST_AE", deletion_lock=True, suspended=True)
+
+    assert subscription == suspended
+    assert hash(subscription) == hash(suspended)
+    assert len({subscription, suspended}) == 1
+    assert subscription != Subscription(workitem_uid="1.2.3.4", ae_title="OTHER_AE")
+    assert subscription != Subscription(workitem_uid="1.2.3.5", ae_title="TEST_AE")
+
+
+def test_workitem_without_dataset() -> None:
+    """Test that a workitem without a dataset cannot be changed."""
+    workitem = WorkItem()
+
+    with pytest.raises(ValueError):
+        workitem.update_procedure_step_status(WorkItemStatus.IN_PROGRESS)
+    with pytest.raises(ValueError):
+        workitem.uid = "1.2.3.4"
+
+
+def test_workitem_copy_for_edit() -> None:
+    """Test that removing or setting elements of a copy leaves the original workitem intact."""
+    ds = Dataset()
+    ds.SOPInstanceUID = "1.2.3.4"
+    ds.PatientName = "Test^Patient"
+    ds.ProcedureStepState = "SCHEDULED"
+    workitem = WorkItem(ds)
+    workitem.transaction_uid = "1.2.3.5"
+
+    copy = workitem.copy_for_edit()
+    del copy.ds.PatientName
+    copy.update_procedure_step_status(WorkItemStatus.IN_PROGRESS)
+
+    assert copy.uid == "1.2.3.4"
+    assert copy.status == WorkItemStatus.IN_PROGRESS
+    assert workitem.status == WorkItemStatus.SCHEDULED
+    assert workitem.ds.ProcedureStepState == "SCHEDULED"
+    assert copy.transaction_uid == "1.2.3.5"
+    assert "PatientName" not in copy.ds
+    assert workitem.ds.PatientName == "Test^Patient"
@@ -0,0 +1,106 @@
+"""Unit tests for the SQLite connection manager."""
+
+import sqlite3
+import threading
+from pathlib import Path
+
+import pytest
+from pydicom import Dataset
+
+from pyupsrs.storage.database import Database, dataset_from_blob, dataset_to_blob
+
+
+def test_write_then_read(tmp_path: Path) -> None:
+    """Test that committed writes are visible to later reads, also from another thread."""
+    database = Database(str(tmp_path / "ups.db"))
+    database.execute_write(
+        "INSERT INTO workitems (uid, status, created_at) VALUES (?, ?, ?)", ("1.2.3.4", "SCHEDULED", "2025-01-01")
+    )
+
+    assert database.fetch_one("SELECT status FROM workitems WHERE uid = ?", ("1.2.3.4",)) == {"status": "SCHEDULED"}
+    rows: list[list[sqlite3.Row]] = []
+    thread = threading.Thread(target=lambda: rows.append(database.fetch_all("SELECT uid FROM workitems")))
+    thread.start()
+    thread.join()
+    assert [tuple(row) for row in rows[0]] == [("1.2.3.4",)]
+    assert database.fetch_one("PRAGMA journal_mode") == {"journal_mode": "wal"}
+    database.close_all()
+
+
+def test_failed_write_is_rolled_back(tmp_path: Path) -> None:
+    """Test that a failing write leaves no open transaction behind."""
+    database = Database(str(tmp_path / "ups.db"))
+    with pytest.raises(sqlite3.IntegrityError), database._get_connection() as conn:
+        conn.execute("INSERT INTO workitems (uid, status, created_at) VALUES (?, ?, ?)", ("1.2.3.4", "SCHEDULED", "now"))
+        conn.execute("INSERT INTO workitems (uid) VALUES (?)", ("1.2.3.5",))
+
+    assert database.fetch_all("SELECT uid FROM workitems") == []
+    database.close_all()
+    assert list(database.fetch_iter("SELECT uid FROM workitems")) == []
+
+
+def test_execute_many(tmp_path: Path) -> None:
+    """Test that a bulk insert spanning several chunks inserts every row."""
+    database = Database(str(tmp_path / "ups.db"))
+
+    row_count = database.execute_many(
+        "INSERT INTO workitems (uid, status, created_at) VALUES (?, ?, ?)",
+        ((f"1.2.3.{i}", "SCHEDULED", "2025-01-01") for i in range(25)),
+        chunk_size=10,
+    )
+
+    assert row_count == 25
+    assert database.fetch_one("SELECT count(*) AS n FROM workitems") == {"n": 25}
+    assert [row["uid"] for row in database.fetch_iter("SELECT uid FROM workitems ORDER BY rowid LIMIT 2")] == [
+        "1.2.3.0",
+        "1.2.3.1",
+    ]
+    database.close_all()
+
+
+def test_worklist_query_uses_index(tmp_path: Path) -> None:
+    """Test that filtering workitems on state and scheduled start does not scan the table."""
+    database = Database(str(tmp_path / "ups.db"))
+
+    plan = database.fetch_all(
+        "EXPLAIN QUERY PLAN SELECT uid FROM workitems WHERE status = ? AND scheduled_start_time BETWEEN ? AND ?",
+        ("SCHEDULED", "20250101", "20250102"),
+    )
+
+    assert any("idx_workitems_status_sched" in row["detail"] for row in plan)
+    database.close_all()
+
+
+def test_dataset_json_round_trip(tmp_path: Path) -> None:
+    """Test that a dataset stored in the dataset_json column reads back unchanged."""
+    database = Database(str(tmp_path / "ups.db"))
+    ds = Dataset()
+    ds.SOPInstanceUID = "1.2.3.4"
+    ds.PatientName = "Test^Patient"
+    ds.ProcedureStepState = "SCHEDULED"
+    database.execute_write(
+        "INSERT INTO workitems (uid, status, created_at, dataset_json) VALUES (?, ?, ?, ?)",
+        ("1.2.3.4", "SCHEDULED", "2025-01-01", dataset_to_blob(ds)),
+    )
+
+    row = database.fetch_one("SELECT dataset_json FROM workitems WHERE uid = ?", ("1.2.3.4",))
+
+    assert dataset_from_blob(row["dataset_json"]) == ds
+    database.close_all()
+
+
+def test_dataset_json_column_added_to_existing_database(tmp_path: Path) -> None:
+    """Test that opening a database created without the dataset_json column adds it."""
+    path = tmp_path / "ups.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE workitems (uid TEXT PRIMARY KEY, status TEXT NOT NULL, created_at TEXT NOT NULL,"
+            " updated_at TEXT, scheduled_start_time TEXT, scheduled_end_time TEXT, patient_name TEXT, patient_id TEXT,"
+            " accession_number TEXT, procedure_step_type TEXT, procedure_code TEXT)"
+        )
+    conn.close()
+
+    database = Database(str(path))
+
+    assert "dataset_json" in [row["name"] for row in database.fetch_all("PRAGMA table_info(workitems)")]
+    database.close_all()
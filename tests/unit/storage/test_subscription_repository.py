@@ -0,0 +1,99 @@
+"""Unit tests for the in-memory subscription repository."""
+
+from collections.abc import Iterator
+from dataclasses import replace
+
+import pytest
+
+from pyupsrs.domain.models.ups import Subscription
+from pyupsrs.storage.repositories import subscription_repository
+from pyupsrs.storage.repositories.subscription_repository import SubscriptionRepository
+
+
+@pytest.fixture
+def repository() -> Iterator[SubscriptionRepository]:
+    """Create a repository backed by an empty store."""
+    indices = (subscription_repository._by_pair, subscription_repository._by_workitem, subscription_repository._by_ae_title)
+    saved_indices = [dict(index) for index in indices]
+    for index in indices:
+        index.clear()
+    yield SubscriptionRepository(database_uri="sqlite:///:memory:")
+    for index, saved_index in zip(indices, saved_indices, strict=True):
+        index.clear()
+        index.update(saved_index)
+
+
+def test_get_by_workitem_and_ae_title(repository: SubscriptionRepository) -> None:
+    """Test looking up a subscription by workitem UID and AE title."""
+    subscription = Subscription(workitem_uid="1.2.3.4", ae_title="TEST_AE")
+    repository.create(subscription)
+    repository.create(Subscription(workitem_uid="1.2.3.4", ae_title="OTHER_AE"))
+
+    assert repository.get("1.2.3.4", "TEST_AE") is subscription
+    assert repository.get("1.2.3.5", "TEST_AE") is None
+    assert repository.get_by_workitem_and_ae_title("1.2.3.4", "TEST_AE") == [subscription]
+
+
+def test_delete(repository: SubscriptionRepository) -> None:
+    """Test that deleted subscriptions can no longer be found."""
+    repository.create(Subscription(workitem_uid="1.2.3.4", ae_title="TEST_AE"))
+
+    assert repository.delete("1.2.3.4", "TEST_AE")
+    assert repository.get("1.2.3.4", "TEST_AE") is None
+    assert repository.get_by_ae_title("TEST_AE") == []
+    assert not repository.delete("1.2.3.4", "TEST_AE")
+
+
+def test_create_replaces_suspended_equivalent(repository: SubscriptionRepository) -> None:
+    """Test that resubscribing discards the suspended subscription."""
+    repository.create(Subscription(workitem_uid="1.2.3.4", ae_title="TEST_AE", suspended=True))
+    repository.create(Subscription(workitem_uid="1.2.3.4", ae_title="TEST_AE"))
+
+    subscriptions = repository.get_by_workitem_and_ae_title("1.2.3.4", "TEST_AE")
+    assert len(subscriptions) == 1
+    assert not subscriptions[0].suspended
+
+
+def test_update(repository: SubscriptionRepository) -> None:
+    """Test that updating replaces the stored subscription for the pair."""
+    subscription = Subscription(workitem_uid="1.2.3.4", ae_title="TEST_AE")
+    repository.create(subscription)
+
+    repository.update(replace(subscription, suspended=True))
+
+    subscriptions = repository.get_by_ae_title("TEST_AE")
+    assert len(subscriptions) == 1
+    assert subscriptions[0].suspended
+
+
+def test_create_replaces_existing_subscription(repository: SubscriptionRepository) -> None:
+    """Test that subscribing again replaces the stored subscription."""
+    repository.create(Subscription(workitem_uid="1.2.3.4", ae_title="TEST_AE"))
+    repository.create(Subscription(workitem_uid="1.2.3.4", ae_title="TEST_AE", deletion_lock=True))
+
+    subscriptions = repository.get_by_ae_title("TEST_AE")
+    assert len(subscriptions) == 1
+    assert subscriptions[0].deletion_lock
+
+
+def test_get_by_workitem_and_ae_title_indices(repository: SubscriptionRepository) -> None:
+    """Test the per workitem and per AE title lookups."""
+    repository.create(Subscription(workitem_uid="1.2.3.4", ae_title="TEST_AE"))
+    repository.create(Subscription(workitem_uid="1.2.3.4", ae_title="OTHER_AE"))
+    repository.create(Subscription(workitem_uid="1.2.3.5", ae_title="TEST_AE"))
+
+    assert {s.ae_title for s in repository.get_by_workitem("1.2.3.4")} == {"TEST_AE", "OTHER_AE"}
+    assert {s.workitem_uid for s in repository.get_by_ae_title("TEST_AE")} == {"1.2.3.4", "1.2.3.5"}
+
+    repository.delete("1.2.3.4", "TEST_AE")
+    assert [s.ae_title for s in repository.get_by_workitem("1.2.3.4")] == ["OTHER_AE"]
+    assert [s.workitem_uid for s in repository.get_by_ae_title("TEST_AE")] == ["1.2.3.5"]
+    assert repository.get_by_workitem("1.2.3.6") == []
+
+
+def test_create_bulk(repository: SubscriptionRepository) -> None:
+    """Test creating several subscriptions at once."""
+    subscriptions = [Subscription(workitem_uid=f"1.2.3.{i}", ae_title="TEST_AE") for i in range(3)]
+
+    assert repository.create_bulk(subscriptions) == subscriptions
+    assert len(repository.get_by_ae_title("TEST_AE")) == 3
@@ -0,0 +1,221 @@
+"""Unit tests for the in-memory workitem repository."""
+
+from collections.abc import Iterator
+
+import pytest
+from pydicom import Dataset
+
+from pyupsrs.domain.models.ups import WorkItem, WorkItemStatus
+from pyupsrs.storage.repositories import workitem_repository
+from pyupsrs.storage.repositories.workitem_repository import WorkItemRepository
+
+
+@pytest.fixture
+def repository() -> Iterator[WorkItemRepository]:
+    """Create a repository backed by an empty store."""
+    repository = WorkItemRepository(database_uri="sqlite:///:memory:")
+    repository.clear()
+    yield repository
+    repository.clear()
+
+
+def _workitem(uid: str, patient_id: str) -> WorkItem:
+    ds = Dataset()
+    ds.SOPInstanceUID = uid
+    ds.PatientID = patient_id
+    ds.PatientName = "Test^Patient"
+    ds.ProcedureStepState = "SCHEDULED"
+    return WorkItem(ds)
+
+
+def test_get_filtered_include_field_leaves_store_intact(repository: WorkItemRepository) -> None:
+    """Test that restricting the returned elements does not remove them from the stored workitem."""
+    stored = repository.create(_workitem("1.2.3.4", "PID1"))
+    repository.create(_workitem("1.2.3.5", "PID2"))
+    match = Dataset()
+    match.PatientID = "PID1"
+
+    workitems = repository.get_filtered(match=match, include_field=["SOPInstanceUID", "PatientID"])
+
+    assert [x.uid for x in workitems] == ["1.2.3.4"]
+    assert "PatientName" not in workitems[0].ds
+    assert stored.ds.PatientName == "Test^Patient"
+
+
+def test_get_filtered_returns_stored_workitems(repository: WorkItemRepository) -> None:
+    """Test that a query without includefield returns the stored workitems rather than copies."""
+    stored = repository.create(_workitem("1.2.3.4", "PID1"))
+    match = Dataset()
+    match.PatientID = "PID1"
+
+    assert repository.get_filtered(match=match, include_field=[]) == [stored]
+    assert repository.get_filtered(match=match, include_field=[])[0] is stored
+    assert repository.get_all()[0] is stored
+
+
+def test_get_filtered_uses_current_indexed_values(repository: WorkItemRepository) -> None:
+    """Test that queries on indexed keywords follow updates and deletes."""
+    repository.create(_workitem("1.2.3.4", "PID1"))
+    repository.create(_workitem("1.2.3.5", "PID2"))
+    repository.create(_workitem("1.2.3.6", "PID1"))
+    change = Dataset()
+    change.SOPInstanceUID = "1.2.3.6"
+    change.PatientID = "PID2"
+    repository.update(WorkItem(change))
+    repository.delete("1.2.3.5")
+    match = Dataset()
+    match.PatientID = "PID2"
+
+    assert [x.uid for x in repository.get_filtered(match=match, include_field=[])] == ["1.2.3.6"]
+    match.PatientID = "PID*"
+    assert [x.uid for x in repository.get_filtered(match=match, include_field=[])] == ["1.2.3.4", "1.2.3.6"]
+
+
+def test_get_filtered_start_datetime_range(repository: WorkItemRepository) -> None:
+    """Test range queries on the scheduled procedure step start date and time."""
+    for uid, start in (("1.2.3.4", "20250101120000"), ("1.2.3.5", "20250102120000"), ("1.2.3.6", "20250103120000")):
+        workitem = _workitem(uid, "PID1")
+        workitem.ds.ScheduledProcedureStepStartDateTime = start
+        repository.create(workitem)
+    match = Dataset()
+
+    match.ScheduledProcedureStepStartDateTime = "20250102000000-20250103120000"
+    assert [x.uid for x in repository.get_filtered(match=match, include_field=[])] == ["1.2.3.5", "1.2.3.6"]
+    match.ScheduledProcedureStepStartDateTime = "-20250102120000"
+    assert [x.uid for x in repository.get_filtered(match=match, include_field=[])] == ["1.2.3.4", "1.2.3.5"]
+    match.PatientID = "PID2"
+    assert repository.get_filtered(match=match, include_field=[]) == []
+
+
+def test_get_filtered_pagination(repository: WorkItemRepository) -> None:
+    """Test that offset and limit select a page of the matching workitems."""
+    for i in range(5):
+        repository.create(_workitem(f"1.2.3.{i}", "PID1"))
+    match = Dataset()
+    match.PatientID = "PID1"
+
+    page = repository.get_filtered(match=match, include_field=["SOPInstanceUID"], offset=1, limit=2)
+
+    assert [x.uid for x in page] == ["1.2.3.1", "1.2.3.2"]
+    assert [x.uid for x in repository.get_filtered(match=match, include_field=[], offset=3)] == ["1.2.3.3", "1.2.3.4"]
+    assert [x.uid for x in repository.get_filtered(limit=1)] == ["1.2.3.0"]
+
+
+def test_get_filtered_include_field_tags(repository: WorkItemRepository) -> None:
+    """Test that includefield accepts tags, also ones with hex letters, as well as keywords."""
+    workitem = _workitem("1.2.3.4", "PID1")
+    workitem.ds.ContactURI = "http://localhost"
+    repository.create(workitem)
+    match = Dataset()
+    match.PatientID = "PID1"
+
+    (result,) = repository.get_filtered(match=match, include_field=["00100020", "0074100A", "SOPInstanceUID"])
+
+    assert sorted(elem.keyword for elem in result.ds) == ["ContactURI", "PatientID", "SOPInstanceUID"]
+
+
+def test_update_merges_only_changed_elements(repository: WorkItemRepository) -> None:
+    """Test that an update replaces changed elements only and keeps the indices current."""
+    stored = repository.create(_workitem("1.2.3.4", "PID1"))
+    unchanged_element = stored.ds["PatientName"]
+    change = Dataset()
+    change.SOPInstanceUID = "1.2.3.4"
+    change.PatientName = "Test^Patient"
+    change.PatientID = "PID2"
+
+    repository.update(WorkItem(change))
+
+    assert stored.ds["PatientName"] is unchanged_element
+    assert stored.ds.PatientID == "PID2"
+    match = Dataset()
+    match.PatientID = "PID2"
+    assert repository.get_filtered(match=match, include_field=[]) == [stored]
+
+
+def test_get_filtered_empty_match(repository: WorkItemRepository) -> None:
+    """Test that an includefield query without match criteria returns a page of all workitems."""
+    for i in range(3):
+        repository.create(_workitem(f"1.2.3.{i}", "PID1"))
+
+    page = repository.get_filtered(match=Dataset(), include_field=["all"], offset=1, limit=1)
+
+    assert [x.uid for x in page] == ["1.2.3.1"]
+    assert [x.uid for x in repository.get_filtered(include_field=["PatientID", "SOPInstanceUID"])] == [
+        "1.2.3.0",
+        "1.2.3.1",
+        "1.2.3.2",
+    ]
+
+
+def _code(value: str) -> Dataset:
+    item = Dataset()
+    item.CodeValue = value
+    item.CodingSchemeDesignator = "99IHERO2008"
+    item.CodeMeaning = value
+    return item
+
+
+def test_get_filtered_uid_and_code_sequence(repository: WorkItemRepository) -> None:
+    """Test queries on the workitem UID and on the scheduled station name codes."""
+    for uid, stations in (("1.2.3.4", ["TX1"]), ("1.2.3.5", ["TX1", "TX2"]), ("1.2.3.6", [])):
+        workitem = _workitem(uid, "PID1")
+        workitem.ds.ScheduledStationNameCodeSequence = [_code(station) for station in stations]
+        repository.create(workitem)
+    match = Dataset()
+
+    match.ScheduledStationNameCodeSequence = [_code("TX2"), _code("TX1")]
+    assert [x.uid for x in repository.get_filtered(match=match, include_field=[])] == ["1.2.3.5"]
+    match.ScheduledStationNameCodeSequence = [_code("TX1")]
+    assert [x.uid for x in repository.get_filtered(match=match, include_field=[])] == ["1.2.3.4", "1.2.3.5"]
+    match.SOPInstanceUID = "1.2.3.4"
+    assert [x.uid for x in repository.get_filtered(match=match, include_field=[])] == ["1.2.3.4"]
+    match.SOPInstanceUID = "1.2.3.6"
+    assert repository.get_filtered(match=match, include_field=[]) == []
+
+
+def test_clear_resets_indices(repository: WorkItemRepository) -> None:
+    """Test that clearing the repository leaves no UIDs behind in the secondary indices."""
+    workitem = _workitem("1.2.3.4", "PID1")
+    workitem.ds.ScheduledProcedureStepStartDateTime = "20250101120000"
+    workitem.ds.ScheduledStationNameCodeSequence = [_code("TX1")]
+    repository.create(workitem)
+
+    repository.clear()
+
+    assert repository.get_all() == []
+    assert all(not by_value for by_value in workitem_repository.local_store_idx.values())
+    assert all(not by_code for by_code in workitem_repository._code_idx.values())
+    assert workitem_repository._start_datetime_idx == []
+    assert workitem_repository._indexed_values == {}
+    assert workitem_repository._creation_order == {}
+
+
+def test_get_by_uid_changes_go_through_update(repository: WorkItemRepository) -> None:
+    """Test that changing a retrieved workitem in place leaves the store and its indices alone until update."""
+    stored = repository.create(_workitem("1.2.3.4", "PID1"))
+    match = Dataset()
+    match.PatientID = "PID2"
+
+    workitem = repository.get_by_uid("1.2.3.4")
+    workitem.ds.PatientID = "PID2"
+    workitem.update_procedure_step_status(WorkItemStatus.IN_PROGRESS)
+    workitem.transaction_uid = "1.2.3.5"
+
+    assert stored.ds.PatientID == "PID1"
+    assert stored.ds.ProcedureStepState == "SCHEDULED"
+    assert stored.status == WorkItemStatus.SCHEDULED
+    assert stored.transaction_uid is None
+    assert repository.get_filtered(match=match, include_field=[]) == []
+
+    repository.update(workitem)
+
+    assert [x.uid for x in repository.get_filtered(match=match, include_field=[])] == ["1.2.3.4"]
+    match.PatientID = "PID1"
+    assert repository.get_filtered(match=match, include_field=[]) == []
+    assert stored.ds.ProcedureStepState == "IN PROGRESS"
+    assert stored.status == WorkItemStatus.IN_PROGRESS
+    assert stored.transaction_uid == "1.2.3.5"
+    assert stored.updated_at == workitem.updated_at
+    match = Dataset()
+    match.ProcedureStepState = "IN PROGRESS"
+    assert repository.get_filtered(match=match, include_field=[]) == [stored]
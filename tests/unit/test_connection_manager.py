@@ -1,11 +1,12 @@
 """Tests for the WebSocket connection manager with callback system."""
 
+import asyncio
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 import websockets
 
-from pyupsrs.websocket.connection_manager import ConnectionManager
+from pyupsrs.websocket.connection_manager import BROADCAST_BATCH_SIZE, ConnectionManager
 
 
 class MockAsyncIterator:
@@ -121,3 +122,81 @@ async def test_connection_storage(connection_manager: ConnectionManager) -> None
 
     # Verify the connection was removed after the connection closed
     assert "test_subscriber" not in connection_manager.connections
+
+
+def test_get_subscribers(connection_manager: ConnectionManager) -> None:
+    """Test getting the subscribers of workitems with and without subscriptions."""
+    connection_manager.subscribe("subscriber", "1.2.3.4")
+
+    assert connection_manager.get_subscribers("1.2.3.4") == {"subscriber"}
+    assert connection_manager.get_subscribers("1.2.3.5") == set()
+    connection_manager.unsubscribe("subscriber", "1.2.3.4")
+    assert connection_manager.get_subscribers("1.2.3.4") == set()
+
+
+def test_remove_connection(connection_manager: ConnectionManager) -> None:
+    """Test that removing a connection drops its subscriptions and the workitems left without subscribers."""
+    connection_manager.connections = {"leaving": AsyncMock(spec=websockets.ServerConnection)}
+    connection_manager.subscribe("leaving", "1.2.3.4")
+    connection_manager.subscribe("leaving", "1.2.3.5")
+    connection_manager.subscribe("staying", "1.2.3.5")
+
+    connection_manager._remove_connection("leaving")
+    connection_manager._remove_connection("unknown")
+
+    assert connection_manager.connections == {}
+    assert connection_manager.subscriptions == {"1.2.3.5": {"staying"}}
+    assert connection_manager.subscriber_to_workitems == {"staying": {"1.2.3.5"}}
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_enqueue_to_all_in_batches(connection_manager: ConnectionManager) -> None:
+    """Test that queueing for more subscribers than fit in a batch reaches all of them, a batch per loop iteration."""
+    subscriber_ids = [f"subscriber{index}" for index in range(2 * BROADCAST_BATCH_SIZE + 1)]
+    connection_manager.outbound_queues = {subscriber_id: asyncio.Queue() for subscriber_id in subscriber_ids[1:]}
+
+    def queued_count() -> int:
+        return sum(outbound_queue.qsize() for outbound_queue in connection_manager.outbound_queues.values())
+
+    connection_manager.enqueue_to_all(subscriber_ids, "message")
+    assert queued_count() == BROADCAST_BATCH_SIZE - 1
+    await asyncio.sleep(0)
+    assert queued_count() == 2 * BROADCAST_BATCH_SIZE - 1
+    await asyncio.sleep(0)
+    assert queued_count() == 2 * BROADCAST_BATCH_SIZE
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_enqueue_to_all_sends_through_connection_writer(connection_manager: ConnectionManager) -> None:
+    """Test that queued messages are sent in order by the writer of the connection."""
+    websocket = AsyncMock(spec=websockets.ServerConnection)
+    connection_manager.connections = {"subscriber": websocket}
+    outbound_queue: asyncio.Queue[str] = asyncio.Queue(2)
+    connection_manager.outbound_queues = {"subscriber": outbound_queue}
+
+    connection_manager.enqueue_to_all(["subscriber", "unknown"], "first")
+    connection_manager.enqueue_to_all(["subscriber"], "second")
+    # The queue is full, so the message is dropped
+    connection_manager.enqueue_to_all(["subscriber"], "dropped")
+
+    writer = asyncio.create_task(connection_manager._write_queued("subscriber", outbound_queue))
+    await asyncio.sleep(0.01)
+    writer.cancel()
+
+    assert [call.args[0] for call in websocket.send.await_args_list] == ["first", "second"]
+
+
+@pytest.mark.asyncio(loop_scope="function")
+async def test_enqueue_message_waits_for_room(connection_manager: ConnectionManager) -> None:
+    """Test that a message queued with enqueue_message waits for room instead of being dropped."""
+    outbound_queue: asyncio.Queue[str] = asyncio.Queue(1)
+    connection_manager.outbound_queues = {"subscriber": outbound_queue}
+
+    assert await connection_manager.enqueue_message("subscriber", "first")
+    second = asyncio.create_task(connection_manager.enqueue_message("subscriber", "second"))
+    await asyncio.sleep(0)
+    assert not second.done()
+    assert outbound_queue.get_nowait() == "first"
+    assert await second
+    assert outbound_queue.get_nowait() == "second"
+    assert not await connection_manager.enqueue_message("unknown", "message")
@@ -1,14 +1,29 @@
 """Tests for the notification service with pending notification queue."""
 
+import asyncio
+import itertools
+from collections import deque
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from pydicom import Dataset
 
-import pyupsrs.domain.services.service_provider as service_provider
+from pyupsrs.config import Config
 from pyupsrs.domain.models.ups import FILTERED_SUBSCRIPTION_UID, GLOBAL_SUBSCRIPTION_UID, Subscription, WorkItem
+from pyupsrs.utils.dicom_query_matcher import compile_query
 from pyupsrs.websocket.connection_manager import ConnectionManager
-from pyupsrs.websocket.notification_service import NotificationService, create_ups_state_report
+from pyupsrs.websocket.notification_service import (
+    ListRestartStatus,
+    NotificationService,
+    SCPStatus,
+    _event_report_to_json,
+    create_scp_status_change_report,
+    create_ups_assigned_report,
+    create_ups_cancel_requested_report,
+    create_ups_progress_report,
+    create_ups_state_report,
+    get_next_message_id,
+)
 
 
 @pytest.fixture
@@ -56,16 +71,16 @@ def test_initialization(notification_service: NotificationService, connection_ma
     connection_manager.register_connection_callback.assert_called_once()
 
 
-@patch("pyupsrs.domain.services.service_provider.ServiceProvider")
+@patch("pyupsrs.domain.services.service_provider.get_provider")
 def test_queue_state_reports_specific_workitem(
-    mock_service_provider: service_provider.ServiceProvider,
+    mock_get_provider: MagicMock,
     notification_service: NotificationService,
     sample_workitem: WorkItem,
     sample_subscription: Subscription,
 ) -> None:
     """Test queueing state reports for a specific workitem subscription."""
     # Setup mock service provider to return the sample workitem
-    mock_instance = mock_service_provider.get_instance.return_value
+    mock_instance = mock_get_provider.return_value
     mock_instance.workitem_repo.get_by_uid.return_value = sample_workitem
 
     # Call the method
@@ -85,16 +100,16 @@ def test_queue_state_reports_specific_workitem(
     assert queued_message.InputReadinessState == "READY"
 
 
-@patch("pyupsrs.domain.services.service_provider.ServiceProvider")
+@patch("pyupsrs.domain.services.service_provider.get_provider")
 def test_queue_state_reports_global_subscription(
-    mock_service_provider: service_provider.ServiceProvider, notification_service: NotificationService
+    mock_get_provider: MagicMock, notification_service: NotificationService
 ) -> None:
     """Test queueing state reports for a global subscription with deletion lock."""
     # Create a global subscription
     global_subscription = Subscription(workitem_uid=GLOBAL_SUBSCRIPTION_UID, ae_title="GLOBAL_AE", deletion_lock=True)
 
     # Setup mock service provider to return multiple workitems
-    mock_instance = mock_service_provider.get_instance.return_value
+    mock_instance = mock_get_provider.return_value
     workitem1 = MagicMock(spec=WorkItem)
     workitem1.uid = "1.2.3.4"
     workitem1.ds = Dataset()
@@ -127,9 +142,9 @@ def test_queue_state_reports_global_subscription(
     assert messages[1].ProcedureStepState == "IN PROGRESS"
 
 
-@patch("pyupsrs.domain.services.service_provider.ServiceProvider")
+@patch("pyupsrs.domain.services.service_provider.get_provider")
 def test_queue_state_reports_filtered_subscription(
-    mock_service_provider: service_provider.ServiceProvider, notification_service: NotificationService
+    mock_get_provider: MagicMock, notification_service: NotificationService
 ) -> None:
     """Test queueing state reports for a filtered subscription."""
     # Create a filter
@@ -142,7 +157,7 @@ def test_queue_state_reports_filtered_subscription(
     )
 
     # Setup mock service provider and mock the match_query_to_dataset function
-    mock_instance = mock_service_provider.get_instance.return_value
+    mock_instance = mock_get_provider.return_value
     workitem1 = MagicMock(spec=WorkItem)
     workitem1.uid = "1.2.3.4"
     workitem1.ds = Dataset()
@@ -186,22 +201,24 @@ async def test_on_connection_established(
     """Test processing pending notifications when a connection is established."""
     # Setup pending notifications
     ae_title = "TEST_AE"
-    notification_service.pending_notifications[ae_title] = [
-        create_ups_state_report("1.2.3.4", "SCHEDULED", "READY"),
-        create_ups_state_report("5.6.7.8", "IN PROGRESS", "READY"),
-    ]
+    notification_service.pending_notifications[ae_title] = deque(
+        [
+            create_ups_state_report("1.2.3.4", "SCHEDULED", "READY"),
+            create_ups_state_report("5.6.7.8", "IN PROGRESS", "READY"),
+        ]
+    )
 
-    # Mock the send_message method to return True (success)
-    connection_manager.send_message = AsyncMock(return_value=True)
+    # Mock the enqueue_message method to return True (success)
+    connection_manager.enqueue_message = AsyncMock(return_value=True)
 
     # Call the method
     await notification_service.on_connection_established(ae_title)
 
-    # Verify that send_message was called for each notification
-    assert connection_manager.send_message.call_count == 2
+    # Verify that enqueue_message was called for each notification
+    assert connection_manager.enqueue_message.call_count == 2
 
     # Verify that the pending notifications were cleared
-    assert notification_service.pending_notifications[ae_title] == []
+    assert notification_service.pending_notifications[ae_title] == deque()
 
 
 @pytest.mark.asyncio
@@ -211,22 +228,24 @@ async def test_on_connection_established_with_failures(
     """Test handling failures when sending pending notifications."""
     # Setup pending notifications
     ae_title = "TEST_AE"
-    notification_service.pending_notifications[ae_title] = [
-        create_ups_state_report("1.2.3.4", "SCHEDULED", "READY"),
-        create_ups_state_report("5.6.7.8", "IN PROGRESS", "READY"),
-    ]
+    notification_service.pending_notifications[ae_title] = deque(
+        [
+            create_ups_state_report("1.2.3.4", "SCHEDULED", "READY"),
+            create_ups_state_report("5.6.7.8", "IN PROGRESS", "READY"),
+        ]
+    )
 
-    # Mock the send_message method to return False for the first call (failure) and True for the second
-    connection_manager.send_message = AsyncMock(side_effect=[False, True])
+    # Mock the enqueue_message method to return False for the first call (failure) and True for the second
+    connection_manager.enqueue_message = AsyncMock(side_effect=[False, True])
 
     # Call the method
     await notification_service.on_connection_established(ae_title)
 
-    # Verify that send_message was called for each notification
-    assert connection_manager.send_message.call_count == 2
+    # Verify that enqueue_message was called for each notification
+    assert connection_manager.enqueue_message.call_count == 2
 
     # Verify that the pending notifications were cleared despite failures
-    assert notification_service.pending_notifications[ae_title] == []
+    assert notification_service.pending_notifications[ae_title] == deque()
 
 
 @pytest.mark.asyncio
@@ -236,19 +255,274 @@ async def test_on_connection_established_with_exceptions(
     """Test handling exceptions when sending pending notifications."""
     # Setup pending notifications
     ae_title = "TEST_AE"
-    notification_service.pending_notifications[ae_title] = [
-        create_ups_state_report("1.2.3.4", "SCHEDULED", "READY"),
-        create_ups_state_report("5.6.7.8", "IN PROGRESS", "READY"),
-    ]
+    notification_service.pending_notifications[ae_title] = deque(
+        [
+            create_ups_state_report("1.2.3.4", "SCHEDULED", "READY"),
+            create_ups_state_report("5.6.7.8", "IN PROGRESS", "READY"),
+        ]
+    )
 
-    # Mock the send_message method to raise an exception for the first call and succeed for the second
-    connection_manager.send_message = AsyncMock(side_effect=[Exception("Test exception"), True])
+    # Mock the enqueue_message method to raise an exception for the first call and succeed for the second
+    connection_manager.enqueue_message = AsyncMock(side_effect=[Exception("Test exception"), True])
 
     # Call the method (should not raise an exception)
     await notification_service.on_connection_established(ae_title)
 
-    # Verify that send_message was called for each notification
-    assert connection_manager.send_message.call_count == 2
+    # Verify that enqueue_message was called for each notification
+    assert connection_manager.enqueue_message.call_count == 2
 
     # Verify that the pending notifications were cleared despite exceptions
-    assert notification_service.pending_notifications[ae_title] == []
+    assert notification_service.pending_notifications[ae_title] == deque()
+
+
+@pytest.mark.asyncio
+async def test_on_connection_established_serializes_shared_reports_once(
+    notification_service: NotificationService, connection_manager: ConnectionManager
+) -> None:
+    """Test that a report queued for several subscribers is serialized once."""
+    report = create_ups_state_report("1.2.3.4", "SCHEDULED", "READY")
+    notification_service.pending_notifications = {"FIRST_AE": deque([report]), "SECOND_AE": deque([report])}
+    connection_manager.enqueue_message = AsyncMock(return_value=True)
+
+    with patch("pyupsrs.websocket.notification_service._event_report_to_json", side_effect=_event_report_to_json) as to_json:
+        await notification_service.on_connection_established("FIRST_AE")
+        await notification_service.on_connection_established("SECOND_AE")
+
+    to_json.assert_called_once()
+    first_json = connection_manager.enqueue_message.await_args_list[0].args[1]
+    assert connection_manager.enqueue_message.await_args_list[1].args == ("SECOND_AE", first_json)
+    assert first_json == report.to_json()
+
+
+def test_create_ups_progress_report() -> None:
+    """Test that progress reports clamp the progress and leave out sequences without content."""
+    report = create_ups_progress_report("1.2.3.4", "IN PROGRESS", "READY", 150, contact_uri="mailto:a@b.org")
+    info_item = report.ProcedureStepProgressInformationSequence[0]
+    assert info_item.ProcedureStepProgress == 100
+    assert info_item.ProcedureStepCommunicationsURISequence[0].ContactURI == "mailto:a@b.org"
+
+    report = create_ups_progress_report("1.2.3.4", "IN PROGRESS", "READY", None, contact_display_name="Front desk")
+    assert "ProcedureStepProgress" not in report.ProcedureStepProgressInformationSequence[0]
+
+    report = create_ups_progress_report("1.2.3.4", "IN PROGRESS", "READY", None)
+    assert "ProcedureStepProgressInformationSequence" not in report
+
+
+def _assigned_workitem_ds() -> Dataset:
+    code = Dataset()
+    code.CodeValue = "STATION1"
+    code.CodingSchemeDesignator = "99LOCAL"
+    code.CodeMeaning = "Station 1"
+    ds = Dataset()
+    ds.SOPInstanceUID = "1.2.3.4"
+    ds.ScheduledStationNameCodeSequence = [code]
+    return ds
+
+
+@pytest.mark.parametrize(
+    "report",
+    [
+        create_ups_state_report("1.2.3.4", "CANCELED", "READY"),
+        create_ups_assigned_report(_assigned_workitem_ds()),
+        create_ups_state_report("1.2.3.4", "CANCELED", "READY", reason_for_cancellation="Patient left"),
+        create_ups_progress_report("1.2.3.4", "IN PROGRESS", "READY", 50, "Halfway", "mailto:a@b.org", "Front desk"),
+        create_ups_cancel_requested_report("1.2.3.4", "IN PROGRESS", "READY", "REQUESTER"),
+        create_scp_status_change_report(SCPStatus.GOING_DOWN, ListRestartStatus.WARM_START, ListRestartStatus.COLD_START),
+    ],
+)
+def test_event_report_to_json_matches_pydicom(report: Dataset) -> None:
+    """Test that event reports are serialized to the same DICOM JSON as pydicom does."""
+    assert _event_report_to_json(report) == report.to_json()
+
+
+@patch("pyupsrs.domain.services.service_provider.get_provider")
+def test_queue_state_reports_shared_between_subscribers(
+    mock_get_provider: MagicMock,
+    notification_service: NotificationService,
+    sample_workitem: WorkItem,
+) -> None:
+    """Test that subscribers to an unchanged workitem are queued the same state report."""
+    mock_instance = mock_get_provider.return_value
+    mock_instance.workitem_repo.get_by_uid.return_value = sample_workitem
+
+    notification_service.queue_state_reports(Subscription(workitem_uid="1.2.3.4", ae_title="FIRST_AE"))
+    notification_service.queue_state_reports(Subscription(workitem_uid="1.2.3.4", ae_title="SECOND_AE"))
+    first_report = notification_service.pending_notifications["FIRST_AE"][0]
+    assert notification_service.pending_notifications["SECOND_AE"][0] is first_report
+
+    sample_workitem.ds.ProcedureStepState = "IN PROGRESS"
+    notification_service.queue_state_reports(Subscription(workitem_uid="1.2.3.4", ae_title="THIRD_AE"))
+    third_report = notification_service.pending_notifications["THIRD_AE"][0]
+    assert third_report is not first_report
+    assert third_report.ProcedureStepState == "IN PROGRESS"
+
+
+def test_create_ups_state_report() -> None:
+    """Test that each state report is a new dataset with the event report attributes."""
+    first = create_ups_state_report("1.2.3.4", "CANCELED", "READY")
+    second = create_ups_state_report("1.2.3.5", "UNKNOWN", "UNAVAILABLE")
+
+    assert first.AffectedSOPClassUID == second.AffectedSOPClassUID == "1.2.840.10008.5.1.4.34.6.4"
+    assert (first.AffectedSOPInstanceUID, first.EventTypeID, first.ProcedureStepState) == ("1.2.3.4", 1, "CANCELED")
+    first.ReasonForCancellation = "Patient left"
+    assert (second.AffectedSOPInstanceUID, second.ProcedureStepState) == ("1.2.3.5", "SCHEDULED")
+    assert second.InputReadinessState == "UNAVAILABLE"
+    assert "ReasonForCancellation" not in second
+    assert first.MessageID != second.MessageID
+
+
+@patch("pyupsrs.websocket.notification_service._message_ids", itertools.count(65534))
+def test_get_next_message_id_wraps_around() -> None:
+    """Test that message IDs wrap around to 1 after the largest unsigned short."""
+    assert [get_next_message_id() for _ in range(3)] == [65534, 65535, 1]
+
+
+def test_create_ups_state_report_without_message_id() -> None:
+    """Test that the message ID can be left out of event reports."""
+    report = create_ups_state_report("1.2.3.4", "SCHEDULED", "READY", include_message_id=False)
+
+    assert "MessageID" not in report
+    assert report.AffectedSOPInstanceUID == "1.2.3.4"
+
+
+@patch("pyupsrs.websocket.notification_service.get_config")
+def test_include_message_id_read_once(
+    mock_get_config: MagicMock, connection_manager: ConnectionManager, sample_workitem: WorkItem
+) -> None:
+    """Test that the service reads the message ID setting once and applies it to every report it makes."""
+    mock_get_config.return_value = Config(include_message_id=False)
+    notification_service = NotificationService(connection_manager)
+
+    with patch.object(notification_service, "_send_notification") as send_mock:
+        notification_service.notify_creation(sample_workitem)
+        notification_service.notify_status_change(sample_workitem)
+
+    reports = [call.args[1] if len(call.args) > 1 else call.kwargs["message"] for call in send_mock.call_args_list]
+    assert len(reports) == 3
+    assert not any("MessageID" in report for report in reports)
+    mock_get_config.assert_called_once_with()
+
+
+@patch("pyupsrs.domain.services.service_provider.get_provider")
+def test_match_on_filter(
+    mock_get_provider: MagicMock,
+    notification_service: NotificationService,
+    sample_workitem: WorkItem,
+) -> None:
+    """Test that the workitem is looked up once and each matching subscriber is listed once."""
+    mock_instance = mock_get_provider.return_value
+    mock_instance.workitem_repo.get_by_uid.return_value = sample_workitem
+    scheduled_filter = Dataset()
+    scheduled_filter.ProcedureStepState = "SCHEDULED"
+    completed_filter = Dataset()
+    completed_filter.ProcedureStepState = "COMPLETED"
+    subscriptions = {
+        "MATCHING_AE": [
+            Subscription(workitem_uid=FILTERED_SUBSCRIPTION_UID, ae_title="MATCHING_AE", filter=scheduled_filter),
+            Subscription(workitem_uid=FILTERED_SUBSCRIPTION_UID, ae_title="MATCHING_AE", filter=scheduled_filter),
+        ],
+        "OTHER_AE": [Subscription(workitem_uid=FILTERED_SUBSCRIPTION_UID, ae_title="OTHER_AE", filter=completed_filter)],
+    }
+    mock_instance.subscription_service.get_by_ae_title.side_effect = subscriptions.get
+
+    assert notification_service._match_on_filter(["MATCHING_AE", "OTHER_AE"], "1.2.3.4") == ["MATCHING_AE"]
+    mock_instance.workitem_repo.get_by_uid.assert_called_once_with("1.2.3.4")
+
+    mock_instance.workitem_repo.get_by_uid.return_value = None
+    mock_instance.subscription_service.get_by_ae_title.reset_mock()
+    assert notification_service._match_on_filter(["MATCHING_AE", "OTHER_AE"], "1.2.3.5") == []
+    mock_instance.subscription_service.get_by_ae_title.assert_not_called()
+
+
+@patch("pyupsrs.domain.services.service_provider.get_provider")
+def test_match_on_filter_remembers_matches(
+    mock_get_provider: MagicMock,
+    notification_service: NotificationService,
+    sample_workitem: WorkItem,
+) -> None:
+    """Test that filters are matched once per subscription until a change of the workitem is notified."""
+    mock_instance = mock_get_provider.return_value
+    mock_instance.workitem_repo.get_by_uid.return_value = sample_workitem
+    scheduled_filter = Dataset()
+    scheduled_filter.ProcedureStepState = "SCHEDULED"
+    subscription = Subscription(workitem_uid=FILTERED_SUBSCRIPTION_UID, ae_title="FILTERED_AE", filter=scheduled_filter)
+    mock_instance.subscription_service.get_by_ae_title.return_value = [subscription]
+
+    match_spy = MagicMock()
+
+    def compile_spy(query: Dataset) -> MagicMock:
+        match_spy.side_effect = compile_query(query)
+        return match_spy
+
+    with patch("pyupsrs.websocket.notification_service.compile_query", side_effect=compile_spy) as compile_mock:
+        assert notification_service._match_on_filter(["FILTERED_AE"], "1.2.3.4") == ["FILTERED_AE"]
+        assert notification_service._match_on_filter(["FILTERED_AE"], "1.2.3.4") == ["FILTERED_AE"]
+        assert match_spy.call_count == 1
+
+        sample_workitem.ds.ProcedureStepState = "IN PROGRESS"
+        notification_service.notify_status_change(sample_workitem)
+        assert notification_service._match_on_filter(["FILTERED_AE"], "1.2.3.4") == []
+    assert match_spy.call_count == 2
+    # the filter of the subscription is compiled once
+    compile_mock.assert_called_once_with(scheduled_filter)
+
+
+@patch("pyupsrs.domain.services.service_provider.get_provider")
+def test_forget_subscription(
+    mock_get_provider: MagicMock,
+    notification_service: NotificationService,
+    sample_workitem: WorkItem,
+) -> None:
+    """Test that the compiled filter and the matches of a subscription are dropped when it goes away."""
+    mock_instance = mock_get_provider.return_value
+    mock_instance.workitem_repo.get_by_uid.return_value = sample_workitem
+    scheduled_filter = Dataset()
+    scheduled_filter.ProcedureStepState = "SCHEDULED"
+    subscriptions = {
+        ae_title: [Subscription(workitem_uid=FILTERED_SUBSCRIPTION_UID, ae_title=ae_title, filter=scheduled_filter)]
+        for ae_title in ("FILTERED_AE", "OTHER_AE")
+    }
+    mock_instance.subscription_service.get_by_ae_title.side_effect = subscriptions.get
+    assert notification_service._match_on_filter(["FILTERED_AE", "OTHER_AE"], "1.2.3.4") == ["FILTERED_AE", "OTHER_AE"]
+
+    notification_service.forget_subscription("FILTERED_AE", FILTERED_SUBSCRIPTION_UID)
+
+    assert list(notification_service._filter_predicates) == [("OTHER_AE", FILTERED_SUBSCRIPTION_UID)]
+    assert [key[0] for key in notification_service._filter_matches["1.2.3.4"]] == ["OTHER_AE"]
+    notification_service.forget_subscription("OTHER_AE", FILTERED_SUBSCRIPTION_UID)
+    assert notification_service._filter_predicates == {}
+    assert notification_service._filter_matches == {}
+
+
+@pytest.mark.asyncio
+async def test_event_loop_outside_of_the_loop(notification_service: NotificationService) -> None:
+    """Test that notifications made from another thread are sent on the loop the subscribers are connected to."""
+    loop = asyncio.get_running_loop()
+    await notification_service.on_connection_established("TEST_AE")
+
+    assert notification_service._event_loop() is loop
+    assert await asyncio.to_thread(notification_service._event_loop) is loop
+    closed_loop = asyncio.new_event_loop()
+    closed_loop.close()
+    notification_service.register_loop(closed_loop)
+    assert notification_service._event_loop() is loop
+    assert await asyncio.to_thread(notification_service._event_loop) is None
+
+
+@patch("pyupsrs.domain.services.service_provider.get_provider")
+def test_send_notification_without_event_loop(
+    mock_get_provider: MagicMock,
+    notification_service: NotificationService,
+    connection_manager: ConnectionManager,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    """Test that notifications are dropped, and that logged once, when there is no loop to send them on."""
+    connection_manager.get_subscribers.return_value = {"TEST_AE"}
+    mock_get_provider.return_value.subscription_service.get_suspended.return_value = set()
+    report = create_ups_state_report("1.2.3.4", "SCHEDULED", "READY")
+
+    notification_service._send_notification("1.2.3.4", report)
+    notification_service._send_notification("1.2.3.4", report)
+
+    assert caplog.text.count("No event loop registered") == 1
+    assert "Failed to send notification" not in caplog.text
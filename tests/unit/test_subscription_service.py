@@ -5,7 +5,6 @@ from unittest.mock import MagicMock, patch
 import pytest
 
 from pyupsrs.domain.models.ups import GLOBAL_SUBSCRIPTION_UID, Subscription
-from pyupsrs.domain.services.service_provider import ServiceProvider
 from pyupsrs.domain.services.subscription_service import SubscriptionService
 from pyupsrs.storage.repositories.subscription_repository import SubscriptionRepository
 
@@ -37,16 +36,16 @@ def global_subscription() -> Subscription:
     return Subscription(workitem_uid=GLOBAL_SUBSCRIPTION_UID, ae_title="GLOBAL_AE", deletion_lock=True)
 
 
-@patch("pyupsrs.domain.services.service_provider.ServiceProvider")
+@patch("pyupsrs.domain.services.service_provider.get_provider")
 def test_create_subscription(
-    mock_service_provider: ServiceProvider,
+    mock_get_provider: MagicMock,
     subscription_service: SubscriptionService,
     subscription_repository: SubscriptionRepository,
     sample_subscription: Subscription,
 ) -> None:
     """Test creating a subscription with notification queueing."""
     # Setup mocks
-    mock_instance = mock_service_provider.get_instance.return_value
+    mock_instance = mock_get_provider.return_value
     mock_connection_manager = MagicMock()
     mock_notification_service = MagicMock()
 
@@ -66,16 +65,16 @@ def test_create_subscription(
     mock_notification_service.queue_state_reports.assert_called_once_with(sample_subscription)
 
 
-@patch("pyupsrs.domain.services.service_provider.ServiceProvider")
+@patch("pyupsrs.domain.services.service_provider.get_provider")
 def test_create_subscription_global(
-    mock_service_provider: ServiceProvider,
+    mock_get_provider: MagicMock,
     subscription_service: SubscriptionService,
     subscription_repository: SubscriptionRepository,
     global_subscription: Subscription,
 ) -> None:
     """Test creating a global subscription with notification queueing."""
     # Setup mocks
-    mock_instance = mock_service_provider.get_instance.return_value
+    mock_instance = mock_get_provider.return_value
     mock_connection_manager = MagicMock()
     mock_notification_service = MagicMock()
 
@@ -95,16 +94,16 @@ def test_create_subscription_global(
     mock_notification_service.queue_state_reports.assert_called_once_with(global_subscription)
 
 
-@patch("pyupsrs.domain.services.service_provider.ServiceProvider")
+@patch("pyupsrs.domain.services.service_provider.get_provider")
 def test_create_subscription_error_handling(
-    mock_service_provider: ServiceProvider,
+    mock_get_provider: MagicMock,
     subscription_service: SubscriptionService,
     subscription_repository: SubscriptionRepository,
     sample_subscription: Subscription,
 ) -> None:
     """Test error handling during notification queueing."""
     # Setup mocks
-    mock_instance = mock_service_provider.get_instance.return_value
+    mock_instance = mock_get_provider.return_value
     mock_connection_manager = MagicMock()
     mock_notification_service = MagicMock()
 
@@ -130,15 +129,15 @@ def test_create_subscription_error_handling(
     assert result == sample_subscription
 
 
-@patch("pyupsrs.domain.services.service_provider.ServiceProvider")
+@patch("pyupsrs.domain.services.service_provider.get_provider")
 def test_delete_subscription(
-    mock_service_provider: ServiceProvider,
+    mock_get_provider: MagicMock,
     subscription_service: SubscriptionService,
     subscription_repository: SubscriptionRepository,
 ) -> None:
     """Test deleting a subscription."""
     # Setup mocks
-    mock_instance = mock_service_provider.get_instance.return_value
+    mock_instance = mock_get_provider.return_value
     mock_connection_manager = MagicMock()
     mock_instance.connection_manager = mock_connection_manager
 
@@ -150,11 +149,78 @@ def test_delete_subscription(
     ae_title = "TEST_AE"
     result = subscription_service.delete_subscription(workitem_uid, ae_title)
 
-    # Verify the subscription was removed from the connection manager
+    # Verify the subscription was removed from the connection manager and its filter forgotten
     mock_connection_manager.unsubscribe.assert_called_once_with(ae_title, workitem_uid)
+    mock_instance.notification_service.forget_subscription.assert_called_once_with(ae_title, workitem_uid)
 
     # Verify the subscription was deleted from the repository
     subscription_repository.delete.assert_called_once_with(workitem_uid, ae_title)
 
     # Verify the result
     assert result is True
+
+
+@patch("pyupsrs.domain.services.service_provider.get_provider")
+def test_shared_services_resolved_once(
+    mock_get_provider: MagicMock,
+    subscription_service: SubscriptionService,
+    sample_subscription: Subscription,
+) -> None:
+    """Test that the shared services are looked up once and then reused."""
+    subscription_service.create_subscription(sample_subscription)
+    subscription_service.delete_subscription(sample_subscription.workitem_uid, sample_subscription.ae_title)
+    subscription_service.create_subscription(sample_subscription)
+
+    assert mock_get_provider.call_count == 2  # once each for connection manager and notification service
+
+
+@patch("pyupsrs.domain.services.service_provider.get_provider")
+def test_suspend_subscription(
+    mock_get_provider: MagicMock,
+    subscription_service: SubscriptionService,
+    subscription_repository: SubscriptionRepository,
+    sample_subscription: Subscription,
+) -> None:
+    """Test that suspending keeps everything but the suspended flag."""
+    subscription_repository.get.return_value = sample_subscription
+
+    assert subscription_service.suspend(sample_subscription.workitem_uid, sample_subscription.ae_title)
+
+    mock_get_provider.return_value.connection_manager.unsubscribe.assert_called_once_with(
+        sample_subscription.ae_title, sample_subscription.workitem_uid
+    )
+    mock_get_provider.return_value.notification_service.forget_subscription.assert_called_once_with(
+        sample_subscription.ae_title, sample_subscription.workitem_uid
+    )
+    subscription_repository.create.assert_not_called()
+    subscription_repository.delete.assert_not_called()
+    mock_get_provider.return_value.notification_service.queue_state_reports.assert_not_called()
+    suspended_subscription = subscription_repository.update.call_args.args[0]
+    assert suspended_subscription.suspended
+    assert suspended_subscription.created_at == sample_subscription.created_at
+    assert suspended_subscription.ae_title == sample_subscription.ae_title
+    assert suspended_subscription.workitem_uid == sample_subscription.workitem_uid
+
+
+@patch("pyupsrs.domain.services.service_provider.get_provider")
+def test_suspend_unknown_subscription(
+    mock_get_provider: MagicMock,
+    subscription_service: SubscriptionService,
+    subscription_repository: SubscriptionRepository,
+) -> None:
+    """Test that suspending an unknown subscription reports failure."""
+    subscription_repository.get.return_value = None
+
+    assert not subscription_service.suspend("1.2.3.4", "TEST_AE")
+    subscription_repository.create.assert_not_called()
+
+
+def test_get_suspended(subscription_service: SubscriptionService, subscription_repository: SubscriptionRepository) -> None:
+    """Test that only the AE titles with a suspended subscription are returned."""
+    subscriptions = {
+        "SUSPENDED_AE": [Subscription(workitem_uid="1.2.3.4", ae_title="SUSPENDED_AE", suspended=True)],
+        "ACTIVE_AE": [Subscription(workitem_uid="1.2.3.4", ae_title="ACTIVE_AE")],
+    }
+    subscription_repository.get_by_ae_title.side_effect = subscriptions.get
+
+    assert subscription_service.get_suspended(["SUSPENDED_AE", "ACTIVE_AE", "UNKNOWN_AE"]) == {"SUSPENDED_AE"}
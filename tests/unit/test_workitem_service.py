@@ -0,0 +1,107 @@
+"""Tests for the workitem service."""
+
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+from pydicom import Dataset
+
+from pyupsrs.domain.models.ups import WorkItem, WorkItemStatus
+from pyupsrs.domain.services.workitem_service import WorkItemService
+from pyupsrs.storage.repositories.workitem_repository import WorkItemRepository
+from pyupsrs.websocket.connection_manager import ConnectionManager
+from pyupsrs.websocket.notification_service import NotificationService
+
+
+@pytest.fixture
+def notification_service() -> NotificationService:
+    """Create a notification service for testing."""
+    return MagicMock(spec=NotificationService)
+
+
+@pytest.fixture
+def workitem_service(notification_service: NotificationService) -> WorkItemService:
+    """Create a workitem service for testing."""
+    repo = MagicMock(spec=WorkItemRepository)
+    repo.create.side_effect = lambda workitem: workitem
+    return WorkItemService(workitem_repository=repo, notification_service=notification_service)
+
+
+@pytest.fixture
+def sample_workitem() -> WorkItem:
+    """Create a sample workitem for testing."""
+    ds = Dataset()
+    ds.SOPInstanceUID = "1.2.3.4"
+    ds.ProcedureStepState = "SCHEDULED"
+    return WorkItem(ds)
+
+
+def test_create_workitem_notifies_without_event_loop(
+    workitem_service: WorkItemService, notification_service: NotificationService, sample_workitem: WorkItem
+) -> None:
+    """Test that the creation notification is sent straight away outside of an event loop."""
+    workitem_service.create_workitem(sample_workitem)
+
+    notification_service.creation_reports.assert_called_once_with(sample_workitem)
+    notification_service.send_creation_reports.assert_called_once_with(
+        "1.2.3.4", notification_service.creation_reports.return_value
+    )
+
+
+def test_create_workitem_defers_notification_in_event_loop(
+    workitem_service: WorkItemService, notification_service: NotificationService, sample_workitem: WorkItem
+) -> None:
+    """Test that the creation notification does not hold up the request handler."""
+
+    async def create() -> None:
+        workitem_service.create_workitem(sample_workitem)
+        notification_service.creation_reports.assert_called_once_with(sample_workitem)
+        notification_service.send_creation_reports.assert_not_called()
+        await asyncio.sleep(0)
+        notification_service.send_creation_reports.assert_called_once_with(
+            "1.2.3.4", notification_service.creation_reports.return_value
+        )
+
+    asyncio.run(create())
+
+
+def test_deferred_creation_reports_show_the_created_state(sample_workitem: WorkItem) -> None:
+    """Test that a change made before the deferred creation notification is sent does not show in its reports."""
+    notification_service = NotificationService(MagicMock(spec=ConnectionManager))
+    repo = MagicMock(spec=WorkItemRepository)
+    repo.create.side_effect = lambda workitem: workitem
+    workitem_service = WorkItemService(workitem_repository=repo, notification_service=notification_service)
+    sample_workitem.ds.InputReadinessState = "READY"
+
+    async def create() -> None:
+        with patch.object(notification_service, "_send_notification") as send_mock:
+            workitem_service.create_workitem(sample_workitem)
+            sample_workitem.update_procedure_step_status(WorkItemStatus.IN_PROGRESS)
+            await asyncio.sleep(0)
+        assert [call.args[1].ProcedureStepState for call in send_mock.call_args_list] == ["SCHEDULED", "SCHEDULED"]
+
+    asyncio.run(create())
+
+
+def test_update_workitem_status_unknown_workitem(workitem_service: WorkItemService) -> None:
+    """Test that updating a workitem that does not exist fails without side effects."""
+    workitem_service.workitem_repository.get_by_uid.return_value = None
+
+    assert workitem_service.update_workitem_status("1.2.3.4", WorkItemStatus.CANCELED, None) == (None, False)
+    workitem_service.workitem_repository.update.assert_not_called()
+
+
+def test_update_workitem_status_in_progress(
+    workitem_service: WorkItemService, notification_service: NotificationService, sample_workitem: WorkItem
+) -> None:
+    """Test claiming a scheduled workitem."""
+    workitem_service.workitem_repository.get_by_uid.return_value = sample_workitem
+    workitem_service.workitem_repository.update.side_effect = lambda workitem: workitem
+
+    workitem, updated = workitem_service.update_workitem_status("1.2.3.4", WorkItemStatus.IN_PROGRESS, "1.2.3.4.5")
+
+    assert updated
+    assert workitem is sample_workitem
+    assert workitem.status == WorkItemStatus.IN_PROGRESS
+    assert workitem.transaction_uid == "1.2.3.4.5"
+    notification_service.notify_status_change.assert_called_once_with(sample_workitem)
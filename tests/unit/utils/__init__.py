@@ -0,0 +1 @@
+"""tests/unit/utils package."""
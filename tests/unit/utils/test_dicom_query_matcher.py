@@ -0,0 +1,198 @@
+"""Unit tests for DICOM query matching."""
+
+import logging
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from pydicom import Dataset
+from pydicom.multival import MultiValue
+
+from pyupsrs.utils import dicom_query_matcher
+from pyupsrs.utils.dicom_query_matcher import (
+    compile_query,
+    match_code_sequence,
+    match_query_to_dataset,
+    parse_dicom_date,
+)
+
+
+def _dataset(patient_id: str, state: str, start: str) -> Dataset:
+    ds = Dataset()
+    ds.PatientID = patient_id
+    ds.PatientName = "Test^Patient"
+    ds.ProcedureStepState = state
+    ds.ScheduledProcedureStepStartDateTime = start
+    ds.ExpectedCompletionDateTime = start
+    return ds
+
+
+def _code(value: str, scheme: str = "99IHERO2008") -> Dataset:
+    item = Dataset()
+    item.CodeValue = value
+    item.CodingSchemeDesignator = scheme
+    item.CodeMeaning = value
+    return item
+
+
+DATASETS = [
+    _dataset("PID1", "SCHEDULED", "20250101120000"),
+    _dataset("PID2", "SCHEDULED", "20250102120000"),
+    _dataset("PID12", "IN PROGRESS", "20250103"),
+]
+
+
+@pytest.mark.filterwarnings("ignore:Invalid value for VR DT")
+@pytest.mark.parametrize(
+    ("criteria", "expected"),
+    [
+        ({}, [True, True, True]),
+        ({"PatientID": "PID1"}, [True, False, False]),
+        ({"PatientID": "PID1*"}, [True, False, True]),
+        ({"PatientID": "PID?"}, [True, True, False]),
+        ({"PatientID": ""}, [True, True, True]),
+        ({"PatientName": "Test^*"}, [True, True, True]),
+        ({"PatientName": "Test^P.tient"}, [False, False, False]),
+        ({"PatientName": "Test^Patient", "PatientID": "PID2"}, [False, True, False]),
+        (
+            {"ProcedureStepState": "SCHEDULED", "ScheduledProcedureStepStartDateTime": "20250101000000-20250101235959"},
+            [True, False, False],
+        ),
+        ({"ScheduledProcedureStepStartDateTime": "-20250102"}, [True, False, False]),
+        ({"ScheduledProcedureStepStartDateTime": "20250102120000"}, [False, True, False]),
+        ({"ScheduledProcedureStepStartDateTime": "202501*"}, [True, True, True]),
+        ({"ExpectedCompletionDateTime": "20250102-"}, [False, True, True]),
+        ({"StudyInstanceUID": "1.2.3"}, [False, False, False]),
+    ],
+)
+def test_compile_query(criteria: dict[str, str], expected: list[bool]) -> None:
+    """Test the compiled predicate, and that match_query_to_dataset agrees with it."""
+    query = Dataset()
+    for keyword, value in criteria.items():
+        setattr(query, keyword, value)
+
+    predicate = compile_query(query)
+
+    assert [predicate(ds) for ds in DATASETS] == expected
+    assert [match_query_to_dataset(query, ds) for ds in DATASETS] == expected
+
+
+@pytest.mark.filterwarnings("ignore:Invalid value for VR UI")
+def test_compile_query_sequences() -> None:
+    """Test compiled code sequence and nested sequence checks."""
+    referenced = Dataset()
+    referenced.ReferencedSOPInstanceUID = "1.2.3.4"
+    datasets = [Dataset(), Dataset(), Dataset()]
+    datasets[0].ScheduledStationNameCodeSequence = [_code("TX1")]
+    datasets[0].ReferencedRequestSequence = [referenced]
+    datasets[1].ScheduledStationNameCodeSequence = [_code("TX2")]
+    datasets[1].ReferencedRequestSequence = []
+    query_item = Dataset()
+    query_item.ReferencedSOPInstanceUID = "1.2.*"
+    code_query = Dataset()
+    code_query.ScheduledStationNameCodeSequence = [_code("TX1")]
+    nested_query = Dataset()
+    nested_query.ReferencedRequestSequence = [query_item]
+    empty_sequence_query = Dataset()
+    empty_sequence_query.ReferencedRequestSequence = []
+
+    for query, expected in (
+        (code_query, [True, False, False]),
+        (nested_query, [True, False, False]),
+        (empty_sequence_query, [True, True, False]),
+    ):
+        predicate = compile_query(query)
+        assert [predicate(ds) for ds in datasets] == expected
+
+
+def test_compile_query_presence_checks() -> None:
+    """Test that meta information in the query is ignored and any other missing attribute rejects the dataset."""
+    query = Dataset()
+    query.add_new(0x00020010, "UI", "1.2.840.10008.1.2.1")  # Transfer Syntax UID
+    query.PatientID = ""
+    predicate = compile_query(query)
+
+    assert [predicate(ds) for ds in DATASETS] == [True] * len(DATASETS)
+    query.AdmissionID = ""
+    assert not any(compile_query(query)(ds) for ds in DATASETS)
+
+
+def test_sequence_query_items_are_compiled_once() -> None:
+    """Test that each item of a queried sequence is compiled once, and has to match an item of the dataset."""
+    dataset = Dataset()
+    dataset.ReferencedRequestSequence = [Dataset(), Dataset(), Dataset()]
+    for index, item in enumerate(dataset.ReferencedRequestSequence):
+        item.AccessionNumber = f"ACC{index}"
+    query_items = [Dataset(), Dataset()]
+    query_items[0].AccessionNumber = "ACC0"
+    query_items[1].AccessionNumber = "ACC2"
+    query = Dataset()
+    query.ReferencedRequestSequence = query_items
+
+    with patch.object(dicom_query_matcher, "compile_query", wraps=compile_query) as compile_spy:
+        predicate = dicom_query_matcher.compile_query(query)
+        assert predicate(dataset)
+        assert predicate(dataset)
+    # the query and each of its two sequence items
+    assert compile_spy.call_count == 3
+    assert compile_query(query)(dataset)
+    query_items[1].AccessionNumber = "ACC3"
+    assert not match_query_to_dataset(query, dataset)
+    assert not compile_query(query)(dataset)
+
+
+def test_parse_dicom_date() -> None:
+    """Test parsing dates, date times and values that are not (hashable) date strings."""
+    assert parse_dicom_date("20250102") == datetime(2025, 1, 2)
+    assert parse_dicom_date("20250102123000") == datetime(2025, 1, 2, 12, 30)
+    assert parse_dicom_date("20250102123000") is parse_dicom_date("20250102123000")
+    assert parse_dicom_date("") is None
+    assert parse_dicom_date(MultiValue(str, ["20250102", "20250103"])) is None
+
+
+def test_parse_dicom_date_formats() -> None:
+    """Test the TM and DT forms, with and without fractional seconds, and invalid values."""
+    assert parse_dicom_date("1230") == datetime(1900, 1, 1, 12, 30)
+    assert parse_dicom_date("123045.25") == datetime(1900, 1, 1, 12, 30, 45, 250000)
+    assert parse_dicom_date("2025010212") == datetime(2025, 1, 2, 12)
+    assert parse_dicom_date("20250102123045.1234567") == datetime(2025, 1, 2, 12, 30, 45, 123456)
+    assert parse_dicom_date("20250102123045+0100") == datetime(2025, 1, 2, 12, 30, 45)
+    assert parse_dicom_date("123045.5") == datetime(1900, 1, 1, 12, 30, 45, 500000)
+    assert parse_dicom_date("20250102123045.1") == datetime(2025, 1, 2, 12, 30, 45, 100000)
+    assert parse_dicom_date("20250102.5") is None
+    assert parse_dicom_date("20251301") is None
+    assert parse_dicom_date("2025010a") is None
+    assert parse_dicom_date("2025_102") is None
+
+
+def test_parse_dicom_date_logs_invalid_values(caplog: pytest.LogCaptureFixture) -> None:
+    """Test that values which are not date/times are logged at debug level, and wildcards are not parsed."""
+    with caplog.at_level(logging.DEBUG, logger="pyupsrs.utils.dicom_query_matcher"):
+        assert parse_dicom_date("*") is None
+        assert parse_dicom_date("?2025") is None
+        assert not caplog.records
+        assert parse_dicom_date("20259999") is None
+    assert "20259999" in caplog.text
+
+
+def test_wildcards_match_other_characters_literally() -> None:
+    """Test that only * and ? are wildcards in query values."""
+    query = Dataset()
+    query.PatientID = "P.D1*"
+
+    assert not match_query_to_dataset(query, DATASETS[0])
+    query.PatientID = "PI?1*"
+    assert match_query_to_dataset(query, DATASETS[0])
+    assert match_query_to_dataset(query, DATASETS[2])
+
+
+def test_match_code_sequence() -> None:
+    """Test that every coded query item has to be among the dataset items."""
+    dataset_seq = [_code("TX1"), _code("TX2"), Dataset()]
+
+    assert match_code_sequence([_code("TX2"), _code("TX1")], dataset_seq, 0x00404025)
+    assert match_code_sequence([_code("TX2"), Dataset()], dataset_seq, 0x00404018)
+    assert not match_code_sequence([_code("TX1"), _code("TX3")], dataset_seq, 0x00404025)
+    assert not match_code_sequence([_code("TX1", "DCM")], dataset_seq)
+    assert match_code_sequence([], dataset_seq)
+    assert not match_code_sequence([_code("TX1")], [])
@@ -0,0 +1,27 @@
+"""Unit tests for the DICOM utility functions."""
+
+from datetime import datetime
+
+import pytest
+from pydicom import valuerep
+
+from pyupsrs.utils.dicom_utils import to_da_str, to_dicom_date_str, to_dt_str, to_tm_str, validate_uid
+
+VALUE = datetime(2025, 1, 2, 3, 4, 5, 60)
+
+
+def test_to_dicom_date_str() -> None:
+    """Test converting to each date/time VR, and that DA is the default for other VRs."""
+    assert to_dicom_date_str(VALUE) == to_da_str(VALUE) == "20250102"
+    assert to_dicom_date_str(VALUE, valuerep.VR.TM) == to_tm_str(VALUE) == "030405.000060"
+    assert to_dicom_date_str(VALUE, valuerep.VR.DT) == to_dt_str(VALUE) == "20250102030405.000060"
+    assert to_dicom_date_str(VALUE, valuerep.VR.LO) == "20250102"
+
+
+@pytest.mark.filterwarnings("ignore:Invalid value for VR UI")
+def test_validate_uid() -> None:
+    """Test validating UIDs, including repeated validation of the same UID."""
+    assert validate_uid("1.2.840.10008.5.1.4.34.5")
+    assert validate_uid("1.2.840.10008.5.1.4.34.5")
+    assert not validate_uid("1.2.840.10008.05")
+    assert not validate_uid("not a uid")